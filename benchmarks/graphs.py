@@ -0,0 +1,83 @@
+"""
+Generates local git repositories forming a dependency graph of editables, for benchmarking sb install.
+
+The graph has `depth` layers of `width` packages each. Every package is a git repository with the
+tags 0.1, 0.2 and 0.3 on master, and a `dev` branch one commit ahead of 0.3. Each package's
+requirements.txt pins `fanout` packages of the next layer to 0.3; with probability
+`conflict_density` a pin is replaced by 0.1, 0.2 or dev instead, so sb has to compare versions of
+the same package required by several parents. A root package requires every package of the
+first layer.
+"""
+import os
+import random
+import subprocess
+
+TAGS = ['0.1', '0.2', '0.3']
+BRANCH = 'dev'
+
+_git_env = dict(os.environ,
+                GIT_AUTHOR_NAME='sb benchmark', GIT_AUTHOR_EMAIL='benchmark@example.com',
+                GIT_COMMITTER_NAME='sb benchmark', GIT_COMMITTER_EMAIL='benchmark@example.com')
+
+
+def _git(repo, *args):
+    subprocess.check_call(['git'] + list(args), cwd=repo, env=_git_env,
+                          stdout=open(os.devnull, 'w'))
+
+
+def _write(path, contents):
+    f = open(path, 'w')
+    try:
+        f.write(contents)
+    finally:
+        f.close()
+
+
+def package_name(layer, index):
+    # pip reads '-<digit>' at the end of an #egg= name as a version
+    return 'bench-l%d-p%d' % (layer, index)
+
+
+def editable_url(root, name, rev):
+    return 'git+file://%s@%s#egg=%s' % (os.path.join(root, name), rev, name)
+
+
+def create_package(root, name, requirements):
+    """Creates the repository of package name, with requirements.txt listing the (name, rev) pairs in requirements."""
+    repo = os.path.join(root, name)
+    os.makedirs(repo)
+    _git(repo, 'init', '-q')
+    module = name.replace('-', '_')
+    _write(os.path.join(repo, 'requirements.txt'),
+           ''.join('-e %s\n' % editable_url(root, dep, rev) for dep, rev in requirements))
+    for tag in TAGS + [BRANCH]:
+        version = tag if tag != BRANCH else '0.4.dev'
+        _write(os.path.join(repo, 'setup.py'),
+               'from setuptools import setup\nsetup(name=%r, version=%r, py_modules=[%r])\n' % (name, version, module))
+        _write(os.path.join(repo, module + '.py'), 'version = %r\n' % version)
+        if tag == BRANCH:
+            _git(repo, 'checkout', '-q', '-b', BRANCH)
+        _git(repo, 'add', '-A')
+        _git(repo, 'commit', '-q', '-m', version)
+        if tag != BRANCH:
+            _git(repo, 'tag', tag)
+    _git(repo, 'checkout', '-q', 'master')
+    return repo
+
+
+def generate(root, width, depth, conflict_density=0.0, fanout=2, seed=0):
+    """Creates the graph in root, returning the URL to `sb install -e`."""
+    rng = random.Random(seed)
+    fanout = min(fanout, width)
+    for layer in reversed(range(depth)):
+        for index in range(width):
+            requirements = []
+            if layer + 1 < depth:
+                for dep in rng.sample(range(width), fanout):
+                    rev = TAGS[-1]
+                    if rng.random() < conflict_density:
+                        rev = rng.choice(TAGS[:-1] + [BRANCH])
+                    requirements.append((package_name(layer + 1, dep), rev))
+            create_package(root, package_name(layer, index), requirements)
+    create_package(root, 'bench-root', [(package_name(0, index), TAGS[-1]) for index in range(width)])
+    return editable_url(root, 'bench-root', TAGS[-1])
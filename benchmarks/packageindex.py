@@ -0,0 +1,136 @@
+"""
+Generates a package index of source distributions forming a dependency graph, and serves it
+locally with a fixed latency per request and per new connection (standing in for the TCP and
+TLS handshakes), for benchmarking index lookups of sb install.
+
+The graph has `depth` layers of `width` packages each, every one with the versions 1.0 and
+1.1; each package depends on `fanout` packages of the next layer, without pinning a version.
+A root package depends on every package of the first layer. The index has a PyPI "simple"
+layout: /simple/<name>/ links to the archives in /packages/.
+"""
+import os
+import time
+import random
+import shutil
+import tarfile
+import tempfile
+import threading
+import posixpath
+import urllib
+import BaseHTTPServer
+import SimpleHTTPServer
+import SocketServer
+
+VERSIONS = ['1.0', '1.1']
+
+
+def package_name(layer, index):
+    return 'bench-index-l%d-p%d' % (layer, index)
+
+
+def _write(path, contents):
+    f = open(path, 'w')
+    try:
+        f.write(contents)
+    finally:
+        f.close()
+
+
+def create_sdist(packages_dir, name, version, requirements):
+    """Writes <name>-<version>.tar.gz with a setup.py requiring requirements."""
+    base = '%s-%s' % (name, version)
+    build_dir = tempfile.mkdtemp('-sdist')
+    try:
+        source_dir = os.path.join(build_dir, base)
+        os.makedirs(source_dir)
+        module = name.replace('-', '_')
+        _write(os.path.join(source_dir, 'setup.py'),
+               'from setuptools import setup\nsetup(name=%r, version=%r, py_modules=[%r], install_requires=%r)\n'
+               % (name, version, module, requirements))
+        _write(os.path.join(source_dir, module + '.py'), 'version = %r\n' % version)
+        _write(os.path.join(source_dir, 'PKG-INFO'),
+               'Metadata-Version: 1.0\nName: %s\nVersion: %s\n' % (name, version))
+        path = os.path.join(packages_dir, base + '.tar.gz')
+        archive = tarfile.open(path, 'w:gz')
+        try:
+            archive.add(source_dir, base)
+        finally:
+            archive.close()
+    finally:
+        shutil.rmtree(build_dir)
+    return os.path.basename(path)
+
+
+def create_package(root, name, requirements):
+    packages_dir = os.path.join(root, 'packages')
+    project_dir = os.path.join(root, 'simple', name)
+    for d in (packages_dir, project_dir):
+        if not os.path.exists(d):
+            os.makedirs(d)
+    links = ['<a href="../../packages/%s">%s</a><br/>' % ((create_sdist(packages_dir, name, version, requirements),) * 2)
+             for version in VERSIONS]
+    _write(os.path.join(project_dir, 'index.html'), '<html><body>\n%s\n</body></html>\n' % '\n'.join(links))
+
+
+def generate(root, width, depth, fanout=2, seed=0):
+    """Creates the index in root, returning the name of the root package."""
+    rng = random.Random(seed)
+    fanout = min(fanout, width)
+    for layer in range(depth):
+        for index in range(width):
+            requirements = []
+            if layer + 1 < depth:
+                requirements = [package_name(layer + 1, dep) for dep in rng.sample(range(width), fanout)]
+            create_package(root, package_name(layer, index), requirements)
+    create_package(root, 'bench-index-root', [package_name(0, index) for index in range(width)])
+    names = sorted(os.listdir(os.path.join(root, 'simple')))
+    _write(os.path.join(root, 'simple', 'index.html'), '<html><body>\n%s\n</body></html>\n' % '\n'.join(
+        '<a href="%s/">%s</a><br/>' % (name, name) for name in names))
+    return 'bench-index-root'
+
+
+class _ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(root, latency=0.0, connect_latency=0.0):
+    """
+    Serves root on a free local port, answering each request after latency seconds, and the first one on a connection
+    connect_latency seconds later still. Connections are kept alive, and If-Modified-Since is honoured. Returns
+    (server, URL).
+    """
+
+    class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            time.sleep(connect_latency)
+            SimpleHTTPServer.SimpleHTTPRequestHandler.setup(self)
+
+        def translate_path(self, path):
+            path = posixpath.normpath(urllib.unquote(path.split('?', 1)[0].split('#', 1)[0]))
+            return os.path.join(root, *[p for p in path.split('/') if p and p not in ('.', '..')])
+
+        def send_head(self):
+            time.sleep(latency)
+            path = self.translate_path(self.path)
+            if os.path.isdir(path):
+                path = os.path.join(path, 'index.html')
+            if os.path.exists(path):
+                last_modified = self.date_time_string(int(os.path.getmtime(path)))
+                if self.headers.get('If-Modified-Since') == last_modified:
+                    self.send_response(304)
+                    self.send_header('Last-Modified', last_modified)
+                    self.end_headers()
+                    return None
+            return SimpleHTTPServer.SimpleHTTPRequestHandler.send_head(self)
+
+        def log_message(self, *args):
+            pass
+
+    server = _ThreadingServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    return server, 'http://127.0.0.1:%d/' % server.server_address[1]
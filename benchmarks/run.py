@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmarks of sb install on generated dependency graphs: of editables in git
+repositories (see graphs.py), or of source distributions on a local package index which
+answers every request after a fixed latency (see packageindex.py).
+
+Each scenario generates its repositories or index, then installs the root package into a
+fresh virtualenv, measuring wall time, the peak RSS of the sb process and the number of git
+subprocesses and network requests it made (from --timing-report). Results are compared
+against benchmarks/baselines.json; a scenario that got slower or bigger by more than
+--tolerance, or started more git processes, made more requests or opened more HTTP
+connections, is reported as a regression and the exit status is 1. So is a scenario, or a
+measurement of it, missing from the baselines.
+
+    python benchmarks/run.py                      # all scenarios, compared against the baselines
+    python benchmarks/run.py -s conflicts -j 4    # one scenario, with sb install --jobs 4
+    python benchmarks/run.py --save-baseline      # record new baselines on the reference host
+
+Timing baselines only make sense on the host they were recorded on, which is why each one
+records the number of CPUs; git subprocess, request and connection counts are comparable
+everywhere. Re-record the baselines whenever a change is expected to alter the counts.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+from optparse import OptionParser
+
+import graphs
+import packageindex
+
+here = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(here)
+default_baselines = os.path.join(here, 'baselines.json')
+
+SCENARIOS = {
+    'wide': dict(width=8, depth=2, conflict_density=0.0),
+    'deep': dict(width=2, depth=6, conflict_density=0.0),
+    'conflicts': dict(width=4, depth=3, conflict_density=0.5),
+}
+INDEX_SCENARIOS = {
+    'index': dict(width=6, depth=3, latency=0.04, connect_latency=0.12),
+}
+
+
+def create_virtualenv(path, python):
+    """A virtualenv at path with pip 1.3 and this checkout of snakebasket (in develop mode)."""
+    subprocess.check_call([sys.executable, '-m', 'virtualenv', '-q', '-p', python, path])
+    pip_checkout = os.path.join(repo_root, 'pip')
+    pip = os.path.join(path, 'bin', 'pip')
+    if os.path.exists(os.path.join(pip_checkout, 'setup.py')):
+        subprocess.check_call([pip, 'install', '-q', '-e', pip_checkout])
+    else:
+        subprocess.check_call([pip, 'install', '-q', 'pip==1.3.1'])
+    subprocess.check_call([os.path.join(path, 'bin', 'python'), 'setup.py', '-q', 'develop'], cwd=repo_root,
+                          stdout=open(os.devnull, 'w'))
+
+
+def restore(snapshot, path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    shutil.copytree(snapshot, path, symlinks=True)
+
+
+def measure(venv, work_dir, install_args, sb_args):
+    """Runs sb install once, returning (seconds, peak RSS in KB, git subprocesses, network requests, connections)."""
+    report = os.path.join(work_dir, 'timing.json')
+    log_path = os.path.join(work_dir, 'sb.log')
+    log = open(log_path, 'w')
+    try:
+        command = [os.path.join(venv, 'bin', 'sb'), 'install', '--timing-report', report] + install_args + sb_args
+        started = time.time()
+        process = subprocess.Popen(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        pid, status, usage = os.wait4(process.pid, 0)
+        seconds = time.time() - started
+    finally:
+        log.close()
+    if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+        raise RuntimeError('sb install failed, see %s' % log_path)
+    peak_rss = usage.ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss /= 1024  # bytes on OS X, KB elsewhere
+    counters = json.load(open(report))['counters']
+    return (seconds, peak_rss, counters['git_subprocesses'], counters['network_requests'],
+            counters.get('http_connections', 0))
+
+
+def run_scenario(name, work_root, venv, snapshot, repeat, sb_args):
+    fixtures = os.path.join(work_root, name)
+    server = None
+    if name in INDEX_SCENARIOS:
+        parameters = INDEX_SCENARIOS[name]
+        root = packageindex.generate(fixtures, parameters['width'], parameters['depth'])
+        server, url = packageindex.serve(fixtures, parameters['latency'], parameters['connect_latency'])
+        install_args = ['--index-url', url + 'simple/', root]
+    else:
+        parameters = SCENARIOS[name]
+        install_args = ['-e', graphs.generate(fixtures, **parameters)]
+    runs = []
+    try:
+        for i in range(repeat):
+            restore(snapshot, venv)
+            runs.append(measure(venv, work_root, install_args, sb_args))
+    finally:
+        if server is not None:
+            server.shutdown()
+    times = sorted(r[0] for r in runs)
+    return {
+        'parameters': parameters,
+        'cpus': multiprocessing.cpu_count(),
+        'sb_args': sb_args,
+        'seconds': round(times[len(times) // 2], 3),
+        'peak_rss_kb': max(r[1] for r in runs),
+        'git_subprocesses': max(r[2] for r in runs),
+        'network_requests': max(r[3] for r in runs),
+        'http_connections': max(r[4] for r in runs),
+    }
+
+
+# measurements every baseline must have, and the counters which may never grow
+MEASURES = ('seconds', 'peak_rss_kb', 'git_subprocesses', 'network_requests', 'http_connections')
+COUNTERS = (('git_subprocesses', 'git subprocesses'), ('network_requests', 'network requests'),
+            ('http_connections', 'HTTP connections'))
+
+
+def regressions(result, baseline, tolerance):
+    """The ways result is worse than baseline; a measurement missing from baseline is one too."""
+    found = ['no baseline %s' % key for key in MEASURES if key not in baseline]
+    if found:
+        return found
+    if result['seconds'] > baseline['seconds'] * (1 + tolerance):
+        found.append('time %.2fs -> %.2fs' % (baseline['seconds'], result['seconds']))
+    if result['peak_rss_kb'] > baseline['peak_rss_kb'] * (1 + tolerance):
+        found.append('peak RSS %dKB -> %dKB' % (baseline['peak_rss_kb'], result['peak_rss_kb']))
+    for key, description in COUNTERS:
+        if result[key] > baseline[key]:
+            found.append('%s %d -> %d' % (description, baseline[key], result[key]))
+    return found
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    scenarios = sorted(SCENARIOS.keys() + INDEX_SCENARIOS.keys())
+    parser.add_option('-s', '--scenario', dest='scenarios', action='append', choices=scenarios,
+                      help='Run only this scenario (may be given more than once): %s.' % ', '.join(scenarios))
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                      help='Passed to sb install --jobs. Baselines are kept per number of jobs.')
+    parser.add_option('-n', '--repeat', dest='repeat', type='int', default=3,
+                      help='Install each scenario this many times, reporting the median time.')
+    parser.add_option('-p', '--python', dest='python', default=sys.executable,
+                      help='Python interpreter of the virtualenv sb runs in.')
+    parser.add_option('--baselines', dest='baselines', default=default_baselines, metavar='FILE')
+    parser.add_option('--save-baseline', dest='save_baseline', action='store_true', default=False,
+                      help='Store the results as the new baselines instead of comparing against them.')
+    parser.add_option('--tolerance', dest='tolerance', type='float', default=0.25,
+                      help='Relative slowdown or memory growth reported as a regression.')
+    parser.add_option('--keep', dest='keep', action='store_true', default=False,
+                      help='Keep the generated repositories and virtualenv.')
+    options, args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(options.baselines):
+        baselines = json.load(open(options.baselines))
+    sb_args = ['--jobs', str(options.jobs)]
+    work_root = tempfile.mkdtemp('-sb-benchmark')
+    venv = os.path.join(work_root, 'venv')
+    snapshot = os.path.join(work_root, 'venv.clean')
+    failed = False
+    try:
+        create_virtualenv(venv, options.python)
+        shutil.copytree(venv, snapshot, symlinks=True)
+        for name in options.scenarios or scenarios:
+            key = '%s-j%d' % (name, options.jobs)
+            result = run_scenario(name, work_root, venv, snapshot, options.repeat, sb_args)
+            line = '%-16s %8.2fs %8.1fMB %6d git %6d requests %6d connections' % (
+                key, result['seconds'], result['peak_rss_kb'] / 1024.0, result['git_subprocesses'],
+                result['network_requests'], result['http_connections'])
+            if options.save_baseline:
+                baselines[key] = result
+            elif key not in baselines:
+                failed = True
+                line += '   NO BASELINE: record one with --save-baseline'
+            else:
+                found = regressions(result, baselines[key], options.tolerance)
+                if found:
+                    failed = True
+                    line += '   REGRESSION: ' + ', '.join(found)
+                else:
+                    line += '   (baseline %.2fs, %d git)' % (baselines[key]['seconds'],
+                                                           baselines[key]['git_subprocesses'])
+                if baselines[key].get('cpus') != result['cpus']:
+                    line += '   (baseline recorded with %s CPUs)' % baselines[key].get('cpus', 'unknown')
+            print line
+        if options.save_baseline:
+            f = open(options.baselines, 'w')
+            try:
+                json.dump(baselines, f, indent=2, sort_keys=True)
+                f.write('\n')
+            finally:
+                f.close()
+            print 'Saved baselines to %s' % options.baselines
+    finally:
+        if options.keep:
+            print 'Kept %s' % work_root
+        else:
+            shutil.rmtree(work_root)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+A persistent cache of git ancestry answers.
+
+Whether one commit is an ancestor of another never changes, so answers are kept
+forever, keyed by (repository, ancestor candidate, descendant candidate). The cache
+is an sqlite database, which can be shared by concurrently running sb processes.
+"""
+import os
+import re
+import sqlite3
+import threading
+from pip.log import logger
+
+full_hash_re = re.compile(r'^[0-9a-f]{40}$')
+
+
+class AncestryCache(object):
+
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        cache_dir = os.path.dirname(self.path)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS ancestry ('
+                        'repo TEXT, parent TEXT, child TEXT, is_ancestor INTEGER, '
+                        'PRIMARY KEY (repo, parent, child))')
+        self.db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+        self.db.commit()
+
+    @staticmethod
+    def cacheable(parent, child):
+        # Only fixed commits can be cached: names like tags and branches may move.
+        return full_hash_re.match(parent) is not None and full_hash_re.match(child) is not None
+
+    def get(self, repo, parent, child):
+        """The cached answer to "is parent an ancestor of child", or None if it's not known."""
+        if not self.cacheable(parent, child):
+            return None
+        with self.lock:
+            row = self.db.execute('SELECT is_ancestor FROM ancestry WHERE repo = ? AND parent = ? AND child = ?',
+                                  (repo, parent, child)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return bool(row[0])
+
+    def put(self, repo, parent, child, is_ancestor):
+        if not self.cacheable(parent, child):
+            return
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO ancestry VALUES (?, ?, ?, ?)',
+                            (repo, parent, child, int(is_ancestor)))
+            self.db.commit()
+
+    def counters(self):
+        """Hit and miss counts accumulated over all runs using this cache."""
+        with self.lock:
+            return dict(self.db.execute('SELECT name, value FROM counters').fetchall())
+
+    def close(self):
+        """Adds this run's hits and misses to the stored counters and closes the database."""
+        with self.lock:
+            for name, value in (('hits', self.hits), ('misses', self.misses)):
+                self.db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+                self.db.execute('UPDATE counters SET value = value + ? WHERE name = ?', (value, name))
+            self.db.commit()
+            self.db.close()
+        logger.info('Git ancestry cache %s: %d hits, %d misses' % (self.path, self.hits, self.misses))
@@ -0,0 +1,357 @@
+"""
+A content-addressed store of downloaded archives and their unpacked trees, shared between virtualenvs.
+
+pip's --download-cache keeps archives by URL, so the same sdist fetched from a mirror or
+from a link with another query string is downloaded again, and two sb processes filling
+the cache at once may read each other's half-written files. With --artifact-cache DIR,
+archives are stored by the sha256 of their contents instead, and are only added once
+their hash was checked against the #md5=/#sha256=... fragment of the link, if it has one.
+A link is looked up by its hash fragment first, so requirements resolving to the same
+artifact share it whatever its URL is, and by its URL otherwise.
+
+Every archive is unpacked once, into a tree next to it, and build directories get
+reflinks to the files of that tree where `cp --reflink` works, and hardlinks otherwise,
+instead of a fresh extraction. The files of stored trees are read-only, and hardlinks
+share that mode, so a build writing to one of its sources fails instead of changing what
+the next build gets. Files which egg_info rewrites (the .egg-info directory, PKG-INFO and
+setup.cfg) are always copied; if egg_info fails on a hardlinked tree anyway, the build
+directory gets copies of all files and egg_info is run again (see copy_linked), and that
+archive is always copied from then on. Read-only files don't stop root, so root gets
+copies instead of hardlinks. A tree whose files changed all the same is
+unpacked again. Everything is written to a temporary name in DIR and renamed into place,
+so several sb processes may share DIR.
+"""
+import os
+import json
+import stat
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from pip.download import _get_response_from_url, _download_url, _get_hash_from_file, _check_hash
+from pip.util import unpack_file, display_path
+from pip.log import logger
+
+HASH_NAME = 'sha256'
+
+# next to an unpacked tree whose builds write to their own sources: its files are always copied
+COPY_MARKER = 'copy'
+
+# rewritten in place by setup.py egg_info and friends, never linked
+_copied_names = ('PKG-INFO', 'setup.cfg')
+
+
+def _file_hash(path, name=HASH_NAME):
+    digest = hashlib.new(name)
+    f = open(path, 'rb')
+    try:
+        while True:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            digest.update(chunk)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+def _is_copied(relative_path):
+    parts = relative_path.split(os.sep)
+    return parts[-1] in _copied_names or any(part.endswith('.egg-info') for part in parts[:-1])
+
+
+def _walk_files(root):
+    """The paths of the files under root, relative to it."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+
+def _read_only(path):
+    mode = stat.S_IMODE(os.lstat(path).st_mode)
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _writable(path):
+    mode = stat.S_IMODE(os.lstat(path).st_mode)
+    os.chmod(path, mode | stat.S_IWUSR)
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except (OSError, AttributeError):
+        # another filesystem, one without hardlinks, or Windows
+        shutil.copy2(source, target)
+
+
+def _reflink_tree(source, target):
+    """Copies the contents of source into target as reflinks, or returns False if the filesystem can't."""
+    try:
+        devnull = open(os.devnull, 'w')
+        try:
+            return subprocess.call(['cp', '-R', '--reflink=always', source + os.sep + '.', target],
+                                   stdout=devnull, stderr=devnull) == 0
+        finally:
+            devnull.close()
+    except OSError:
+        return False
+
+
+def _link_tree(source, target, copy_all=False):
+    """
+    Hardlinks the files of source into target, copying those which can't be linked or are rewritten by builds, or
+    all of them with copy_all. Copies are writable, links have the (read-only) mode of the stored file.
+    """
+    for dirpath, dirnames, filenames in os.walk(source):
+        relative_dir = os.path.relpath(dirpath, source)
+        target_dir = os.path.normpath(os.path.join(target, relative_dir))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        for filename in filenames:
+            source_file = os.path.join(dirpath, filename)
+            target_file = os.path.join(target_dir, filename)
+            if os.path.lexists(target_file):
+                os.remove(target_file)
+            if os.path.islink(source_file):
+                os.symlink(os.readlink(source_file), target_file)
+                continue
+            if copy_all or _is_copied(os.path.normpath(os.path.join(relative_dir, filename))):
+                shutil.copy2(source_file, target_file)
+                _writable(target_file)
+            else:
+                _link_or_copy(source_file, target_file)
+
+
+class ArtifactCache(object):
+
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.archives_dir = os.path.join(self.root, 'archives')
+        self.trees_dir = os.path.join(self.root, 'trees')
+        self.aliases_dir = os.path.join(self.root, 'aliases')
+        for d in (self.archives_dir, self.trees_dir, self.aliases_dir):
+            if not os.path.exists(d):
+                os.makedirs(d)
+        self.lock = threading.Lock()
+        self.reflinks = True  # until cp --reflink failed once
+        # read-only files don't stop root from writing to them, so root only gets copies
+        self.hardlinks = not (hasattr(os, 'geteuid') and os.geteuid() == 0)
+        self.linked = {}  # maps a build directory with hardlinked files -> the tree they are linked to
+        self.hits = 0
+        self.downloads = 0
+
+    def _write(self, path, data):
+        """Replaces path with data, atomically, so other sb processes never see half of it."""
+        fd, temp_path = tempfile.mkstemp('.tmp', 'sb-', os.path.dirname(path))
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _archive_paths(self, digest):
+        base = os.path.join(self.archives_dir, digest)
+        return base, base + '.json'
+
+    def _alias_path(self, kind, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return os.path.join(self.aliases_dir, '%s-%s' % (kind, hashlib.sha1(value).hexdigest()))
+
+    def _aliases(self, link):
+        """(kind, value) of the keys link may be stored under, the most specific first."""
+        aliases = []
+        if link.hash and link.hash_name:
+            aliases.append(('hash', '%s=%s' % (link.hash_name, link.hash.lower())))
+        aliases.append(('url', link.url.split('#', 1)[0]))
+        return aliases
+
+    def lookup(self, link):
+        """The digest of the stored archive link resolves to, or None."""
+        if link.hash_name == HASH_NAME and link.hash:
+            candidates = [link.hash.lower()]
+        else:
+            candidates = []
+            for kind, value in self._aliases(link):
+                try:
+                    f = open(self._alias_path(kind, value))
+                    try:
+                        candidates.append(f.read().strip())
+                    finally:
+                        f.close()
+                except IOError:
+                    pass
+        for digest in candidates:
+            archive_path, meta_path = self._archive_paths(digest)
+            if os.path.exists(archive_path) and os.path.exists(meta_path):
+                return digest
+        return None
+
+    def insert(self, link, archive_path, content_type):
+        """Moves the archive downloaded for link into the store, if its hash matches the link's. Returns its digest."""
+        if link.hash and link.hash_name:
+            _check_hash(_get_hash_from_file(archive_path, link), link)
+        digest = _file_hash(archive_path)
+        stored_path, meta_path = self._archive_paths(digest)
+        # the same contents under the same name, whichever process renames it last
+        os.rename(archive_path, stored_path)
+        self._write(meta_path, json.dumps({'filename': link.filename, 'content_type': content_type}))
+        for kind, value in self._aliases(link):
+            self._write(self._alias_path(kind, value), digest)
+        return digest
+
+    def download(self, link):
+        """Downloads link into the store, and returns the digest of the archive."""
+        target_url = link.url.split('#', 1)[0]
+        temp_dir = tempfile.mkdtemp('-download', 'sb-', self.archives_dir)
+        try:
+            resp = _get_response_from_url(target_url, link)
+            content_type = resp.info()['content-type']
+            temp_location = os.path.join(temp_dir, link.filename)
+            _download_url(resp, link, temp_location)
+            digest = self.insert(link, temp_location, content_type)
+            with self.lock:
+                self.downloads += 1
+            return digest
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def tree(self, digest, link):
+        """The directory holding the unpacked archive digest, unpacking it if there isn't an intact one."""
+        entry_dir = os.path.join(self.trees_dir, digest)
+        tree_dir = os.path.join(entry_dir, 'tree')
+        try:
+            f = open(os.path.join(entry_dir, 'manifest.json'))
+            try:
+                manifest = json.load(f)
+            finally:
+                f.close()
+            if self.is_intact(tree_dir, manifest):
+                return tree_dir
+        except (IOError, ValueError):
+            pass
+        archive_path, meta_path = self._archive_paths(digest)
+        f = open(meta_path)
+        try:
+            meta = json.load(f)
+        finally:
+            f.close()
+        temp_dir = tempfile.mkdtemp('-unpack', 'sb-', self.trees_dir)
+        try:
+            new_entry_dir = os.path.join(temp_dir, 'entry')
+            os.mkdir(new_entry_dir)
+            # unpack_file tells archive types apart by their extension first
+            named_archive = os.path.join(temp_dir, meta['filename'])
+            _link_or_copy(archive_path, named_archive)
+            unpack_file(named_archive, os.path.join(new_entry_dir, 'tree'), meta['content_type'], link)
+            manifest = {}
+            for path in _walk_files(os.path.join(new_entry_dir, 'tree')):
+                full_path = os.path.join(new_entry_dir, 'tree', path)
+                if not os.path.islink(full_path):
+                    # hardlinks share the mode: a build writing to a linked file fails instead of changing the store
+                    _read_only(full_path)
+                st = os.lstat(full_path)
+                manifest[path] = [st.st_size, st.st_mtime, st.st_mode]
+            self._write(os.path.join(new_entry_dir, 'manifest.json'), json.dumps(manifest))
+            if os.path.exists(entry_dir):
+                # a build changed its files, move it out of the way before replacing it
+                try:
+                    os.rename(entry_dir, os.path.join(temp_dir, 'stale'))
+                except OSError:
+                    pass
+            try:
+                os.rename(new_entry_dir, entry_dir)
+            except OSError:
+                # another sb process unpacked it at the same time
+                pass
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return tree_dir
+
+    def is_intact(self, tree_dir, manifest):
+        """Whether every file of the tree still has the size, modification time and mode it was unpacked with."""
+        for path, expected in manifest.items():
+            try:
+                st = os.lstat(os.path.join(tree_dir, path))
+            except OSError:
+                return False
+            if [st.st_size, st.st_mtime, st.st_mode] != expected:
+                return False
+        return True
+
+    def fetch(self, link):
+        """The digest of the archive of link in the store, downloading it first if it isn't there."""
+        digest = self.lookup(link)
+        if digest is None:
+            return self.download(link)
+        with self.lock:
+            self.hits += 1
+        logger.notify('Using %s from the artifact cache' % link.filename)
+        return digest
+
+    def archive(self, digest):
+        """(path, content type) of the stored archive with the given digest."""
+        archive_path, meta_path = self._archive_paths(digest)
+        f = open(meta_path)
+        try:
+            return archive_path, json.load(f)['content_type']
+        finally:
+            f.close()
+
+    def unpack(self, link, location, digest=None):
+        """
+        Unpacks the archive of link into location, from the store, downloading it first if it isn't there. digest is
+        that of the archive, if it was already fetched.
+        """
+        if digest is None:
+            digest = self.fetch(link)
+        tree_dir = self.tree(digest, link)
+        if not os.path.exists(location):
+            os.makedirs(location)
+        if self.reflinks and _reflink_tree(tree_dir, location):
+            # reflinks are copies of their own, only their mode comes from the store
+            for path in _walk_files(location):
+                if not os.path.islink(os.path.join(location, path)):
+                    _writable(os.path.join(location, path))
+            logger.info('Reflinked the files of %s into %s' % (link.filename, display_path(location)))
+            return
+        self.reflinks = False
+        if not self.hardlinks or os.path.exists(os.path.join(os.path.dirname(tree_dir), COPY_MARKER)):
+            _link_tree(tree_dir, location, copy_all=True)
+            logger.info('Copied the files of %s into %s' % (link.filename, display_path(location)))
+            return
+        _link_tree(tree_dir, location)
+        with self.lock:
+            self.linked[os.path.abspath(location)] = tree_dir
+        logger.info('Linked the files of %s into %s' % (link.filename, display_path(location)))
+
+    def copy_linked(self, location):
+        """
+        Replaces the files hardlinked into location with writable copies, for a build which failed because it writes
+        to its own sources, and makes later unpacks of the same archive copy its files right away. Returns False if
+        location has no hardlinked files.
+        """
+        with self.lock:
+            tree_dir = self.linked.pop(os.path.abspath(location), None)
+        if tree_dir is None:
+            return False
+        shutil.rmtree(location)
+        _link_tree(tree_dir, location, copy_all=True)
+        try:
+            self._write(os.path.join(os.path.dirname(tree_dir), COPY_MARKER), '')
+        except (IOError, OSError), e:
+            logger.info('Could not mark %s to be copied: %s' % (tree_dir, e))
+        return True
+
+    def close(self):
+        archives = self.hits + self.downloads
+        if archives:
+            logger.notify('Artifact cache %s: %d of %d archives reused' % (self.root, self.hits, archives))
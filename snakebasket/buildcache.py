@@ -0,0 +1,263 @@
+"""
+A local cache of built packages, shared between virtualenvs.
+
+pip 1.3 cannot install wheels, so the cache stores what `setup.py install` put into the
+environment: the files listed in the package's installed-files.txt, as an archive relative
+to sys.prefix, together with the package's dependencies. A cached build is keyed by
+(normalized name, source id, interpreter tag). The source id is the commit hash for
+version control URLs, the hash fragment for archive URLs, and the version for packages
+from an index, so a key only matches the exact same source. Requirements which don't pin
+one of those (`foo>=1.0`, `git+...@master`) are always built, and builds of archive URLs
+without a hash fragment or of local directories are never stored.
+
+Editables are installed with `setup.py develop` from their checkout, they are never cached.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import tarfile
+import tempfile
+import threading
+from distutils.util import get_platform
+from distutils.sysconfig import get_python_lib
+import pkg_resources
+from pip.vcs import vcs
+from pip.log import logger
+from pip.util import display_path
+from versions import canonical_name
+
+CACHE_FORMAT_VERSION = 1
+
+_commit_hash_re = re.compile(r'^[0-9a-f]{40}$')
+_hash_fragment_re = re.compile(r'[#&](md5|sha1|sha224|sha256|sha384|sha512)=([0-9a-fA-F]+)')
+_requirements_section_re = re.compile(r'\[(.*?)\]')
+
+
+def interpreter_tag():
+    """Builds are only reused by the same Python implementation and version, on the same platform."""
+    implementation = 'pp' if hasattr(sys, 'pypy_version_info') else 'cp'
+    return '%s%d%d-%s' % (implementation, sys.version_info[0], sys.version_info[1],
+                          re.sub(r'[^A-Za-z0-9_.]+', '_', get_platform()))
+
+
+def _vcs_backend(url):
+    if url is None or '+' not in url.split(':', 1)[0]:
+        return None
+    return vcs.get_backend(url.split('+', 1)[0])
+
+
+def requested_source_id(req):
+    """The source id req pins before anything is downloaded, or None if it doesn't pin one."""
+    if req.editable:
+        return None
+    if req.url is not None:
+        backend = _vcs_backend(req.url)
+        if backend is not None:
+            rev = backend(req.url).get_url_rev()[1]
+            return rev if rev is not None and _commit_hash_re.match(rev) else None
+        match = _hash_fragment_re.search(req.url)
+        return '%s-%s' % (match.group(1), match.group(2).lower()) if match else None
+    if req.req is not None and len(req.req.specs) == 1 and req.req.specs[0][0] == '==':
+        return req.req.specs[0][1]
+    return None
+
+
+def built_source_id(req, from_index=False):
+    """
+    The source id of the source req was built from, or None if nothing pins it. from_index is True if req.url is the
+    link the index gave for req, rather than a URL it asked for.
+    """
+    if req.url is None or from_index:
+        return req.installed_version
+    backend = _vcs_backend(req.url)
+    if backend is not None:
+        return backend().get_revision(req.source_dir)
+    match = _hash_fragment_re.search(req.url)
+    if match:
+        return '%s-%s' % (match.group(1), match.group(2).lower())
+    return None
+
+
+def requirements_for_extras(lines, extras=()):
+    """The lines of a requires.txt which apply with extras, the same way InstallRequirement.requirements picks them."""
+    in_extra = None
+    for line in lines:
+        match = _requirements_section_re.match(line.lower())
+        if match:
+            in_extra = match.group(1)
+            continue
+        if in_extra and in_extra not in extras:
+            continue
+        yield line
+
+
+class CachedBuild(object):
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def archive(self):
+        return os.path.join(self.path, 'files.tar')
+
+    def requirement_lines(self, extras=()):
+        return list(requirements_for_extras(self.meta['requires'], extras))
+
+    @property
+    def dependency_links(self):
+        return self.meta['dependency_links']
+
+
+class BuildCache(object):
+
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.prefix = os.path.normpath(sys.prefix)
+        self.tag = interpreter_tag()
+        self.lock = threading.Lock()
+
+    def build_dir(self, name, source_id):
+        safe_id = re.sub(r'[^A-Za-z0-9_.+-]+', '_', source_id)
+        return os.path.join(self.root, canonical_name(name), '%s-%s' % (safe_id, self.tag))
+
+    def lookup(self, req):
+        """The CachedBuild of req, or None if req isn't pinned or hasn't been built yet."""
+        if req.name is None:
+            return None
+        source_id = requested_source_id(req)
+        if source_id is None:
+            return None
+        path = self.build_dir(req.name, source_id)
+        try:
+            f = open(os.path.join(path, 'meta.json'))
+            try:
+                meta = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+        if meta.get('version') != CACHE_FORMAT_VERSION or not os.path.exists(os.path.join(path, 'files.tar')):
+            return None
+        return CachedBuild(path, meta)
+
+    def find_egg_info_dir(self, req):
+        """The .egg-info directory `setup.py install` created for req in site-packages, or None."""
+        site_packages = get_python_lib()
+        name = canonical_name(req.name)
+        for dist in pkg_resources.find_distributions(site_packages):
+            if canonical_name(dist.project_name) == name and dist.version == req.installed_version:
+                path = os.path.join(dist.location, dist.egg_name()) + '.egg-info'
+                if os.path.isdir(path):
+                    return path
+        return None
+
+    def installed_files(self, egg_info_dir):
+        """Every file the install created, relative to sys.prefix, or None if some of them are outside of it."""
+        record = os.path.join(egg_info_dir, 'installed-files.txt')
+        if not os.path.exists(record):
+            return None
+        paths = set()
+        for line in open(record):
+            line = line.strip()
+            if line:
+                paths.add(os.path.normpath(os.path.join(egg_info_dir, line)))
+        for root, dirs, files in os.walk(egg_info_dir):
+            for f in files:
+                paths.add(os.path.join(root, f))
+        relative = []
+        for path in sorted(paths):
+            if not os.path.isfile(path):
+                continue
+            if not path.startswith(self.prefix + os.sep):
+                return None
+            relative.append(os.path.relpath(path, self.prefix))
+        return relative
+
+    def store(self, req, from_index=False):
+        """
+        Adds the build of req, which was just installed into sys.prefix, to the cache. from_index is True if req.url
+        is the link the index gave for req.
+        """
+        source_id = built_source_id(req, from_index)
+        if source_id is None:
+            return
+        path = self.build_dir(req.name, source_id)
+        if os.path.exists(path):
+            return
+        egg_info_dir = self.find_egg_info_dir(req)
+        files = egg_info_dir and self.installed_files(egg_info_dir)
+        if not files:
+            logger.info('Not caching the build of %s: cannot tell which files it installed' % req.name)
+            return
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'name': req.name,
+            'package_version': req.installed_version,
+            'prefix': self.prefix,
+            'requires': list(req.egg_info_lines('requires.txt')),
+            'dependency_links': list(req.dependency_links),
+        }
+        parent = os.path.dirname(path)
+        with self.lock:
+            if not os.path.exists(parent):
+                os.makedirs(parent)
+        temp_dir = tempfile.mkdtemp('-build', 'sb-', parent)
+        try:
+            archive = tarfile.open(os.path.join(temp_dir, 'files.tar'), 'w')
+            try:
+                for f in files:
+                    archive.add(os.path.join(self.prefix, f), f)
+            finally:
+                archive.close()
+            f = open(os.path.join(temp_dir, 'meta.json'), 'w')
+            try:
+                json.dump(meta, f, indent=2, sort_keys=True)
+            finally:
+                f.close()
+            try:
+                # another sb process may have stored the same build in the meantime, theirs is as good as ours
+                os.rename(temp_dir, path)
+            except OSError:
+                pass
+            else:
+                logger.info('Stored the build of %s in %s' % (req.name, display_path(path)))
+        finally:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+
+    def install(self, build):
+        """Unpacks a cached build into sys.prefix, pointing the #! lines of its scripts at this environment."""
+        logger.notify('Installing %s %s from the build cache' % (build.meta['name'], build.meta['package_version']))
+        old_prefix = build.meta['prefix']
+        archive = tarfile.open(build.archive)
+        try:
+            members = archive.getmembers()
+            for member in members:
+                if os.path.isabs(member.name) or member.name.split('/')[0] == '..' or '/../' in member.name:
+                    raise tarfile.TarError('unsafe path %s in %s' % (member.name, build.archive))
+            archive.extractall(self.prefix, members)
+        finally:
+            archive.close()
+        if old_prefix == self.prefix:
+            return
+        for member in members:
+            if not member.isfile():
+                continue
+            path = os.path.join(self.prefix, member.name)
+            f = open(path, 'rb')
+            try:
+                first_line = f.readline()
+                if not first_line.startswith('#!') or old_prefix not in first_line:
+                    continue
+                rest = f.read()
+            finally:
+                f.close()
+            f = open(path, 'wb')
+            try:
+                f.write(first_line.replace(old_prefix, self.prefix))
+                f.write(rest)
+            finally:
+                f.close()
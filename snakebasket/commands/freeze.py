@@ -0,0 +1,46 @@
+import pip
+from pip.commands.freeze import FreezeCommand
+from pip.util import get_installed_distributions
+from ..parallel import WorkerPool
+
+class RFreezeCommand(FreezeCommand):
+
+    def __init__(self, *args, **kw):
+        super(RFreezeCommand, self).__init__(*args, **kw)
+        self.parser.add_option(
+            '-j', '--jobs',
+            dest='jobs',
+            action='store',
+            type='int',
+            default=1,
+            metavar='N',
+            help='Query the repositories of up to N editables in parallel.')
+
+    def run(self, options, args):
+        """
+        FreezeCommand.run, with the FrozenRequirements built up front: describing an editable takes a few git commands
+        in its checkout, so the checkouts are queried in parallel.
+        """
+        original_from_dist = pip.FrozenRequirement.__dict__['from_dist']
+        build = original_from_dist.__get__(None, pip.FrozenRequirement)
+        frozen = {}  # maps (key, location) of an installed distribution -> its FrozenRequirement
+
+        def from_dist(cls, dist, dependency_links, find_tags=False):
+            if not frozen:
+                dists = get_installed_distributions(local_only=options.local)
+                pool = WorkerPool(options.jobs)
+                try:
+                    reqs = pool.map(lambda d: build(d, dependency_links, find_tags=find_tags), dists)
+                finally:
+                    pool.close()
+                frozen.update(zip([(d.key, d.location) for d in dists], reqs))
+            req = frozen.get((dist.key, dist.location))
+            if req is None:
+                req = build(dist, dependency_links, find_tags=find_tags)
+            return req
+
+        pip.FrozenRequirement.from_dist = classmethod(from_dist)
+        try:
+            return super(RFreezeCommand, self).run(options, args)
+        finally:
+            pip.FrozenRequirement.from_dist = original_from_dist
@@ -1,20 +1,42 @@
 import sys
 import os
+import threading
 from pip.req import InstallRequirement, InstallationError, _make_build_dir, parse_requirements, Requirements
 from pip.commands.install import InstallCommand, RequirementSet
 from pip.exceptions import BestVersionAlreadyInstalled, CommandError, DistributionNotFound
-from pip.vcs import vcs
+from pip.vcs import vcs, git
+from pip.download import is_vcs_url, is_file_url, url_to_path
 from urllib2 import HTTPError
 import pkg_resources
 from pip.log import logger
 from pip.index import Link
 import tempfile
 import shutil
+import atexit
 from pip.backwardcompat import home_lib
 from pip.locations import virtualenv_no_global
-from pip.util import dist_in_usersite
+from pip.util import dist_in_usersite, call_subprocess, unpack_file
 from pip.baseparser import create_main_parser 
-from ..versions import  InstallReqChecker, PackageData
+from ..versions import  InstallReqChecker, PackageData, GitVersionComparator, canonical_name
+from ..ancestrycache import AncestryCache
+from ..parallel import WorkerPool, Reservation
+from ..gitcache import use_mirror_cache, use_mirrored_git
+from ..httppool import use_connection_pool
+from ..indexcache import IndexCache, CachingPackageFinder, use_index_cache
+from ..lockfile import write_lock, read_lock, locked_requirements
+from ..buildcache import BuildCache
+from ..artifactcache import ArtifactCache
+from ..installstate import InstallState, requested_identity
+from .. import installstate
+from .. import gitbackend
+from .. import gitmetadata
+from .. import indexprefetch
+from .. import partialclone
+from .. import sdistmetadata
+from .. import timing
+
+# written next to PKG-INFO in the .egg-info directory of editables
+EGG_INFO_REVISION_FILE = 'sb-revision.txt'
 
 class ExtendedRequirements(Requirements):
     def __init__(self, *args, **kwargs):
@@ -25,11 +47,43 @@ class ExtendedRequirements(Requirements):
             self._keys = [k for k in self._keys if k != key]
         del self._dict[key]
 
+class PreparedRequirement(object):
+    """What obtaining a requirement found out about it, kept until its dependencies are queued."""
+
+    def __init__(self, install):
+        self.install = install
+        self.is_bundle = False
+        self.bundle_requirements = []
+        self.dependency_links = []
+        self.requirement_lines = []
+        self.requirements_txt = []
+
 class RecursiveRequirementSet(RequirementSet):
 
     def __init__(self, *args, **kwargs):
         super(RecursiveRequirementSet, self).__init__(*args, **kwargs)
         self.options = None
+        self.jobs = 1
+        # With a lock file the requirements are already resolved: they are installed as given, without comparisons.
+        self.locked = False
+        self.requirements_files = {}  # maps editable name -> the requirements(-ENV).txt read from its checkout
+        # Only resolving: the metadata left in a checkout by an earlier egg_info is good enough if it's still up to
+        # date, winning editables aren't checked out, and archives aren't unpacked if their metadata can be read.
+        self.resolve_only = False
+        # maps id() of a requirement resolved without checking it out or unpacking it -> (commit, version)
+        self.resolved_from_metadata = {}
+        self.build_cache = None
+        self.artifact_cache = None
+        self.install_state = None
+        self.satisfied_by_installed = {}  # maps canonical name -> PackageData of the pre-installed package satisfying it
+        self.cached_builds = {}  # maps id() of a requirement -> the CachedBuild it will be installed from
+        self.found_in_index = set()  # id() of requirements whose url was set to the link the index gave for them
+        # maps id() of an editable whose dependencies were read from git -> the commit to check out if it's installed
+        self.deferred_checkouts = {}
+        self.index_prefetches = {}  # maps id() of a requirement -> the Task fetching its index pages
+        self.dependencies = {}  # maps canonical name -> canonical names of the requirements it depends on
+        # setup.py develop and uninstalling rewrite easy-install.pth, only one install may do that at a time
+        self.pth_lock = threading.Lock()
         self.requirements = ExtendedRequirements()
         self.install_req_checker = InstallReqChecker(
             self.src_dir,
@@ -39,203 +93,683 @@ class RecursiveRequirementSet(RequirementSet):
     def set_options(self, value):
         self.options = value
         self.install_req_checker.prefer_pinned_revision = value.prefer_pinned_revision
+        self.jobs = value.jobs
+        self.install_req_checker.pre_installed.jobs = value.jobs
+        self.locked = bool(value.from_lock)
+        # cached builds are relative to sys.prefix, they can't be installed anywhere else
+        if value.build_cache and not (value.root_path or value.use_user_site or value.target_dir or value.as_egg
+                                      or value.install_options or value.download_dir):
+            self.build_cache = BuildCache(value.build_cache)
+        if value.artifact_cache:
+            self.artifact_cache = ArtifactCache(value.artifact_cache)
+        # the state describes what's installed into sys.prefix, and is only worth asking if that may be kept
+        if value.install_state and not (value.force_reinstall or value.ignore_installed or value.root_path
+                                        or value.use_user_site or value.target_dir):
+            self.install_state = InstallState(installstate.default_path(), value.install_options or [],
+                                              value.global_options or [], value.as_egg)
 
     def prepare_files(self, finder, force_root_egg_info=False, bundle=False):
 
-        """Prepare process. Create temp directories, download and/or unpack files."""
+        """Prepare process. Create temp directories, download and/or unpack files.
+
+        Requirements are processed breadth-first, one frontier of the dependency graph at a time. With --jobs N
+        the download/unpack/egg_info step of requirements runs on N worker threads, starting as soon as a
+        requirement is queued, but everything that decides between conflicting versions still happens one
+        requirement at a time, in the same order as in a serial run.
+        """
         unnamed = list(self.unnamed_requirements)
         reqs = list(self.requirements.values())
-        while reqs or unnamed:
-            if unnamed:
-                req_to_install = unnamed.pop(0)
-            else:
-                req_to_install = reqs.pop(0)
-            install = True
-            best_installed = False
-            not_found = None
-            if not self.ignore_installed and not req_to_install.editable:
+        pool = WorkerPool(self.jobs)
+        scheduled = {}  # maps id() of a queued requirement -> its Task or Reservation
+        try:
+            while reqs or unnamed:
+                frontier = unnamed + reqs
+                unnamed, reqs = [], []
+                self.schedule_requirements(pool, scheduled, frontier, finder, force_root_egg_info, bundle)
+                for req_to_install in frontier:
+                    queued = len(reqs)
+                    ticket = scheduled.pop(id(req_to_install), None)
+                    try:
+                        self.prepare_requirement(req_to_install, ticket, finder, reqs, force_root_egg_info, bundle)
+                    finally:
+                        if isinstance(ticket, Reservation):
+                            ticket.release()
+                    # Start on the dependencies just found instead of waiting for the rest of the frontier.
+                    self.schedule_requirements(pool, scheduled, reqs[queued:], finder, force_root_egg_info, bundle)
+            if not self.resolve_only:
+                self.check_out_deferred(pool)
+        finally:
+            for ticket in scheduled.values():
+                if isinstance(ticket, Reservation):
+                    ticket.release()
+            pool.close()
+
+    def schedule_requirements(self, pool, scheduled, queued, finder, force_root_egg_info=False, bundle=False):
+        """
+        Starts obtaining those of the queued requirements which don't depend on decisions made while processing the
+        requirements queued before them. The others get a Reservation, holding their place in the order in which
+        requirements sharing a checkout or build directory are obtained, which is always the queue order.
+        """
+        if not pool.is_parallel or bundle:
+            return
+        for req_to_install in queued:
+            if id(req_to_install) in scheduled:
+                continue
+            location = self.obtain_location(req_to_install)
+            key = None if location is None else os.path.normcase(location).lower()
+            if self.needs_index_lookup(req_to_install):
+                self.index_prefetches[id(req_to_install)] = pool.submit(
+                    indexprefetch.prefetch, finder, req_to_install)
+            if not self.can_prefetch(req_to_install):
+                scheduled[id(req_to_install)] = pool.reserve(key)
+                continue
+            if req_to_install.editable and not os.path.exists(self.build_dir):
+                _make_build_dir(self.build_dir)
+            scheduled[id(req_to_install)] = pool.submit_after(
+                key, self.obtain_requirement_locked, location, req_to_install, finder, force_root_egg_info, bundle)
+
+    def obtain_location(self, req_to_install):
+        """The directory obtain_requirement will work in, or None if it's a fresh temporary directory."""
+        if req_to_install.editable:
+            if req_to_install.source_dir is not None:
+                return req_to_install.source_dir
+            if req_to_install.name is None:
+                return None
+            return os.path.join(self.src_dir, req_to_install.name.lower())
+        if req_to_install._temp_build_dir is not None:
+            return req_to_install._temp_build_dir
+        if req_to_install.req is None:
+            return None
+        return os.path.join(self.build_dir, req_to_install.name)
+
+    def can_prefetch(self, req_to_install):
+        """True if obtaining req_to_install doesn't depend on the requirements processed before it."""
+        if req_to_install.editable:
+            return True
+        if not req_to_install.url:
+            # index lookups see the dependency links collected from earlier requirements
+            return False
+        if self.build_cache is not None and self.build_cache.lookup(req_to_install) is not None:
+            # there's nothing to obtain
+            return False
+        if self.ignore_installed:
+            return True
+        with timing.phase('check_if_exists', req_to_install):
+            req_to_install.check_if_exists()
+        return req_to_install.satisfied_by is None
+
+    def needs_index_lookup(self, req_to_install):
+        """True if preparing req_to_install will look it up in the index, as far as can be told before its turn."""
+        if req_to_install.editable or req_to_install.url or req_to_install.name is None:
+            return False
+        if self.build_cache is not None and self.build_cache.lookup(req_to_install) is not None:
+            return False
+        if self.upgrade or self.ignore_installed:
+            return True
+        with timing.phase('check_if_exists', req_to_install):
+            req_to_install.check_if_exists()
+        return req_to_install.satisfied_by is None
+
+    def obtain_requirement_locked(self, location, req_to_install, finder, force_root_egg_info=False, bundle=False):
+        if location is None:
+            return self.obtain_requirement(req_to_install, True, None, finder, force_root_egg_info, bundle)
+        with self.install_req_checker.location_locks(location):
+            return self.obtain_requirement(req_to_install, True, None, finder, force_root_egg_info, bundle)
+
+    def prepare_requirement(self, req_to_install, ticket, finder, reqs, force_root_egg_info=False, bundle=False):
+        prefetch = self.index_prefetches.pop(id(req_to_install), None)
+        if prefetch is not None:
+            with timing.phase('find', req_to_install):
+                prefetch.result()
+        install = True
+        best_installed = False
+        not_found = None
+        unchanged = None
+        if self.install_state is not None and not req_to_install.editable:
+            with timing.phase('check_if_exists', req_to_install):
+                unchanged = self.install_state.unchanged_dist(req_to_install)
+        if unchanged is not None:
+            req_to_install.satisfied_by = unchanged
+            install = False
+            logger.notify('Requirement unchanged since it was installed: %s' % req_to_install)
+        elif not self.ignore_installed and not req_to_install.editable:
+            with timing.phase('check_if_exists', req_to_install):
                 req_to_install.check_if_exists()
 
-                if req_to_install.satisfied_by:
+            if req_to_install.satisfied_by:
+
+                # a locked requirement pins the version chosen when the lock was written, there's nothing to compare
+                with timing.phase('compare', req_to_install):
+                    substitute = None if self.locked else self.install_req_checker.get_available_substitute(req_to_install)
 
-                    substitute = self.install_req_checker.get_available_substitute(req_to_install)
-
-                    # if the req_to_install is identified as the best available substitue
-                    # AND
-                    # ( no version with req_to_install.name has been installed 
-                        # OR a different version of req_to_install.name has been installed
-                    # )
-                    # then set the self.upgrade flag to True to install req_to_install
-
-                    if (
-                        req_to_install == substitute.requirement
-                        and
-                        (
-                            req_to_install.name not in self.install_req_checker.pre_installed
-                            or
-                            self.install_req_checker.pre_installed[req_to_install.name].requirement is not req_to_install
-                        )
-                    ):
-                        self.upgrade = True 
-
-                    if self.upgrade:
-                        if not self.force_reinstall and not req_to_install.url:
-                            try:
+                # if the req_to_install is identified as the best available substitue
+                # AND
+                # ( no version with req_to_install.name has been installed 
+                    # OR a different version of req_to_install.name has been installed
+                # )
+                # then set the self.upgrade flag to True to install req_to_install
+
+                if (
+                    substitute is not None
+                    and
+                    req_to_install == substitute.requirement
+                    and
+                    (
+                        req_to_install.name not in self.install_req_checker.pre_installed
+                        or
+                        self.install_req_checker.pre_installed[req_to_install.name].requirement is not req_to_install
+                    )
+                ):
+                    self.upgrade = True 
+
+                if self.upgrade:
+                    if not self.force_reinstall and not req_to_install.url:
+                        try:
+                            with timing.phase('find', req_to_install):
                                 url = finder.find_requirement(
                                     req_to_install, self.upgrade)
-                            except BestVersionAlreadyInstalled:
-                                best_installed = True
-                                install = False
-                            except DistributionNotFound:
-                                not_found = sys.exc_info()[1]
-                            else:
-                                # Avoid the need to call find_requirement again
-                                req_to_install.url = url.url
-
-                        if not best_installed:
-                            #don't uninstall conflict if user install and conflict is not user install
-                            if not (self.use_user_site and not dist_in_usersite(req_to_install.satisfied_by)):
-                                req_to_install.conflicts_with = req_to_install.satisfied_by
-                            req_to_install.satisfied_by = None
-                    else:
-                        install = False
-                if req_to_install.satisfied_by:
-                    if best_installed:
-                        logger.notify('Requirement already up-to-date: %s'
-                                      % req_to_install)
-                    else:
-                        logger.notify('Requirement already satisfied '
-                                      '(use --upgrade to upgrade): %s'
-                                      % req_to_install)
-            if req_to_install.editable:
-                logger.notify('Obtaining %s' % req_to_install)
-            elif install:
-                logger.notify('Downloading/unpacking %s' % req_to_install)
-            logger.indent += 2
+                        except BestVersionAlreadyInstalled:
+                            best_installed = True
+                            install = False
+                        except DistributionNotFound:
+                            not_found = sys.exc_info()[1]
+                        else:
+                            # Avoid the need to call find_requirement again
+                            req_to_install.url = url.url
+                            self.found_in_index.add(id(req_to_install))
+
+                    if not best_installed:
+                        #don't uninstall conflict if user install and conflict is not user install
+                        if not (self.use_user_site and not dist_in_usersite(req_to_install.satisfied_by)):
+                            req_to_install.conflicts_with = req_to_install.satisfied_by
+                        req_to_install.satisfied_by = None
+                else:
+                    install = False
+            if req_to_install.satisfied_by:
+                if best_installed:
+                    logger.notify('Requirement already up-to-date: %s'
+                                  % req_to_install)
+                else:
+                    logger.notify('Requirement already satisfied '
+                                  '(use --upgrade to upgrade): %s'
+                                  % req_to_install)
+        cached_build = None
+        if install and not bundle and not req_to_install.editable and self.build_cache is not None:
+            cached_build = self.build_cache.lookup(req_to_install)
+        if req_to_install.editable:
+            logger.notify('Obtaining %s' % req_to_install)
+        elif cached_build is not None:
+            logger.notify('Using cached build of %s' % req_to_install)
+        elif install:
+            logger.notify('Downloading/unpacking %s' % req_to_install)
+        logger.indent += 2
+        try:
+            if cached_build is not None:
+                prepared = self.prepare_cached_build(req_to_install, cached_build)
+            elif isinstance(ticket, Reservation):
+                prepared = ticket.run(
+                    self.obtain_requirement, req_to_install, install, not_found, finder, force_root_egg_info, bundle)
+            elif ticket is not None:
+                prepared = ticket.result()
+            else:
+                prepared = self.obtain_requirement(req_to_install, install, not_found, finder, force_root_egg_info, bundle)
+            self.add_dependencies(req_to_install, prepared, finder, reqs, bundle)
+        finally:
+            logger.indent -= 2
+
+    def prepare_cached_build(self, req_to_install, cached_build):
+        """The PreparedRequirement of a requirement that will be installed from the build cache, without obtaining it."""
+        self.cached_builds[id(req_to_install)] = cached_build
+        prepared = PreparedRequirement(True)
+        prepared.dependency_links = cached_build.dependency_links
+        if not self.ignore_dependencies:
+            prepared.requirement_lines = cached_build.requirement_lines(req_to_install.extras)
+        return prepared
+
+    def check_out_deferred(self, pool):
+        """Checks out the editables that won, whose dependencies were read from git, and runs egg_info on them."""
+        tasks = [pool.submit(self.check_out_editable, req, self.deferred_checkouts.pop(id(req)))
+                 for req in self.requirements.values() if id(req) in self.deferred_checkouts]
+        for task in tasks:
+            task.result()
+
+    def check_out_editable(self, req_to_install, commit):
+        location = req_to_install.source_dir
+        self.install_req_checker.wait_for_background_work(location)
+        logger.notify('Checking out %s at %s' % (req_to_install.name, commit))
+        logger.indent += 2
+        try:
+            with timing.phase('checkout', req_to_install):
+                call_subprocess(['git', 'reset', '--hard', '-q', commit], cwd=location)
+                git.Git().update_submodules(location)
+            self.run_egg_info(req_to_install, location)
+        finally:
+            logger.indent -= 2
+
+    def run_egg_info(self, req_to_install, location):
+        """Runs egg_info on an editable checkout, unless only resolving and the one left by an earlier run is fresh."""
+        if self.resolve_only and self.has_fresh_egg_info(location):
+            logger.info('Reusing the egg_info of %s in %s' % (req_to_install.name, location))
+        else:
+            with timing.phase('egg_info', req_to_install):
+                req_to_install.run_egg_info()
+            self.record_egg_info_revision(location)
+
+    def checkout_egg_info(self, source_dir):
+        """The .egg-info directory egg_info wrote into the root of a checkout, and its revision, or (None, None)."""
+        egg_infos = [d for d in os.listdir(source_dir) if d.endswith('.egg-info')]
+        backend = vcs.get_backend_from_location(source_dir)
+        if len(egg_infos) != 1 or backend is None:
+            return None, None
+        return os.path.join(source_dir, egg_infos[0]), backend().get_revision(source_dir)
+
+    def has_fresh_egg_info(self, source_dir):
+        """True if egg_info last ran on the revision checked out now, and setup.py hasn't changed since."""
+        egg_info_dir, revision = self.checkout_egg_info(source_dir)
+        if egg_info_dir is None:
+            return False
+        pkg_info = os.path.join(egg_info_dir, 'PKG-INFO')
+        revision_file = os.path.join(egg_info_dir, EGG_INFO_REVISION_FILE)
+        if not os.path.exists(pkg_info) or not os.path.exists(revision_file):
+            return False
+        if os.path.getmtime(pkg_info) < os.path.getmtime(os.path.join(source_dir, 'setup.py')):
+            return False
+        return open(revision_file).read().strip() == revision
+
+    def record_egg_info_revision(self, source_dir):
+        """Remembers which revision of a checkout egg_info ran on, so that sb resolve can skip running it again."""
+        egg_info_dir, revision = self.checkout_egg_info(source_dir)
+        if egg_info_dir is not None:
+            f = open(os.path.join(egg_info_dir, EGG_INFO_REVISION_FILE), 'w')
             try:
-                is_bundle = False
-                if req_to_install.editable:
-                    if req_to_install.source_dir is None:
-                        location = req_to_install.build_location(self.src_dir)
-                        req_to_install.source_dir = location
-                    else:
-                        location = req_to_install.source_dir
-                    if not os.path.exists(self.build_dir):
-                        _make_build_dir(self.build_dir)
-                    req_to_install.update_editable(not self.is_download)
-                    if self.is_download:
+                f.write(revision + '\n')
+            finally:
+                f.close()
+
+    def obtain_requirement(self, req_to_install, install, not_found, finder, force_root_egg_info=False, bundle=False):
+        """
+        Checks out, or downloads and unpacks req_to_install and runs egg_info on it. Only touches the requirement's
+        own location, so it may run on a worker thread. Returns a PreparedRequirement.
+        """
+        prepared = PreparedRequirement(install)
+        if req_to_install.editable:
+            if req_to_install.source_dir is None:
+                location = req_to_install.build_location(self.src_dir)
+                req_to_install.source_dir = location
+            else:
+                location = req_to_install.source_dir
+            if not os.path.exists(self.build_dir):
+                _make_build_dir(self.build_dir)
+            # background git commands in the same checkout would race with the update
+            self.install_req_checker.wait_for_background_work(location)
+            if not self.is_download and not bundle:
+                commit = self.read_editable_from_git(req_to_install, location, prepared)
+                if commit is not None:
+                    # only checked out if this is the version that ends up being installed, see check_out_deferred
+                    self.deferred_checkouts[id(req_to_install)] = commit
+                    return prepared
+            with timing.phase('checkout', req_to_install):
+                req_to_install.update_editable(not self.is_download)
+            if self.is_download:
+                with timing.phase('egg_info', req_to_install):
+                    req_to_install.run_egg_info()
+                req_to_install.archive(self.download_dir)
+            else:
+                self.run_egg_info(req_to_install, location)
+        elif install:
+            ##@@ if filesystem packages are not marked
+            ##editable in a req, a non deterministic error
+            ##occurs when the script attempts to unpack the
+            ##build directory
+
+            # NB: This call can result in the creation of a temporary build directory
+            location = req_to_install.build_location(self.build_dir, not self.is_download)
+
+            ## FIXME: is the existance of the checkout good enough to use it?  I don't think so.
+            unpack = True
+            url = None
+            if not os.path.exists(os.path.join(location, 'setup.py')):
+                ## FIXME: this won't upgrade when there's an existing package unpacked in `location`
+                if req_to_install.url is None:
+                    if not_found:
+                        raise not_found
+                    with timing.phase('find', req_to_install):
+                        url = finder.find_requirement(req_to_install, upgrade=self.upgrade)
+                else:
+                    ## FIXME: should req_to_install.url already be a link?
+                    url = Link(req_to_install.url)
+                    assert url
+                if url:
+                    metadata = None
+                    try:
+                        with timing.phase('unpack', req_to_install):
+                            if self.resolve_only and self.has_readable_archive(req_to_install, url):
+                                metadata = self.read_or_unpack_archive(req_to_install, url, location)
+                            else:
+                                self.unpack_url(url, location, self.is_download)
+                    except HTTPError:
+                        e = sys.exc_info()[1]
+                        logger.fatal('Could not install requirement %s because of error %s'
+                                     % (req_to_install, e))
+                        raise InstallationError(
+                            'Could not install requirement %s because of HTTP error %s for URL %s'
+                            % (req_to_install, e, url))
+                    if metadata is not None:
+                        version, requirement_lines, prepared.dependency_links = metadata
+                        if not self.ignore_dependencies:
+                            prepared.requirement_lines = requirement_lines
+                        self.resolved_from_metadata[id(req_to_install)] = (None, version)
+                        logger.info('Read the dependencies of %s from %s' % (req_to_install.name, url.filename))
+                        return prepared
+                else:
+                    unpack = False
+            if unpack:
+                prepared.is_bundle = req_to_install.is_bundle
+                if prepared.is_bundle:
+                    req_to_install.move_bundle_files(self.build_dir, self.src_dir)
+                    prepared.bundle_requirements = list(req_to_install.bundle_requirements())
+                elif self.is_download:
+                    req_to_install.source_dir = location
+                    with timing.phase('egg_info', req_to_install):
                         req_to_install.run_egg_info()
+                    if url and url.scheme in vcs.all_schemes:
                         req_to_install.archive(self.download_dir)
-                    else:
-                        req_to_install.run_egg_info()
-                elif install:
-                    ##@@ if filesystem packages are not marked
-                    ##editable in a req, a non deterministic error
-                    ##occurs when the script attempts to unpack the
-                    ##build directory
-
-                    # NB: This call can result in the creation of a temporary build directory
-                    location = req_to_install.build_location(self.build_dir, not self.is_download)
-
-                    ## FIXME: is the existance of the checkout good enough to use it?  I don't think so.
-                    unpack = True
-                    url = None
-                    if not os.path.exists(os.path.join(location, 'setup.py')):
-                        ## FIXME: this won't upgrade when there's an existing package unpacked in `location`
-                        if req_to_install.url is None:
-                            if not_found:
-                                raise not_found
-                            url = finder.find_requirement(req_to_install, upgrade=self.upgrade)
-                        else:
-                            ## FIXME: should req_to_install.url already be a link?
-                            url = Link(req_to_install.url)
-                            assert url
-                        if url:
-                            try:
-                                self.unpack_url(url, location, self.is_download)
-                            except HTTPError:
-                                e = sys.exc_info()[1]
-                                logger.fatal('Could not install requirement %s because of error %s'
-                                             % (req_to_install, e))
-                                raise InstallationError(
-                                    'Could not install requirement %s because of HTTP error %s for URL %s'
-                                    % (req_to_install, e, url))
-                        else:
-                            unpack = False
-                    if unpack:
-                        is_bundle = req_to_install.is_bundle
-                        if is_bundle:
-                            req_to_install.move_bundle_files(self.build_dir, self.src_dir)
-                            for subreq in req_to_install.bundle_requirements():
-                                reqs.append(subreq)
-                                self.add_requirement(subreq)
-                        elif self.is_download:
-                            req_to_install.source_dir = location
-                            req_to_install.run_egg_info()
-                            if url and url.scheme in vcs.all_schemes:
-                                req_to_install.archive(self.download_dir)
-                        else:
-                            req_to_install.source_dir = location
-                            req_to_install.run_egg_info()
-                            if force_root_egg_info:
-                                # We need to run this to make sure that the .egg-info/
-                                # directory is created for packing in the bundle
-                                req_to_install.run_egg_info(force_root_egg_info=True)
-                            req_to_install.assert_source_matches_version()
-                            #@@ sketchy way of identifying packages not grabbed from an index
-                            if bundle and req_to_install.url:
-                                self.copy_to_build_dir(req_to_install)
-                                install = False
-                            # req_to_install.req is only avail after unpack for URL pkgs
-                        # repeat check_if_exists to uninstall-on-upgrade (#14)
-                        req_to_install.check_if_exists()
-                        if req_to_install.satisfied_by:
-                            if self.upgrade or self.ignore_installed:
-                                #don't uninstall conflict if user install and and conflict is not user install
-                                if not (self.use_user_site and not dist_in_usersite(req_to_install.satisfied_by)):
-                                    req_to_install.conflicts_with = req_to_install.satisfied_by
-                                req_to_install.satisfied_by = None
-                            else:
-                                install = False
-                if not is_bundle:
-                    ## FIXME: shouldn't be globally added:
-                    finder.add_dependency_links(req_to_install.dependency_links)
-                    if (req_to_install.extras):
-                        logger.notify("Installing extra requirements: %r" % ','.join(req_to_install.extras))
-                    if not self.ignore_dependencies:
-                        for req in req_to_install.requirements(req_to_install.extras):
-                            try:
-                                name = pkg_resources.Requirement.parse(req).project_name
-                            except ValueError:
-                                e = sys.exc_info()[1]
-                                ## FIXME: proper warning
-                                logger.error('Invalid requirement: %r (%s) in requirement %s' % (req, e, req_to_install))
-                                continue
-                            if self.has_requirement(name):
-                                ## FIXME: check for conflict
-                                continue
-                            subreq = InstallRequirement(req, req_to_install)
-                            reqs.append(subreq)
-                            self.add_requirement(subreq)
-                        if req_to_install.editable and req_to_install.source_dir:
-                            for subreq in self.install_requirements_txt(req_to_install):
-                                if self.add_requirement(subreq):
-                                    reqs.append(subreq)
-                    if not self.has_requirement(req_to_install.name):
-                        #'unnamed' requirements will get added here
-                        self.add_requirement(req_to_install)
-                    if self.is_download or req_to_install._temp_build_dir is not None:
-                        self.reqs_to_cleanup.append(req_to_install)
                 else:
-                    self.reqs_to_cleanup.append(req_to_install)
-
-                if install:
-                    self.successfully_downloaded.append(req_to_install)
-                    if bundle and (req_to_install.url and req_to_install.url.startswith('file:///')):
+                    req_to_install.source_dir = location
+                    with timing.phase('egg_info', req_to_install):
+                        self.run_unpacked_egg_info(req_to_install, location)
+                    if force_root_egg_info:
+                        # We need to run this to make sure that the .egg-info/
+                        # directory is created for packing in the bundle
+                        with timing.phase('egg_info', req_to_install):
+                            req_to_install.run_egg_info(force_root_egg_info=True)
+                    req_to_install.assert_source_matches_version()
+                    #@@ sketchy way of identifying packages not grabbed from an index
+                    if bundle and req_to_install.url:
                         self.copy_to_build_dir(req_to_install)
+                        prepared.install = False
+                    # req_to_install.req is only avail after unpack for URL pkgs
+                # repeat check_if_exists to uninstall-on-upgrade (#14)
+                with timing.phase('check_if_exists', req_to_install):
+                    req_to_install.check_if_exists()
+                if req_to_install.satisfied_by:
+                    if self.upgrade or self.ignore_installed:
+                        #don't uninstall conflict if user install and and conflict is not user install
+                        if not (self.use_user_site and not dist_in_usersite(req_to_install.satisfied_by)):
+                            req_to_install.conflicts_with = req_to_install.satisfied_by
+                        req_to_install.satisfied_by = None
+                    else:
+                        prepared.install = False
+        if not prepared.is_bundle:
+            # Read the dependencies now: another requirement obtained into the same location may overwrite them.
+            prepared.dependency_links = req_to_install.dependency_links
+            if not self.ignore_dependencies:
+                prepared.requirement_lines = list(req_to_install.requirements(req_to_install.extras))
+                if req_to_install.editable and req_to_install.source_dir:
+                    prepared.requirements_txt = list(self.install_requirements_txt(req_to_install))
+        return prepared
+
+    def has_readable_archive(self, req_to_install, link):
+        """True if link points to an archive whose metadata sdistmetadata may read instead of unpacking it."""
+        if req_to_install.name is None or is_vcs_url(link) or link.filename.endswith('.pybundle'):
+            return False
+        return not (is_file_url(link) and os.path.isdir(url_to_path(link.url.split('#', 1)[0])))
+
+    def read_or_unpack_archive(self, req_to_install, link, location):
+        """
+        Only resolving: (version, requirement lines, dependency links) read from the archive of link, without
+        unpacking it. If they can't be read that way, it's unpacked into location instead, and None returned.
+        """
+        if self.artifact_cache is not None:
+            digest = self.artifact_cache.fetch(link)
+            metadata = sdistmetadata.read_metadata(self.artifact_cache.archive(digest)[0], req_to_install.extras)
+            if metadata is None:
+                self.artifact_cache.unpack(link, location, digest)
+            return metadata
+        temp_dir = tempfile.mkdtemp('-download', 'sb-')
+        try:
+            path, content_type = sdistmetadata.download(link, temp_dir)
+            metadata = sdistmetadata.read_metadata(path, req_to_install.extras)
+            if metadata is None:
+                unpack_file(path, location, content_type, link)
+            return metadata
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def run_unpacked_egg_info(self, req_to_install, location):
+        """
+        Runs egg_info on the archive unpacked in location. Files hardlinked from the artifact cache are read-only: if
+        setup.py fails on them, it may have written to its own sources, so it's run again on copies.
+        """
+        try:
+            req_to_install.run_egg_info()
+        except InstallationError:
+            if self.artifact_cache is None or not self.artifact_cache.copy_linked(location):
+                raise
+            logger.notify('setup.py egg_info failed on files linked from the artifact cache, running it on copies')
+            req_to_install.run_egg_info()
+
+    def unpack_url(self, link, location, only_download=False):
+        """Unpacks downloaded archives from the artifact cache, if there is one, see snakebasket.artifactcache."""
+        if (self.artifact_cache is None or only_download or is_vcs_url(link)
+                or (not link.hash and is_file_url(link)) or link.filename.endswith('.pybundle')):
+            return super(RecursiveRequirementSet, self).unpack_url(link, location, only_download)
+        self.artifact_cache.unpack(link, location)
+
+    def read_editable_from_git(self, req_to_install, location, prepared):
+        """
+        Reads the dependencies of the commit the editable req_to_install asks for into prepared, from the git objects
+        in location, without checking out a working tree. Returns the commit, or None if it has to be checked out (and
+        egg_info run on it) to know its dependencies, or its version when only resolving.
+        """
+        if not req_to_install.update or not req_to_install.url.startswith('git+'):
+            return None
+        with timing.phase('checkout', req_to_install):
+            if not self.install_req_checker.obtain_objects(req_to_install.url, location):
+                return None
+        backend = gitbackend.git_backend(location)
+        commit = gitmetadata.find_commit(backend, git.Git(req_to_install.url).get_url_rev()[1])
+        if commit is None:
+            return None
+        dependencies = gitmetadata.read_dependencies(backend, commit, req_to_install.extras)
+        if dependencies is None:
+            return None
+        version = None
+        if self.resolve_only:
+            # the commit won't be checked out, so the lock file can only get the version setup.py names literally
+            version = gitmetadata.literal_setup_version(backend.read_file(commit, 'setup.py'))
+            if version is None:
+                return None
+        requirements_txt = []
+        if not self.ignore_dependencies:
+            requirements_txt = self.committed_requirements_txt(req_to_install, backend, commit)
+            if requirements_txt is None:
+                return None
+            prepared.requirement_lines = dependencies[0]
+            prepared.requirements_txt = requirements_txt
+        prepared.dependency_links = dependencies[1]
+        if self.resolve_only:
+            self.resolved_from_metadata[id(req_to_install)] = (commit, version)
+        logger.info('Read the dependencies of %s from commit %s' % (req_to_install.name, commit))
+        return commit
+
+    def add_dependencies(self, req_to_install, prepared, finder, reqs, bundle=False):
+        """Queues the dependencies found by obtain_requirement. Decides version conflicts, so it always runs in order."""
+        if not prepared.is_bundle:
+            ## FIXME: shouldn't be globally added:
+            finder.add_dependency_links(prepared.dependency_links)
+            if (req_to_install.extras):
+                logger.notify("Installing extra requirements: %r" % ','.join(req_to_install.extras))
+            if not self.ignore_dependencies:
+                dependencies = self.dependencies.setdefault(canonical_name(req_to_install.name), set())
+                for req in prepared.requirement_lines:
+                    try:
+                        name = pkg_resources.Requirement.parse(req).project_name
+                    except ValueError:
+                        e = sys.exc_info()[1]
+                        ## FIXME: proper warning
+                        logger.error('Invalid requirement: %r (%s) in requirement %s' % (req, e, req_to_install))
+                        continue
+                    dependencies.add(canonical_name(name))
+                    if self.has_requirement(name):
+                        ## FIXME: check for conflict
+                        continue
+                    subreq = InstallRequirement(req, req_to_install)
+                    reqs.append(subreq)
+                    self.add_requirement(subreq)
+                for subreq in prepared.requirements_txt:
+                    if subreq.name:
+                        dependencies.add(canonical_name(subreq.name))
+                    if self.add_requirement(subreq):
+                        reqs.append(subreq)
+            if not self.has_requirement(req_to_install.name):
+                #'unnamed' requirements will get added here
+                self.add_requirement(req_to_install)
+            if self.is_download or req_to_install._temp_build_dir is not None:
+                self.reqs_to_cleanup.append(req_to_install)
+        else:
+            for subreq in prepared.bundle_requirements:
+                reqs.append(subreq)
+                self.add_requirement(subreq)
+            self.reqs_to_cleanup.append(req_to_install)
+
+        if prepared.install:
+            self.successfully_downloaded.append(req_to_install)
+            if bundle and (req_to_install.url and req_to_install.url.startswith('file:///')):
+                self.copy_to_build_dir(req_to_install)
+
+
+    def install(self, install_options, global_options=(), *args, **kwargs):
+        """
+        Install everything in this set, dependencies before the packages needing them. With --jobs N up to N packages
+        are installed at once, each as soon as the packages it depends on are. After the first failure no more
+        installs are started, and the error is raised once the installs already running have finished.
+        Requirements found in the build cache are unpacked from there, everything else that gets built is added to it.
+        """
+        to_install = self.install_order([r for r in self.requirements.values()
+                                         if not r.satisfied_by])
+
+        if to_install:
+            logger.notify('Installing collected packages: %s' % ', '.join([req.name for req in to_install]))
+        logger.indent += 2
+        pool = WorkerPool(self.jobs)
+        failed = threading.Event()
+        try:
+            tasks = {}
+            for requirement in to_install:
+                # install_order puts dependencies first, so their tasks are submitted (and picked up by the pool)
+                # before those waiting for them
+                dependencies = [tasks[name] for name in self.dependencies.get(canonical_name(requirement.name), ())
+                                if name in tasks]
+                tasks[canonical_name(requirement.name)] = pool.submit(
+                    self.install_after, dependencies, failed, requirement, install_options, global_options, args, kwargs)
+            first_error = None
+            for requirement in to_install:
+                try:
+                    tasks[canonical_name(requirement.name)].result()
+                except:
+                    failed.set()
+                    if first_error is None:
+                        first_error = sys.exc_info()
+            if first_error is not None:
+                raise first_error[0], first_error[1], first_error[2]
+        finally:
+            pool.close()
+            logger.indent -= 2
+        self.successfully_installed = to_install
+
+    def install_order(self, requirements):
+        """The requirements, each one after those it depends on (except within a dependency cycle)."""
+        by_name = dict((canonical_name(r.name), r) for r in requirements)
+        ordered = []
+        visited = set()
+
+        def visit(name):
+            if name in visited or name not in by_name:
+                return
+            visited.add(name)
+            for dependency in sorted(self.dependencies.get(name, ())):
+                visit(dependency)
+            ordered.append(by_name[name])
+
+        for requirement in requirements:
+            visit(canonical_name(requirement.name))
+        return ordered
+
+    def install_after(self, dependencies, failed, requirement, install_options, global_options, args, kwargs):
+        """Installs requirement once the tasks installing its dependencies have finished, unless an install failed."""
+        for task in dependencies:
+            task.wait()
+        if failed.is_set():
+            return
+        try:
+            self.install_requirement(requirement, install_options, global_options, *args, **kwargs)
+        except:
+            failed.set()
+            raise
+
+    def install_requirement(self, requirement, install_options, global_options=(), *args, **kwargs):
+        """Installs a single requirement, like one iteration of RequirementSet.install."""
+        if requirement.conflicts_with:
+            logger.notify('Found existing installation: %s'
+                          % requirement.conflicts_with)
+            logger.indent += 2
+            try:
+                with self.pth_lock:
+                    requirement.uninstall(auto_confirm=True)
             finally:
                 logger.indent -= 2
+        cached_build = self.cached_builds.get(id(requirement))
+        try:
+            if cached_build is not None:
+                with timing.phase('install', requirement):
+                    self.build_cache.install(cached_build)
+                requirement.install_succeeded = True
+            elif requirement.editable or requirement.as_egg:
+                with self.pth_lock, timing.phase('install', requirement):
+                    requirement.install(install_options, global_options, *args, **kwargs)
+            else:
+                with timing.phase('install', requirement):
+                    requirement.install(install_options, global_options, *args, **kwargs)
+        except:
+            error = sys.exc_info()
+            # if install did not succeed, rollback previous uninstall
+            if requirement.conflicts_with and not requirement.install_succeeded:
+                with self.pth_lock:
+                    requirement.rollback_uninstall()
+            self.record_install(requirement, cached_build, False)
+            raise error[0], error[1], error[2]
+        else:
+            if requirement.conflicts_with and requirement.install_succeeded:
+                requirement.commit_uninstall()
+        self.record_install(requirement, cached_build, requirement.install_succeeded)
+        if cached_build is None:
+            if self.build_cache is not None and not requirement.editable and requirement.install_succeeded:
+                self.store_build(requirement)
+            requirement.remove_temporary_source()
 
+    def record_install(self, requirement, cached_build, succeeded):
+        """Records the outcome of installing requirement in the install state, while its source is still there."""
+        if self.install_state is None:
+            return
+        try:
+            if not succeeded:
+                self.install_state.record_failed(requirement)
+            elif cached_build is not None:
+                self.install_state.record_installed(requirement, cached_build.meta['package_version'],
+                                                    requested_identity(requirement))
+            else:
+                self.install_state.record_installed(requirement, requirement.installed_version)
+        except Exception, e:
+            # only the next run will do more work than it has to
+            logger.warn('Could not record the install of %s: %s' % (requirement.name, e))
+
+    def store_build(self, requirement):
+        try:
+            self.build_cache.store(requirement, id(requirement) in self.found_in_index)
+        except (IOError, OSError, InstallationError), e:
+            # the package is installed, only the next install of it will be slower
+            logger.warn('Could not add the build of %s to the build cache: %s' % (requirement.name, e))
 
     def add_requirement(self, install_req):
         name = install_req.name
@@ -247,29 +781,89 @@ class RecursiveRequirementSet(RequirementSet):
             if install_req.url is None or len([i for i in self.unnamed_requirements if i.url == install_req.url]) == 0:
                 self.unnamed_requirements.append(install_req)
             return True
-        satisfied_by = self.install_req_checker.get_available_substitute(install_req)
+        if self.locked:
+            if install_req.editable:
+                self.install_req_checker.check_editable_is_unmodified(os.path.join(self.src_dir, name.lower()))
+            self.requirements[name] = install_req
+            return True
+        if install_req.editable:
+            # comparing editables may clone into the same directory a worker is obtaining a requirement in
+            with self.install_req_checker.location_locks(os.path.join(self.src_dir, name.lower())):
+                with timing.phase('compare', install_req):
+                    satisfied_by = self.install_req_checker.get_available_substitute(install_req)
+        else:
+            with timing.phase('compare', install_req):
+                satisfied_by = self.install_req_checker.get_available_substitute(install_req)
+        if (satisfied_by is not None and satisfied_by.state == PackageData.PREINSTALLED
+                and self.install_state is not None and self.install_state.failed(name)):
+            logger.notify("The last install of %s failed, installing it again" % name)
+            satisfied_by = None
         if satisfied_by is not None:
             logger.notify("Package %s already satisfied by %s" % (name, satisfied_by.__repr__()))
+            if satisfied_by.state == PackageData.PREINSTALLED:
+                self.satisfied_by_installed[canonical_name(name)] = satisfied_by
         else:
             self.requirements[name] = install_req
-        for n in self.install_req_checker.get_all_aliases(name):
-            self.requirement_aliases[n] = name
         return satisfied_by is None
 
-    def install_requirements_txt(self, req_to_install):
-        """If ENV is set, try to parse requirements-ENV.txt, falling back to requirements.txt if it exists."""
+    def has_requirement(self, project_name):
+        return self.install_req_checker.find_requirement_name(project_name) is not None
+
+    def get_requirement(self, project_name):
+        key = self.install_req_checker.find_requirement_name(project_name)
+        if key is None:
+            raise KeyError("No project with the name %r" % project_name)
+        return self.requirements[key]
+
+    def requirements_txt_candidates(self):
         rtxt_candidates = ["requirements.txt"]
         if self.options and self.options.env:
             rtxt_candidates.insert(0, "requirements-{0}.txt".format(self.options.env))
-        for r in rtxt_candidates:
+        return rtxt_candidates
+
+    def install_requirements_txt(self, req_to_install):
+        """If ENV is set, try to parse requirements-ENV.txt, falling back to requirements.txt if it exists."""
+        for r in self.requirements_txt_candidates():
             fullpath = os.path.join(req_to_install.source_dir, r)
             if os.path.exists(fullpath):
                 logger.notify("Found {0} in {1}, installing extra dependencies.".format(r, req_to_install.name))
+                self.requirements_files[req_to_install.name] = r
                 return parse_requirements(fullpath, req_to_install.name, None, self.options)
         return []
 
+    def committed_requirements_txt(self, req_to_install, backend, commit):
+        """
+        Like install_requirements_txt, but reads the file from commit in the git objects. Returns None if the file
+        refers to other files, which are only where it expects them in a checkout.
+        """
+        for r in self.requirements_txt_candidates():
+            contents = backend.read_file(commit, r)
+            if contents is None:
+                continue
+            if not gitmetadata.is_self_contained(contents):
+                return None
+            logger.notify("Found {0} in {1}, installing extra dependencies.".format(r, req_to_install.name))
+            self.requirements_files[req_to_install.name] = r
+            temp_dir = tempfile.mkdtemp('-requirements', 'sb-')
+            try:
+                temp_path = os.path.join(temp_dir, r)
+                f = open(temp_path, 'w')
+                try:
+                    f.write(contents)
+                finally:
+                    f.close()
+                requirements = list(parse_requirements(temp_path, req_to_install.name, None, self.options))
+            finally:
+                shutil.rmtree(temp_dir)
+            for req in requirements:
+                # point at the file where it will be in the checkout, not at the temporary copy
+                req.comes_from = req.comes_from.replace(temp_path, os.path.join(req_to_install.source_dir, r))
+            return requirements
+        return []
+
 class RInstallCommand(InstallCommand):
     summary = 'Recursively install packages'
+    resolve_only = False
 
     def __init__(self, *args, **kw):
         super(RInstallCommand, self).__init__(*args, **kw)
@@ -287,14 +881,146 @@ class RInstallCommand(InstallCommand):
             action='store_true',
             default=False,
             help='When comparing editables with explicitly given version with the default (no-version data in URL), use the pinned version.')
+        self.parser.add_option(
+            '-j', '--jobs',
+            dest='jobs',
+            action='store',
+            type='int',
+            default=1,
+            metavar='N',
+            help='Check out, download, unpack and run egg_info for up to N requirements in parallel, then install up to N packages at once whose dependencies are already installed (0: one per CPU core). Conflicting versions are still resolved in the same order as with a single job.')
+        self.parser.add_option(
+            '--git-cache-dir',
+            dest='git_cache_dir',
+            action='store',
+            default=None,
+            metavar='DIR',
+            help='Keep a bare mirror of every git remote in DIR, shared between virtualenvs, and create editable checkouts from it.')
+        self.parser.add_option(
+            '--git-backend',
+            dest='git_backend',
+            type='choice',
+            choices=gitbackend.backend_names,
+            default=gitbackend.BATCH,
+            help='How to query git when comparing editable versions: "batch" keeps one git cat-file process per repository, "subprocess" runs a git command per query.')
+        self.parser.add_option(
+            '--git-clone-mode',
+            dest='git_clone_mode',
+            type='choice',
+            choices=partialclone.modes,
+            default=partialclone.FULL,
+            help='How to clone editables: "full" clones everything, "blobless" (git 2.19+) downloads file contents only for the commits that are read or checked out, "shallow" clones only the tip of each branch and tag, and fetches more history when comparing versions needs it. Clones from --git-cache-dir are always full.')
+        self.parser.add_option(
+            '--comparison-cache',
+            dest='comparison_cache',
+            action='store',
+            default=None,
+            metavar='FILE',
+            help='Remember which commits of editables are ancestors of each other in FILE, so later runs needn\'t ask git again.')
+        self.parser.add_option(
+            '--lock',
+            dest='lock',
+            action='store',
+            default=None,
+            metavar='FILE',
+            help='Write the resolved requirements (exact versions, commit hashes of editables and URLs) to FILE.')
+        self.parser.add_option(
+            '--from-lock',
+            dest='from_lock',
+            action='store',
+            default=None,
+            metavar='FILE',
+            help='Install exactly the requirements in the lock file FILE, without resolving dependencies or comparing versions.')
+        self.parser.add_option(
+            '--build-cache',
+            dest='build_cache',
+            action='store',
+            default=None,
+            metavar='DIR',
+            help='Keep the builds of packages pinned to a version, commit hash or archive hash in DIR, and install them from there next time instead of downloading and building them again.')
+        self.parser.add_option(
+            '--artifact-cache',
+            dest='artifact_cache',
+            action='store',
+            default=None,
+            metavar='DIR',
+            help='Keep downloaded archives in DIR by the hash of their contents, checked against the hash in their link, and unpack each of them only once: build directories get hardlinks to the unpacked files. DIR may be shared by several virtualenvs and concurrent runs.')
+        self.parser.add_option(
+            '--index-cache',
+            dest='index_cache',
+            action='store',
+            default=None,
+            metavar='DIR',
+            help='Keep the index pages fetched, and the links found in them, in DIR. Later requests for a page ask the index whether it changed (with its ETag or Last-Modified date), and use the copy in DIR if it did not.')
+        self.parser.add_option(
+            '--no-connection-pool',
+            dest='connection_pool',
+            action='store_false',
+            default=True,
+            help='Open a new connection for every index page and download, instead of keeping connections to each host open for the whole run.')
+        self.parser.add_option(
+            '--no-install-state',
+            dest='install_state',
+            action='store_false',
+            default=True,
+            help='Do not record what gets installed in %s in the virtualenv, nor skip the requirements which ask for exactly what the last successful install of them installed.' % installstate.STATE_FILE)
+        self.parser.add_option(
+            '--timing-report',
+            dest='timing_report',
+            action='store',
+            default=None,
+            metavar='FILE',
+            help='Write the time spent in each phase (index lookup, unpacking, egg_info, checkout, version comparison, install) per requirement, and the number of git subprocesses and network requests, to FILE as JSON.')
+
 
+    def _build_package_finder(self, options, index_urls):
+        if not options.index_cache:
+            return super(RInstallCommand, self)._build_package_finder(options, index_urls)
+        return CachingPackageFinder(find_links=options.find_links,
+                                    index_urls=index_urls,
+                                    use_mirrors=options.use_mirrors,
+                                    mirrors=options.mirrors)
 
     def run(self, options, args):
+        if not options.timing_report:
+            return self.run_install(options, args)
+        timing.start()
+        try:
+            return self.run_install(options, args)
+        finally:
+            timing.finish(options.timing_report)
+
+    def run_install(self, options, args):
         if options.download_dir:
             options.no_install = True
             options.ignore_installed = True
         options.build_dir = os.path.abspath(options.build_dir)
         options.src_dir = os.path.abspath(options.src_dir)
+        if options.git_cache_dir:
+            use_mirror_cache(options.git_cache_dir)
+        if options.connection_pool:
+            use_connection_pool()
+        if options.index_cache:
+            index_cache = IndexCache(options.index_cache)
+            use_index_cache(index_cache)
+            atexit.register(index_cache.close)
+        gitbackend.select_backend(options.git_backend)
+        partialclone.select_mode(options.git_clone_mode)
+        if options.git_clone_mode != partialclone.FULL:
+            use_mirrored_git()
+        if options.comparison_cache:
+            GitVersionComparator.ancestry_cache = AncestryCache(options.comparison_cache)
+            atexit.register(GitVersionComparator.ancestry_cache.close)
+        lock = None
+        if options.from_lock:
+            if args or options.editables or options.requirements:
+                raise CommandError('--from-lock installs the requirements of the lock file only, do not give other requirements.')
+            lock = read_lock(options.from_lock)
+            if lock['env'] != options.env:
+                logger.warn('%s was resolved with --env=%s, installing it with --env=%s.' % (
+                    options.from_lock, lock['env'], options.env))
+            # everything in the lock file is already resolved
+            options.ignore_dependencies = True
         install_options = options.install_options or []
         if options.use_user_site:
             if virtualenv_no_global():
@@ -327,6 +1053,13 @@ class RInstallCommand(InstallCommand):
             force_reinstall=options.force_reinstall,
             use_user_site=options.use_user_site)
         requirement_set.set_options(options)
+        if requirement_set.artifact_cache is not None:
+            atexit.register(requirement_set.artifact_cache.close)
+        if requirement_set.install_state is not None:
+            atexit.register(requirement_set.install_state.close)
+        requirement_set.resolve_only = self.resolve_only
+        requirement_set.install_req_checker.fetch_stale_repos(options.jobs)
+        requirement_set.install_req_checker.check_all_for_uncommitted_changes()
         for name in args:
             requirement_set.add_requirement(
                 InstallRequirement.from_line(name, None))
@@ -336,6 +1069,9 @@ class RInstallCommand(InstallCommand):
         for filename in options.requirements:
             for req in parse_requirements(filename, finder=finder, options=options):
                 requirement_set.add_requirement(req)
+        if lock is not None:
+            for req in locked_requirements(lock, default_vcs=options.default_vcs):
+                requirement_set.add_requirement(req)
         if not requirement_set.has_requirements:
             if args or options.editables or options.requirements:
                 msg = 'All requirements seem to be already satisfied.'
@@ -351,6 +1087,7 @@ class RInstallCommand(InstallCommand):
                            'to %(name)s (see "pip help %(name)s")' % opts)
                 logger.warn(msg)
 
+            requirement_set.install_req_checker.close()
             return
 
         if (options.use_user_site and
@@ -368,6 +1105,11 @@ class RInstallCommand(InstallCommand):
             requirement_set.prepare_files(finder, force_root_egg_info=self.bundle, bundle=self.bundle)
         else:
             requirement_set.locate_files()
+        requirement_set.install_req_checker.close()
+
+        if options.lock:
+            write_lock(options.lock, requirement_set, options.env)
+            logger.notify('Wrote resolved requirements to %s' % options.lock)
 
         if not options.no_install and not self.bundle:
             requirement_set.install(install_options, global_options, root=options.root_path)
@@ -375,7 +1117,7 @@ class RInstallCommand(InstallCommand):
                                   requirement_set.successfully_installed])
             if installed:
                 logger.notify('Successfully installed %s' % installed)
-        elif not self.bundle:
+        elif not self.bundle and not self.resolve_only:
             downloaded = ' '.join([req.name for req in
                                    requirement_set.successfully_downloaded])
             if downloaded:
@@ -0,0 +1,43 @@
+import sys
+from .install import RInstallCommand
+from ..lockfile import locked_packages, requirement_line
+
+
+class RResolveCommand(RInstallCommand):
+    """
+    Resolve requirements the way install does, and print the requirements that
+    would be installed, without installing anything.
+
+    Editables are cloned without a working tree to compare their versions, and
+    the winning commits aren't checked out: their version, requirements.txt
+    and dependencies are read from the git objects when setup.py lists them
+    literally. Archives are downloaded, but only unpacked (and egg_info run on
+    them) when their setup.py computes its dependencies; otherwise the version
+    comes from PKG-INFO and the dependencies from setup.py in the archive.
+    Packages already in the build cache aren't downloaded, and checkouts whose
+    egg_info is up to date don't run it again. Use --lock FILE to export the
+    result as a lock file.
+    """
+    name = 'resolve'
+    usage = """
+      %prog [options] <requirement specifier> ...
+      %prog [options] -r <requirements file> ...
+      %prog [options] [-e] <vcs project url> ..."""
+    summary = 'Resolve requirements recursively, without installing them'
+    resolve_only = True
+
+    def run(self, options, args):
+        options.no_install = True
+        return super(RResolveCommand, self).run(options, args)
+
+    def run_install(self, options, args):
+        requirement_set = super(RResolveCommand, self).run_install(options, args)
+        if requirement_set is None:
+            return
+        try:
+            f = sys.stdout
+            for package in locked_packages(requirement_set):
+                f.write(requirement_line(package) + '\n')
+        finally:
+            requirement_set.cleanup_files(bundle=self.bundle)
+        return requirement_set
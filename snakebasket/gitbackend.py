@@ -0,0 +1,279 @@
+"""
+Backends answering the git questions asked while comparing versions of an editable:
+is a string a commit hash, which commit does a tag or branch name point to, and is
+one commit an ancestor of another. They also read files of a commit straight from the
+object database, so the dependencies of a version can be known without checking it out.
+
+SubprocessGitBackend forks one git process per question. BatchGitBackend keeps one
+long-lived `git cat-file --batch` process per repository, reads refs straight from
+the repository, and answers ancestry questions from an in-memory AncestryIndex of the
+commit graph. Backends are shared per repository for the whole run, so whatever they
+learn about (immutable) commits is reused.
+"""
+import os
+import re
+import atexit
+import subprocess
+import threading
+from pip.util import call_subprocess
+from pip.exceptions import InstallationError
+from pip.log import logger
+
+BATCH = 'batch'
+SUBPROCESS = 'subprocess'
+backend_names = [BATCH, SUBPROCESS]
+
+_selected_backend = BATCH
+_backends = {}  # maps (backend name, repo dir) -> backend instance
+_backends_lock = threading.Lock()  # git_backend is called from worker threads
+
+
+class SubprocessGitBackend(object):
+
+    def __init__(self, repo_dir):
+        self.repo_dir = repo_dir
+
+    def is_commit_hash(self, hash_candidate):
+        try:
+            ret = call_subprocess(['git', 'log', '-n', '1', hash_candidate, '--pretty=oneline'],
+                show_stdout=False, cwd=self.repo_dir)
+            return ret.split(" ")[0] == hash_candidate
+        except InstallationError:
+            # call_subprocess returns raises an InstallationError when the return value of a command is not 0.
+            # In this case it just means the given commit is not in the git repo.
+            return False
+
+    def resolve_ref(self, name):
+        ret = call_subprocess(['git', 'show-ref', '--dereference', name],
+            show_stdout=False, cwd=self.repo_dir)
+        return ret.splitlines()[-1].split(" ")[0]
+
+    def is_ancestor(self, parent, child):
+        # fails if there's no merge base (unrelated, or truncated by a shallow clone): not an ancestor either
+        ret = self._output_of(['git', 'merge-base', parent, child])
+        return ret is not None and ret.rstrip() == parent
+
+    def newest_first(self, commits):
+        """The commits, in an order in which a commit never precedes one of its descendants."""
+        return list(commits)
+
+    def forget_history(self):
+        """Drops what the backend knows about the commit graph, after more history was fetched into a shallow clone."""
+        pass
+
+    def _output_of(self, command):
+        """The output of a git command, or None if it fails (which is how git answers "no such object")."""
+        process = subprocess.Popen(command, cwd=self.repo_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = process.communicate()[0]
+        return output if process.returncode == 0 else None
+
+    def resolve_commit(self, name):
+        """The hash of the commit name (a hash, tag, branch or any other revision) refers to, or None."""
+        output = self._output_of(['git', 'rev-parse', '-q', '--verify', name + '^{commit}'])
+        return None if output is None else output.strip()
+
+    def read_file(self, commit, path):
+        """The contents of the file at path in commit, like `git show <commit>:<path>`, or None if there's none."""
+        return self._output_of(['git', 'cat-file', 'blob', '%s:%s' % (commit, path)])
+
+    def close(self):
+        pass
+
+
+class AncestryIndex(object):
+    """
+    The commit graph of a repository, loaded with a single `git rev-list --parents`. Every commit gets a
+    generation number (one more than that of its highest parent), so a commit can only be an ancestor of
+    commits with a higher generation, and walks can skip most of the history.
+    """
+
+    def __init__(self, parents):
+        self.parents = parents  # maps commit hash -> list of parent hashes
+        self.generation = {}
+
+    @classmethod
+    def build(cls, repo_dir, extra_commits=()):
+        """Indexes everything reachable from the refs of the repository, and from extra_commits."""
+        ret = call_subprocess(['git', 'rev-list', '--parents', '--topo-order', '--all'] + list(extra_commits),
+            show_stdout=False, cwd=repo_dir)
+        parents = {}
+        order = []
+        for line in ret.splitlines():
+            hashes = line.split()
+            if hashes:
+                parents[hashes[0]] = hashes[1:]
+                order.append(hashes[0])
+        index = cls(parents)
+        # --topo-order lists children before their parents
+        for commit in reversed(order):
+            index.generation[commit] = 1 + max([index.generation.get(p, 0) for p in parents[commit]] or [0])
+        return index
+
+    def knows(self, *commits):
+        return all(c in self.parents for c in commits)
+
+    def is_ancestor(self, parent, child):
+        """True if parent is child or one of its ancestors."""
+        min_generation = self.generation[parent]
+        visited = set([child])
+        stack = [child]
+        while stack:
+            commit = stack.pop()
+            if commit == parent:
+                return True
+            for p in self.parents.get(commit, ()):
+                if p not in visited and self.generation.get(p, 0) >= min_generation:
+                    visited.add(p)
+                    stack.append(p)
+        return False
+
+    def newest_first(self, commits):
+        return sorted(commits, key=lambda c: self.generation[c], reverse=True)
+
+
+class BatchGitBackend(SubprocessGitBackend):
+
+    def __init__(self, repo_dir):
+        super(BatchGitBackend, self).__init__(repo_dir)
+        self.lock = threading.Lock()
+        self.index = None  # AncestryIndex of the repository, built on the first ancestry question
+        self.common_dir = self.find_common_dir(repo_dir)
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_dir,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    @staticmethod
+    def find_common_dir(repo_dir):
+        git_dir = os.path.join(repo_dir, '.git')
+        if os.path.isfile(git_dir):
+            # a worktree or submodule: .git contains "gitdir: <path>"
+            git_dir = open(git_dir).read().strip()[len('gitdir:'):].strip()
+            git_dir = os.path.join(repo_dir, git_dir)
+        elif not os.path.isdir(git_dir):
+            git_dir = repo_dir  # a bare repository
+        common_dir_file = os.path.join(git_dir, 'commondir')
+        if os.path.isfile(common_dir_file):
+            git_dir = os.path.join(git_dir, open(common_dir_file).read().strip())
+        return os.path.normpath(git_dir)
+
+    def read_object(self, name):
+        """Returns (hash, type, contents) of the object name refers to, or None if there's no such object."""
+        with self.lock:
+            self.process.stdin.write(name + '\n')
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            if len(header) != 3:
+                # "<name> missing" or "<name> ambiguous"
+                return None
+            sha, type, size = header
+            contents = self.process.stdout.read(int(size))
+            self.process.stdout.read(1)  # the newline after the contents
+        return sha, type, contents
+
+    def is_commit_hash(self, hash_candidate):
+        obj = self.read_object(hash_candidate)
+        return obj is not None and obj[1] == 'commit' and obj[0] == hash_candidate
+
+    def forget_history(self):
+        self.index = None
+
+    def resolve_commit(self, name):
+        obj = self.read_object(name + '^{commit}')
+        return None if obj is None else obj[0]
+
+    def read_file(self, commit, path):
+        obj = self.read_object('%s:%s' % (commit, path))
+        return obj[2] if obj is not None and obj[1] == 'blob' else None
+
+    def read_refs(self):
+        """All refs of the repository, as a dict of ref name -> hash. Re-read each time, as fetches change them."""
+        refs = {}
+        packed_refs = os.path.join(self.common_dir, 'packed-refs')
+        if os.path.exists(packed_refs):
+            for line in open(packed_refs):
+                if line.startswith('#') or line.startswith('^'):
+                    continue
+                sha, name = line.split()
+                refs[name] = sha
+        refs_dir = os.path.join(self.common_dir, 'refs')
+        for root, dirs, files in os.walk(refs_dir):
+            for f in files:
+                if f.endswith('.lock'):
+                    continue
+                path = os.path.join(root, f)
+                name = 'refs/' + os.path.relpath(path, refs_dir).replace(os.sep, '/')
+                refs[name] = open(path).read().strip()
+        resolved = {}
+        for name, value in refs.items():
+            seen = set()
+            while value is not None and value.startswith('ref:') and value not in seen:
+                seen.add(value)
+                value = refs.get(value[len('ref:'):].strip())
+            if value is not None and not value.startswith('ref:'):
+                resolved[name] = value
+        return resolved
+
+    def resolve_ref(self, name):
+        # Same answer as the last line of `git show-ref --dereference <name>`: the last matching ref in
+        # sorted order (peeled, if it's an annotated tag). A ref matches if it's name or ends in /name.
+        refs = self.read_refs()
+        matches = sorted(r for r in refs if r == name or r.endswith('/' + name))
+        if not matches:
+            raise InstallationError('%s is not a tag or branch in %s' % (name, self.repo_dir))
+        sha = refs[matches[-1]]
+        obj = self.read_object(sha)
+        if obj is not None and obj[1] == 'tag':
+            peeled = self.read_object(sha + '^{}')
+            if peeled is not None:
+                return peeled[0]
+        return sha
+
+    def is_ancestor(self, parent, child):
+        if self.index is None or not self.index.knows(parent, child):
+            self.index = AncestryIndex.build(self.repo_dir, [parent, child])
+        return self.index.is_ancestor(parent, child)
+
+    def newest_first(self, commits):
+        # Don't build the index just for this: the ancestry questions that follow may be answered by the
+        # persistent cache.
+        if self.index is not None and self.index.knows(*commits):
+            return self.index.newest_first(commits)
+        return list(commits)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+def select_backend(name):
+    global _selected_backend
+    _selected_backend = name
+
+
+def git_backend(repo_dir):
+    """The shared backend for the git repository in repo_dir."""
+    key = (_selected_backend, os.path.normcase(os.path.abspath(repo_dir)))
+    with _backends_lock:
+        if key in _backends:
+            return _backends[key]
+        backend = None
+        if _selected_backend == BATCH:
+            try:
+                backend = BatchGitBackend(repo_dir)
+            except (OSError, IOError), e:
+                logger.debug('Cannot start git cat-file in %s (%s), falling back to git subprocesses' % (repo_dir, e))
+                if not os.path.isdir(repo_dir):
+                    # not cloned yet: the next call, once it is, gets a batch backend
+                    return SubprocessGitBackend(repo_dir)
+        if backend is None:
+            backend = SubprocessGitBackend(repo_dir)
+        _backends[key] = backend
+        return backend
+
+
+@atexit.register
+def close_backends():
+    with _backends_lock:
+        for backend in _backends.values():
+            backend.close()
+        _backends.clear()
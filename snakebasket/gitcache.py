@@ -0,0 +1,166 @@
+"""
+A shared cache of bare git mirrors for editable checkouts.
+
+Without a cache, every virtualenv clones each editable from its remote. With
+--git-cache-dir, snakebasket keeps one bare mirror per remote URL under the cache
+root. Mirrors are fetched at most once per sb run, and checkouts are cloned from
+the local mirror with git alternates (git clone --shared), so they share the
+mirror's objects instead of downloading and storing their own copy.
+
+The checkouts' origin still points at the real remote, but they need the
+mirror's object store. Don't remove the cache directory while virtualenvs
+created from it are in use.
+"""
+import os
+import re
+import hashlib
+import tempfile
+from pip.util import call_subprocess, display_path, rmtree
+from pip.vcs import vcs, git
+from pip.log import logger
+from parallel import LocationLocks
+import partialclone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class GitMirrorCache(object):
+
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.fetched = set()  # mirrors created or fetched during this run
+        self.locks = LocationLocks()
+
+    def mirror_dir(self, url):
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', url.rstrip('/').split('/')[-1].split(':')[-1])
+        if name.endswith('.git'):
+            name = name[:-4]
+        return os.path.join(self.root, '%s-%s.git' % (name, hashlib.sha1(url).hexdigest()[:12]))
+
+    def update_mirror(self, url):
+        """Creates the mirror of url, or fetches it if this hasn't happened during this run yet. Returns its path."""
+        path = self.mirror_dir(url)
+        with self.locks(path):
+            if path in self.fetched:
+                return path
+            if not os.path.exists(self.root):
+                os.makedirs(self.root)
+            lock_file = open(path + '.lock', 'w')
+            try:
+                # other sb processes may be using the same cache
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if os.path.exists(path):
+                    logger.notify('Fetching %s into git mirror %s' % (url, display_path(path)))
+                    call_subprocess(['git', 'fetch', '-q', '--prune', 'origin'], cwd=path)
+                else:
+                    logger.notify('Creating git mirror of %s in %s' % (url, display_path(path)))
+                    temp_dir = tempfile.mkdtemp('-mirror', 'sb-', self.root)
+                    try:
+                        call_subprocess(['git', 'clone', '-q', '--mirror', url, temp_dir])
+                        # Checkouts borrow objects from the mirror, so it must never prune any of them.
+                        call_subprocess(['git', 'config', 'gc.auto', '0'], cwd=temp_dir)
+                        os.rename(temp_dir, path)
+                    except:
+                        rmtree(temp_dir)
+                        raise
+            finally:
+                lock_file.close()
+            self.fetched.add(path)
+        return path
+
+    def clone(self, url, dest, checkout=True):
+        """Clones url into dest, borrowing the objects of the (freshly fetched) mirror of url."""
+        mirror = self.update_mirror(url)
+        options = [] if checkout else ['--no-checkout']
+        call_subprocess(['git', 'clone', '-q', '--shared'] + options + [mirror, dest])
+        call_subprocess(['git', 'config', 'remote.origin.url', url], cwd=dest)
+
+    def fetch(self, url, dest):
+        """Brings the origin branches and tags of the existing checkout dest up to date, via the mirror of url."""
+        mirror = self.update_mirror(url)
+        call_subprocess(['git', 'fetch', '-q', mirror,
+                         '+refs/heads/*:refs/remotes/origin/*', '+refs/tags/*:refs/tags/*'], cwd=dest)
+
+
+class MirroredGit(git.Git):
+    """
+    pip's git backend, cloning and fetching through a GitMirrorCache when one is configured, or else with the options
+    of the selected --git-clone-mode.
+    """
+
+    mirror_cache = None
+
+    def clone(self, url, dest, checkout=True):
+        if self.mirror_cache is not None:
+            self.mirror_cache.clone(url, dest, checkout)
+            return
+        options = [] if checkout else ['--no-checkout']
+        call_subprocess([self.cmd, 'clone', '-q'] + options + partialclone.clone_options() + [url, dest])
+        partialclone.after_clone(dest)
+
+    def obtain(self, dest):
+        if self.mirror_cache is None and not partialclone.clone_options():
+            return super(MirroredGit, self).obtain(dest)
+        url, rev = self.get_url_rev()
+        if rev:
+            rev_options = [rev]
+            rev_display = ' (to %s)' % rev
+        else:
+            rev_options = ['origin/master']
+            rev_display = ''
+        if self.check_destination(dest, url, rev_options, rev_display):
+            logger.notify('Cloning %s%s to %s' % (url, rev_display, display_path(dest)))
+            self.clone(url, dest)
+            #: repo may contain submodules
+            self.update_submodules(dest)
+            if rev:
+                rev_options = self.check_rev_options(rev, dest, rev_options)
+                partialclone.fetch_commit(dest, rev_options[0])
+                # Only do a checkout if rev_options differs from HEAD
+                if not self.get_revision(dest).startswith(rev_options[0]):
+                    call_subprocess([self.cmd, 'checkout', '-q'] + rev_options, cwd=dest)
+
+    def clone_objects(self, dest):
+        """Clones the repository into dest without checking out any files."""
+        url = self.get_url_rev()[0]
+        logger.notify('Cloning %s to %s without a working tree' % (url, display_path(dest)))
+        self.clone(url, dest, checkout=False)
+
+    def update(self, dest, rev_options):
+        if self.mirror_cache is None and not partialclone.is_shallow(dest):
+            return super(MirroredGit, self).update(dest, rev_options)
+        if self.mirror_cache is None:
+            call_subprocess([self.cmd, 'fetch', '-q'], cwd=dest)
+        else:
+            self.mirror_cache.fetch(self.get_url_rev()[0], dest)
+        if rev_options:
+            rev_options = self.check_rev_options(rev_options[0], dest, rev_options)
+            partialclone.fetch_commit(dest, rev_options[0])
+        call_subprocess([self.cmd, 'reset', '--hard', '-q'] + rev_options, cwd=dest)
+        #: update submodules
+        self.update_submodules(dest)
+
+    @classmethod
+    def fetch(cls, location):
+        """git fetch in an existing checkout, through the mirror cache if there is one."""
+        if cls.mirror_cache is None:
+            call_subprocess(['git', 'fetch', '-q'], cwd=location)
+        else:
+            cls.mirror_cache.fetch(cls().get_url(location), location)
+
+
+def use_mirrored_git():
+    """Makes pip clone and fetch git repositories with MirroredGit."""
+    if vcs.get_backend('git') is not MirroredGit:
+        vcs.unregister(name='git')
+        vcs.register(MirroredGit)
+
+
+def use_mirror_cache(root):
+    """Makes every git clone and fetch of this run go through a mirror cache in root."""
+    MirroredGit.mirror_cache = GitMirrorCache(root)
+    use_mirrored_git()
@@ -0,0 +1,152 @@
+"""
+The dependencies of a commit of an editable, read from its git repository without checking it out.
+
+Resolving versions only needs to know what each version of an editable depends on: the
+install_requires, extras_require and dependency_links its setup.py passes to setup(), and its
+requirements(-ENV).txt. The files are read from the object database (like `git show
+<commit>:setup.py`), and setup.py is parsed, not run. That only works if the arguments of
+setup() are literals; if they're computed, or setup.cfg may add to them, the commit has to be
+checked out and egg_info run to find out.
+"""
+import re
+import ast
+import pkg_resources
+import partialclone
+
+SETUP_ARGUMENTS = ('install_requires', 'extras_require', 'dependency_links')
+
+# Lines of a requirements file that refer to other files, relative to its location in a checkout.
+_relative_reference_re = re.compile(r'^\s*(-r|--requirement|-f|--find-links)')
+
+
+def find_commit(backend, rev):
+    """The commit pip would check out for rev (origin/master if None) in the repository of backend, or None."""
+    if rev is None:
+        names = ['refs/remotes/origin/master']
+    else:
+        # pip prefers the remote branch to a local branch or tag of the same name
+        names = ['refs/remotes/origin/%s' % rev, rev]
+    for name in names:
+        commit = backend.resolve_commit(name)
+        if commit is not None:
+            return commit
+    if rev is not None and partialclone.fetch_commit(backend.repo_dir, rev):
+        backend.forget_history()
+        return backend.resolve_commit(rev)
+    return None
+
+
+def _called_name(func):
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _setup_call(source):
+    """The setup() call of the setup.py source, or None unless there is exactly one, without *args or **kwargs."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, TypeError):
+        return None
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call) and _called_name(node.func) == 'setup']
+    if len(calls) != 1 or calls[0].starargs is not None or calls[0].kwargs is not None:
+        return None
+    return calls[0]
+
+
+def literal_setup_arguments(source):
+    """
+    The dependency arguments the setup.py with the given source passes to setup(), as a dict, or None if they can't be
+    known without running it: there isn't exactly one setup() call, it takes *args or **kwargs, or one of the
+    arguments isn't a literal.
+    """
+    call = _setup_call(source)
+    if call is None:
+        return None
+    arguments = {}
+    for keyword in call.keywords:
+        if keyword.arg in SETUP_ARGUMENTS:
+            try:
+                arguments[keyword.arg] = ast.literal_eval(keyword.value)
+            except ValueError:
+                return None
+    return arguments
+
+
+def literal_setup_version(source):
+    """The version the setup.py with the given source passes to setup(), or None if it isn't a string literal."""
+    call = _setup_call(source)
+    if call is None:
+        return None
+    for keyword in call.keywords:
+        if keyword.arg == 'version':
+            try:
+                version = ast.literal_eval(keyword.value)
+            except ValueError:
+                return None
+            return version if isinstance(version, basestring) else None
+    return None
+
+
+def _lines(value):
+    try:
+        return list(pkg_resources.yield_lines(value))
+    except (TypeError, AttributeError):
+        return None
+
+
+def requirement_lines(arguments, extras=()):
+    """
+    The requirements InstallRequirement.requirements(extras) would read from the requires.txt egg_info writes for
+    arguments, or None if that depends on more than the arguments (environment markers).
+    """
+    lines = _lines(arguments.get('install_requires', ()))
+    extras_require = arguments.get('extras_require', {})
+    if lines is None or not isinstance(extras_require, dict):
+        return None
+    for extra, requirements in sorted(extras_require.items()):
+        if ':' in extra:
+            return None
+        if extra.lower() in extras:
+            extra_lines = _lines(requirements)
+            if extra_lines is None:
+                return None
+            lines.extend(extra_lines)
+    if [line for line in lines if ';' in line]:
+        return None
+    return lines
+
+
+def read_dependencies(backend, commit, extras=()):
+    """
+    (requirement lines, dependency links) of the setup.py in commit, read through backend, or None if setup.py has to
+    run to tell them.
+    """
+    source = backend.read_file(commit, 'setup.py')
+    if source is None:
+        return None
+    return declared_dependencies(source, backend.read_file(commit, 'setup.cfg'), extras)
+
+
+def declared_dependencies(source, setup_cfg=None, extras=()):
+    """
+    (requirement lines, dependency links) declared by the setup.py with the given source, next to a setup.cfg with
+    the contents setup_cfg (None if there isn't one), or None if setup.py has to run to tell them.
+    """
+    if setup_cfg is not None and [a for a in SETUP_ARGUMENTS if a in setup_cfg]:
+        return None
+    arguments = literal_setup_arguments(source)
+    if arguments is None:
+        return None
+    lines = requirement_lines(arguments, extras)
+    links = _lines(arguments.get('dependency_links', ()))
+    if lines is None or links is None:
+        return None
+    return lines, links
+
+
+def is_self_contained(requirements_text):
+    """False if the requirements file refers to other files by a path relative to it, which only exist in a checkout."""
+    return not [line for line in requirements_text.splitlines() if _relative_reference_re.match(line)]
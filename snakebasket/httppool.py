@@ -0,0 +1,178 @@
+"""
+Persistent HTTP connections for index lookups and downloads.
+
+pip 1.3 builds a urllib2 opener for every request, and urllib2 sends `Connection: close`,
+so every index page and archive costs a new TCP connection, and a TLS handshake over
+https. The handlers here keep connections open instead, in a pool per host (and proxy
+tunnel) shared by the whole run and all of its threads. A request takes an idle
+connection to its host or opens a new one, and gives it back once its response has been
+read to the end; a response closed before that closes its connection, as the rest of the
+body is still on the way. If the server closed an idle connection in the meantime, a GET
+or HEAD request is sent again on a new one.
+
+https connections are pip's VerifiedHTTPSConnection, so certificates are checked as
+before. Python 2's ssl module can't resume TLS sessions: keeping the connection open is
+what saves the handshake.
+"""
+import socket
+import threading
+import urllib2
+import httplib
+from StringIO import StringIO
+from pip.backwardcompat import ssl
+from pip.download import URLOpener, VerifiedHTTPSConnection
+import timing
+
+MAX_IDLE_PER_HOST = 8
+
+_retried_methods = ('GET', 'HEAD')
+
+
+class ConnectionPool(object):
+    """Idle connections, by (connection class, host, tunnelled host)."""
+
+    def __init__(self):
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def put(self, key, connection):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(connection)
+                return
+        connection.close()
+
+
+pool = ConnectionPool()
+
+
+class PooledResponse(object):
+    """
+    The body of an httplib response, as the socket urllib2 wraps into its response object. Hands its connection back
+    to release(reusable) once the body is read to the end or closed.
+    """
+
+    def __init__(self, response, release):
+        self.response = response
+        self.release = release
+        self.buffer = None
+        if response.status >= 400 or response.length == 0:
+            # error pages are never read to the end, and there's nothing to wait for in an empty body
+            self.buffer = StringIO(response.read())
+            self.released()
+
+    def released(self):
+        if self.release is not None and self.response.isclosed():
+            release, self.release = self.release, None
+            release(not self.response.will_close)
+
+    def read(self, amt=None):
+        if self.buffer is not None:
+            return self.buffer.read() if amt is None else self.buffer.read(amt)
+        data = self.response.read(amt)
+        self.released()
+        return data
+
+    recv = read
+
+    def close(self):
+        if self.release is not None:
+            release, self.release = self.release, None
+            self.response.close()
+            release(False)
+
+
+class PooledConnectionsMixin(object):
+    """Replaces AbstractHTTPHandler.do_open, which opens a connection per request and closes it afterwards."""
+
+    def do_open(self, http_class, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items() if k not in headers))
+        headers = dict((name.title(), value) for name, value in headers.items())
+        tunnel_headers = {}
+        if req._tunnel_host and 'Proxy-Authorization' in headers:
+            tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+        key = (http_class, host, req._tunnel_host)
+
+        response = None
+        connection = None
+        if req.get_method() in _retried_methods:
+            connection = pool.get(key)
+        if connection is not None:
+            try:
+                response = self.send(connection, req, headers)
+            except socket.timeout, e:
+                connection.close()
+                raise urllib2.URLError(e)
+            except (socket.error, httplib.HTTPException):
+                # the server closed the connection while it was idle
+                connection.close()
+        if response is None:
+            connection = http_class(host, timeout=req.timeout)
+            if req._tunnel_host:
+                connection.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+            timing.count(timing.HTTP_CONNECTIONS)
+            try:
+                response = self.send(connection, req, headers)
+            except socket.error, e:
+                connection.close()
+                raise urllib2.URLError(e)
+
+        def release(reusable):
+            if reusable:
+                pool.put(key, connection)
+            else:
+                connection.close()
+
+        body = PooledResponse(response, release)
+        resp = urllib2.addinfourl(socket._fileobject(body, close=True), response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+    def send(self, connection, req, headers):
+        connection.request(req.get_method(), req.get_selector(), req.data, headers)
+        return connection.getresponse(buffering=True)
+
+
+class PooledHTTPHandler(PooledConnectionsMixin, urllib2.HTTPHandler):
+    pass
+
+
+class PooledHTTPSHandler(PooledConnectionsMixin, urllib2.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(VerifiedHTTPSConnection, req)
+
+
+def pooled_get_opener(self, *args, **kwargs):
+    """URLOpener.get_opener, with handlers that keep their connections open."""
+    if kwargs.get('scheme') == 'https':
+        if not ssl:
+            return _original_get_opener(self, *args, **kwargs)
+        director = urllib2.build_opener(PooledHTTPSHandler(), *args)
+        # like pip, strip out the HTTPHandler to prevent MITM spoofing
+        for handler in list(director.handlers):
+            if isinstance(handler, urllib2.HTTPHandler):
+                director.handlers.remove(handler)
+        return director
+    return urllib2.build_opener(PooledHTTPHandler(), *args)
+
+
+_original_get_opener = URLOpener.get_opener
+
+
+def use_connection_pool():
+    """Makes pip's urlopen, used for index pages and downloads, keep connections open for the rest of the run."""
+    URLOpener.get_opener = pooled_get_opener
@@ -0,0 +1,249 @@
+"""
+An on-disk cache of index pages, revalidated with conditional requests, and of the links parsed from them.
+
+With --index-cache DIR, every HTML page fetched over http(s) whose response has an ETag or a
+Last-Modified header is stored in DIR. The next request for it, in this run or a later one,
+sends If-None-Match / If-Modified-Since, and a 304 response is answered from the stored copy
+instead of downloading the page again. Pages are never used without revalidating them, so the
+cache can't make sb miss a new release.
+
+The links found in a page (the hrefs, and the homepage and download links pip follows) are
+cached too, keyed by the page's URL and contents, so a page that didn't change isn't parsed
+again either. Several sb processes may share the cache: files are replaced atomically, and a
+page whose stored contents don't match its metadata is fetched again.
+"""
+import os
+import json
+import hashlib
+import httplib
+import tempfile
+import threading
+import urllib2
+from StringIO import StringIO
+from pip.index import PackageFinder, HTMLPage, Link
+from pip.download import URLOpener
+from pip.log import logger
+
+_cache = None
+_conditional_headers = ('If-none-match', 'If-modified-since')  # as urllib2.Request capitalizes them
+
+
+def _sha1(data):
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def _read(path):
+    f = open(path, 'rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+class IndexCache(object):
+
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.pages_dir = os.path.join(self.root, 'pages')
+        self.links_dir = os.path.join(self.root, 'links')
+        for d in (self.pages_dir, self.links_dir):
+            if not os.path.exists(d):
+                os.makedirs(d)
+        self.lock = threading.Lock()
+        self.parsed = {}  # maps page key -> (links, rel links), for the pages already seen in this run
+        self.revalidated = 0  # pages answered from the cache after a 304
+        self.downloaded = 0  # pages downloaded, because they weren't cached or they changed
+        self.link_hits = 0
+        self.link_misses = 0
+
+    def _write(self, path, data):
+        """Replaces path with data, atomically, so other sb processes never see half of it."""
+        fd, temp_path = tempfile.mkstemp('.tmp', 'sb-', os.path.dirname(path))
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _page_paths(self, url):
+        base = os.path.join(self.pages_dir, _sha1(url))
+        return base + '.json', base + '.html'
+
+    def _load_page(self, url):
+        """(metadata, contents) of the stored page of url, or None if there isn't an intact one."""
+        meta_path, body_path = self._page_paths(url)
+        try:
+            meta = json.loads(_read(meta_path))
+            body = _read(body_path)
+        except (IOError, ValueError):
+            return None
+        if meta.get('url') != url or meta.get('sha1') != _sha1(body):
+            return None
+        return meta, body
+
+    def validators(self, url):
+        """The headers making a request for url conditional on the stored page, if there is one."""
+        stored = self._load_page(url)
+        if stored is None:
+            return {}
+        headers = {}
+        if stored[0].get('etag'):
+            headers['If-None-Match'] = stored[0]['etag']
+        if stored[0].get('last_modified'):
+            headers['If-Modified-Since'] = stored[0]['last_modified']
+        return headers
+
+    def store(self, url, response):
+        """Stores the page response brought for url, if it can be revalidated. Returns a response to read instead."""
+        body = response.read()
+        headers = response.info()
+        with self.lock:
+            self.downloaded += 1
+        if headers.get('etag') or headers.get('last-modified'):
+            meta = {
+                'url': url,
+                'real_url': response.geturl(),
+                'etag': headers.get('etag'),
+                'last_modified': headers.get('last-modified'),
+                'headers': str(headers),
+                'sha1': _sha1(body),
+            }
+            meta_path, body_path = self._page_paths(url)
+            try:
+                self._write(body_path, body)
+                self._write(meta_path, json.dumps(meta))
+            except (IOError, OSError), e:
+                logger.info('Could not store %s in the index cache: %s' % (url, e))
+        fresh = urllib2.addinfourl(StringIO(body), headers, response.geturl())
+        fresh.code = response.code
+        fresh.msg = response.msg
+        return fresh
+
+    def cached_response(self, url):
+        """A 200 response with the stored page of url, or None if it's gone."""
+        stored = self._load_page(url)
+        if stored is None:
+            return None
+        meta, body = stored
+        with self.lock:
+            self.revalidated += 1
+        response = urllib2.addinfourl(StringIO(body), httplib.HTTPMessage(StringIO(meta['headers'])),
+                                      meta['real_url'] or url)
+        response.code = 200
+        response.msg = 'OK'
+        return response
+
+    def parsed_links(self, page):
+        """(links, rel links) of page, as URLs, parsing the page only if its contents weren't seen before."""
+        key = _sha1(_sha1(page.url) + _sha1(page.content))
+        with self.lock:
+            found = self.parsed.get(key)
+            if found is not None:
+                self.link_hits += 1
+                return found
+        path = os.path.join(self.links_dir, key + '.json')
+        try:
+            stored = json.loads(_read(path))
+            found = [str(url) for url in stored['links']], [str(url) for url in stored['rel_links']]
+        except (IOError, ValueError, KeyError):
+            found = None
+        if found is None:
+            found = ([link.url for link in HTMLPage.links.fget(page)],
+                     [link.url for link in HTMLPage.rel_links(page)])
+            try:
+                self._write(path, json.dumps({'links': found[0], 'rel_links': found[1]}))
+            except (IOError, OSError), e:
+                logger.info('Could not store the links of %s in the index cache: %s' % (page.url, e))
+            with self.lock:
+                self.link_misses += 1
+        else:
+            with self.lock:
+                self.link_hits += 1
+        with self.lock:
+            self.parsed[key] = found
+        return found
+
+    def close(self):
+        pages = self.revalidated + self.downloaded
+        parsed = self.link_hits + self.link_misses
+        if pages or parsed:
+            logger.notify('Index cache %s: %d of %d pages unchanged, %d of %d link lists reused' % (
+                self.root, self.revalidated, pages, self.link_hits, parsed))
+
+
+class IndexCacheHandler(urllib2.BaseHandler):
+    """Makes requests for stored pages conditional, answers a 304 from the cache, and stores the HTML pages fetched."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def http_request(self, req):
+        if req.get_method() == 'GET' and not getattr(req, 'unconditional', False):
+            for name, value in self.cache.validators(req.get_full_url()).items():
+                req.add_unredirected_header(name, value)
+        return req
+
+    def http_response(self, req, response):
+        if req.get_method() != 'GET' or response.code != 200:
+            return response
+        if not response.info().get('content-type', '').lower().startswith('text/html'):
+            return response
+        return self.cache.store(req.get_full_url(), response)
+
+    def http_error_304(self, req, fp, code, msg, headers):
+        fp.close()
+        response = self.cache.cached_response(req.get_full_url())
+        if response is None:
+            # the stored page is gone (another process replaced it, or it was deleted), ask for the whole page
+            retry = urllib2.Request(req.get_full_url(), headers=dict(req.headers))
+            for name, value in req.unredirected_hdrs.items():
+                if name not in _conditional_headers:
+                    retry.add_unredirected_header(name, value)
+            retry.unconditional = True
+            response = self.parent.open(retry, timeout=req.timeout)
+        return response
+
+    https_request = http_request
+    https_response = http_response
+
+
+class CachedLinksHTMLPage(HTMLPage):
+    """An HTMLPage whose links are parsed only once for the same contents, see IndexCache.parsed_links."""
+
+    @property
+    def links(self):
+        return iter([Link(url, self) for url in _cache.parsed_links(self)[0]])
+
+    def rel_links(self):
+        return iter([Link(url, self) for url in _cache.parsed_links(self)[1]])
+
+
+class CachingPackageFinder(PackageFinder):
+    """A PackageFinder reading the links of index pages through the IndexCache given to use_index_cache."""
+
+    def _get_page(self, link, req):
+        return CachedLinksHTMLPage.get_page(link, req, cache=self.cache)
+
+
+def _get_opener_with_index_cache(self, *args, **kwargs):
+    return _original_get_opener(self, IndexCacheHandler(_cache), *args, **kwargs)
+
+
+_original_get_opener = None
+
+
+def use_index_cache(cache):
+    """Makes pip's urlopen revalidate and store index pages in cache, for the rest of the run."""
+    global _cache, _original_get_opener
+    if _original_get_opener is None:
+        _original_get_opener = URLOpener.get_opener
+        URLOpener.get_opener = _get_opener_with_index_cache
+    _cache = cache
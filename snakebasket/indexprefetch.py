@@ -0,0 +1,44 @@
+"""
+Fetching the index pages of requirements before it's their turn, for sb install --jobs N.
+
+PackageFinder.find_requirement fetches the index pages of a requirement one after another
+(the project page on every index and mirror, the pages it links to with rel="homepage" or
+"download", --find-links and dependency links) and keeps them in the finder's page cache.
+Which version it picks depends on the dependency links collected from the requirements
+processed before, so the lookup itself has to wait for its turn; fetching the pages
+doesn't. Every named requirement which will be looked up gets its pages fetched on a
+worker as soon as it's queued, and find_requirement reads them from the cache later.
+"""
+import posixpath
+from pip.index import Link
+
+
+def project_page_url(index_url, url_name):
+    """The page of project url_name on the index at index_url, like PackageFinder.find_requirement builds it."""
+    url = posixpath.join(index_url, url_name)
+    if not url.endswith('/'):
+        url += '/'
+    return url
+
+
+def page_locations(finder, req):
+    """The Links of the pages finder.find_requirement(req) will fetch, as far as the dependency links known now tell."""
+    url_name = req.url_name
+    locations = [project_page_url(url, url_name) for url in finder.index_urls + finder.mirror_urls]
+    locations.extend(finder.find_links)
+    locations.extend(list(finder.dependency_links))
+    if finder.index_urls:
+        main_index_url = project_page_url(finder.index_urls[0], url_name)
+        locations = [posixpath.join(main_index_url, version) for version in req.absolute_versions] + locations
+    url_locations = finder._sort_locations(locations)[1]
+    return [Link(url) for url in url_locations]
+
+
+def prefetch(finder, req):
+    """Fetches the pages looking up req will read into the page cache of finder."""
+    if finder.index_urls:
+        page = finder._get_page(Link(project_page_url(finder.index_urls[0], req.url_name)), req)
+        if page is None:
+            # the project is listed under another spelling of its name, find_requirement looks it up
+            return
+    finder._get_pages(page_locations(finder, req), req)
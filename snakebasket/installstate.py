@@ -0,0 +1,170 @@
+"""
+What sb installed into this environment, so that a rerun can skip what hasn't changed.
+
+An sqlite database in the virtualenv records for every package sb installs its identity, the inputs of the build
+and the outcome. The identity is the repository URL and commit for version control URLs (editables included), the
+archive URL and hash for archives with a hash fragment, and the version otherwise. The build inputs are the
+interpreter, whether it was installed as an editable or as an egg, and the install and global options.
+
+On a rerun, a requirement is skipped without being downloaded, built or installed if it asks for the identity that
+was installed last time, with the same build inputs, the install succeeded, and that version is still installed. A
+branch or tag of a git URL is resolved to a commit with `git ls-remote`, which doesn't clone anything. Editables are
+already skipped when the installed checkout is as new as the one asked for; the state only makes sure that one whose
+last install failed is installed again.
+"""
+import os
+import re
+import sys
+import json
+import sqlite3
+import threading
+import pkg_resources
+from pip.exceptions import InstallationError
+from pip.log import logger
+from pip.util import call_subprocess
+from buildcache import interpreter_tag, requested_source_id, built_source_id, _vcs_backend, _hash_fragment_re
+from versions import canonical_name
+
+STATE_FILE = 'sb-install-state.db'
+
+INSTALLED = 'installed'
+FAILED = 'failed'
+
+_commit_hash_re = re.compile(r'^[0-9a-f]{40}$')
+
+
+def default_path():
+    return os.path.join(sys.prefix, STATE_FILE)
+
+
+def remote_commit(url, rev):
+    """
+    The commit the branch or tag rev (master if None) of the git repository at url points to, asked from the remote
+    with git ls-remote, or None if it can't be told that way (rev is an abbreviated commit hash, or the remote can't
+    be reached).
+    """
+    rev = rev or 'master'
+    if _commit_hash_re.match(rev):
+        return rev
+    try:
+        output = call_subprocess(['git', 'ls-remote', url, rev, rev + '^{}'], show_stdout=False)
+    except InstallationError:
+        return None
+    refs = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            refs[parts[1]] = parts[0]
+    # like pip, prefer a branch to a tag of the same name; an annotated tag points to its peeled commit
+    for ref in ('refs/heads/%s' % rev, 'refs/tags/%s^{}' % rev, 'refs/tags/%s' % rev):
+        if ref in refs:
+            return refs[ref]
+    return None
+
+
+def _base_url(url):
+    backend = _vcs_backend(url)
+    if backend is not None:
+        return backend(url).get_url_rev()[0]
+    return url.split('#', 1)[0]
+
+
+def requested_identity(req):
+    """The identity req asks for, without downloading it, or None if that can't be told."""
+    if req.editable:
+        return None
+    if req.url is None:
+        version = requested_source_id(req)
+        return None if version is None else '==%s' % version
+    backend = _vcs_backend(req.url)
+    if backend is not None:
+        url, rev = backend(req.url).get_url_rev()
+        if backend.name == 'git':
+            commit = remote_commit(url, rev)
+        else:
+            commit = rev if rev is not None and _commit_hash_re.match(rev) else None
+        return None if commit is None else '%s@%s' % (url, commit)
+    source_id = requested_source_id(req)
+    return None if source_id is None else '%s@%s' % (_base_url(req.url), source_id)
+
+
+def installed_identity(req, version):
+    """The identity of what was built from req's source dir, installed as version."""
+    if req.url is not None and (_vcs_backend(req.url) is not None or _hash_fragment_re.search(req.url)):
+        return '%s@%s' % (_base_url(req.url), built_source_id(req))
+    return '==%s' % version
+
+
+class InstallState(object):
+
+    def __init__(self, path, install_options=(), global_options=(), as_egg=False):
+        self.path = os.path.abspath(path)
+        self.install_options = list(install_options)
+        self.global_options = list(global_options)
+        self.as_egg = as_egg
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS packages ('
+                        'name TEXT PRIMARY KEY, identity TEXT, inputs TEXT, version TEXT, outcome TEXT)')
+        self.db.commit()
+
+    def inputs(self, req):
+        """The build inputs of req, as they are stored."""
+        return json.dumps({
+            'interpreter': interpreter_tag(),
+            'editable': bool(req.editable),
+            'as_egg': bool(self.as_egg),
+            'install_options': self.install_options,
+            'global_options': self.global_options,
+        }, sort_keys=True)
+
+    def last_install(self, name):
+        """(identity, inputs, version, outcome) of the last install of the package, or None."""
+        with self.lock:
+            return self.db.execute('SELECT identity, inputs, version, outcome FROM packages WHERE name = ?',
+                                   (canonical_name(name),)).fetchone()
+
+    def failed(self, name):
+        """True if the last install of the package failed."""
+        row = self.last_install(name)
+        return row is not None and row[3] == FAILED
+
+    def unchanged_dist(self, req):
+        """
+        The installed distribution of req if it's what the last successful install of req put there, and req still
+        asks for the same identity with the same build inputs; None if req has to be installed as usual.
+        """
+        if req.name is None:
+            return None
+        row = self.last_install(req.name)
+        if row is None or row[3] != INSTALLED or row[1] != self.inputs(req):
+            return None
+        if requested_identity(req) != row[0]:
+            return None
+        try:
+            dist = pkg_resources.get_distribution(req.name)
+        except (pkg_resources.DistributionNotFound, pkg_resources.VersionConflict):
+            return None
+        if dist.version != row[2]:
+            return None
+        return dist
+
+    def record(self, req, outcome, identity=None, version=None):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)',
+                            (canonical_name(req.name), identity, self.inputs(req), version, outcome))
+            self.db.commit()
+
+    def record_installed(self, req, version, identity=None):
+        """Records that req was installed as version; identity defaults to that of what was built from its source dir."""
+        if identity is None:
+            identity = installed_identity(req, version)
+        self.record(req, INSTALLED, identity, version)
+        logger.info('Recorded the install of %s %s in %s' % (req.name, version, self.path))
+
+    def record_failed(self, req):
+        self.record(req, FAILED)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,153 @@
+"""
+Lock files record the outcome of resolving a set of requirements.
+
+`sb install --lock FILE` writes every requirement that ended up in the requirement
+set: its name and exact version, the commit an editable was checked out at, the URL
+it came from, and which requirements(-ENV).txt of the editable was followed.
+`sb install --from-lock FILE` installs exactly those packages, without reading any
+requirements.txt, following dependencies or comparing versions.
+
+The file is JSON:
+
+    {"env": "production",
+     "packages": [{"name": "foo", "version": "1.2", "editable": true,
+                   "url": "git+https://github.com/example/foo.git", "commit": "<sha1>",
+                   "requirements_file": "requirements-production.txt"}, ...]}
+"""
+import os
+import json
+from pip.req import InstallRequirement
+from pip.exceptions import InstallationError
+from pip.vcs import vcs
+
+LOCK_FORMAT_VERSION = 1
+
+
+def _version(req, cached_build=None):
+    if req.satisfied_by is not None:
+        return req.satisfied_by.version
+    if cached_build is not None:
+        return cached_build.meta['package_version']
+    if req.source_dir is not None and os.path.exists(req.source_dir):
+        return req.pkg_info()['version']
+    return None
+
+
+def _vcs_backend(url):
+    backend = vcs.get_backend(url.split('+', 1)[0])
+    if backend is None:
+        raise InstallationError('Cannot lock %s: only version control URLs can be locked as editables' % url)
+    return backend
+
+
+def locked_package(req, requirements_file=None, cached_build=None, resolved=None):
+    """
+    The lock file entry describing the resolved requirement req. resolved is the (commit, version) of a requirement
+    resolved from its metadata, without checking it out or unpacking it.
+    """
+    package = {
+        'name': req.name,
+        'version': resolved[1] if resolved is not None else _version(req, cached_build),
+        'editable': bool(req.editable),
+        'url': None,
+        'commit': None,
+        'requirements_file': requirements_file,
+    }
+    if req.editable:
+        backend = _vcs_backend(req.url)
+        package['url'] = '%s+%s' % (backend.name, backend(req.url).get_url_rev()[0])
+        if resolved is not None:
+            package['commit'] = resolved[0]
+        else:
+            package['commit'] = backend().get_revision(req.source_dir)
+    elif req.url is not None:
+        package['url'] = req.url
+    return package
+
+
+def installed_package(package_data, dist):
+    """The lock file entry of a package installed before the run, which satisfied a requirement."""
+    package = {
+        'name': dist.project_name,
+        'version': dist.version,
+        'editable': bool(package_data.editable),
+        'url': None,
+        'commit': None,
+        'requirements_file': None,
+    }
+    if package_data.editable:
+        backend = _vcs_backend(package_data.url)
+        url, rev = backend(package_data.url.split('#', 1)[0]).get_url_rev()
+        package['url'] = '%s+%s' % (backend.name, url)
+        package['commit'] = rev
+    return package
+
+
+def locked_packages(requirement_set):
+    """
+    The lock file entries of every requirement of requirement_set, and of the pre-installed packages that satisfied
+    requirements not in it, sorted by name.
+    """
+    packages = [locked_package(req, requirement_set.requirements_files.get(req.name),
+                               requirement_set.cached_builds.get(id(req)),
+                               requirement_set.resolved_from_metadata.get(id(req)))
+                for req in requirement_set.requirements.values()]
+    pre_installed = requirement_set.install_req_checker.pre_installed
+    for key, package_data in requirement_set.satisfied_by_installed.items():
+        if not requirement_set.has_requirement(key):
+            packages.append(installed_package(package_data, pre_installed.dists[key]))
+    return sorted(packages, key=lambda p: p['name'].lower())
+
+
+def write_lock(path, requirement_set, env=None):
+    lock = {
+        'version': LOCK_FORMAT_VERSION,
+        'env': env,
+        'packages': locked_packages(requirement_set),
+    }
+    f = open(path, 'w')
+    try:
+        json.dump(lock, f, indent=2, sort_keys=True)
+        f.write('\n')
+    finally:
+        f.close()
+
+
+def read_lock(path):
+    """Returns the parsed lock file, raising InstallationError if it's not a lock file snakebasket can use."""
+    try:
+        f = open(path)
+        try:
+            lock = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError), e:
+        raise InstallationError('Cannot read lock file %s: %s' % (path, e))
+    if not isinstance(lock, dict) or lock.get('version') != LOCK_FORMAT_VERSION:
+        raise InstallationError('%s is not a version %d snakebasket lock file' % (path, LOCK_FORMAT_VERSION))
+    return lock
+
+
+def requirement_line(package):
+    """The requirements.txt line installing exactly the package of a lock file entry."""
+    name = package['name']
+    if package['editable']:
+        return '-e %s@%s#egg=%s' % (package['url'], package['commit'], name)
+    elif package['url'] is not None:
+        url = package['url']
+        if '#egg=' not in url:
+            url = '%s#egg=%s' % (url, name)
+        return url
+    elif package['version'] is not None:
+        return '%s==%s' % (name, package['version'])
+    return name
+
+
+def locked_requirements(lock, default_vcs=None):
+    """InstallRequirements pinning exactly the packages of lock."""
+    for package in lock['packages']:
+        line = requirement_line(package)
+        if package['editable']:
+            yield InstallRequirement.from_editable(line[len('-e '):], default_vcs=default_vcs)
+        else:
+            yield InstallRequirement.from_line(line)
@@ -6,8 +6,14 @@ def main(*args, **kwargs):
     return pip_main(*args, **kwargs)
 
 def install_pip_patches():
-    from snakebasket.commands import install
+    from snakebasket.commands import install, freeze, resolve
     sys.modules['pip'].commands['install'] = install.RInstallCommand
+    sys.modules['pip'].commands['freeze'] = freeze.RFreezeCommand
+    sys.modules['pip'].commands['resolve'] = resolve.RResolveCommand
+    import pip.vcs.git
+    from patches import batched_git_get_tag_revs, batched_git_get_branch_revs
+    sys.modules['pip.vcs.git'].Git.get_tag_revs = batched_git_get_tag_revs
+    sys.modules['pip.vcs.git'].Git.get_branch_revs = batched_git_get_branch_revs
     return
     import pip.vcs.git
     from patches import patched_git_get_src_requirement
@@ -0,0 +1,251 @@
+"""
+Helpers for running parts of an sb install on a bounded pool of worker threads.
+
+pip's logger is a process-wide singleton whose indentation and download progress
+state assume a single thread. Work submitted to a WorkerPool has its log output
+buffered per task and replayed by the main thread when the result is collected,
+so the console output of a parallel run stays grouped per package and appears in
+the same order as in a serial run.
+"""
+import sys
+import os
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from pip.log import logger, Logger
+
+_local = threading.local()
+# Waiting with a timeout keeps the main thread responsive to Ctrl-C on Python 2.
+_WAIT_FOREVER = 60 * 60 * 24 * 365
+
+
+def _log_buffer():
+    return getattr(_local, 'buffer', None)
+
+
+class ThreadLocalLogger(Logger):
+    """pip's Logger, with indentation and progress reporting kept per worker thread."""
+
+    def _get_indent(self):
+        if _log_buffer() is not None:
+            return _local.indent
+        return self.__dict__.get('indent', 0)
+
+    def _set_indent(self, value):
+        if _log_buffer() is not None:
+            _local.indent = value
+        else:
+            self.__dict__['indent'] = value
+
+    indent = property(_get_indent, _set_indent)
+
+    def log(self, level, msg, *args, **kw):
+        buffer = _log_buffer()
+        if buffer is None:
+            return Logger.log(self, level, msg, *args, **kw)
+        args = args or kw
+        if args:
+            msg = msg % args
+        buffer.append((level, _local.indent, msg))
+
+    def start_progress(self, msg):
+        if _log_buffer() is None:
+            return Logger.start_progress(self, msg)
+        _local.progress = msg
+
+    def show_progress(self, message=None):
+        if _log_buffer() is None:
+            return Logger.show_progress(self, message)
+
+    def end_progress(self, msg='done.'):
+        if _log_buffer() is None:
+            return Logger.end_progress(self, msg)
+        self.notify(_local.progress + msg)
+        _local.progress = None
+
+
+def install_thread_local_logger():
+    if not isinstance(logger, ThreadLocalLogger):
+        indent = logger.indent
+        logger.__class__ = ThreadLocalLogger
+        logger.indent = indent
+
+
+def replay_log(buffer):
+    base_indent = logger.indent
+    try:
+        for level, indent, msg in buffer:
+            logger.indent = base_indent + indent
+            logger.log(level, msg)
+    finally:
+        logger.indent = base_indent
+
+
+def run_with_log_buffer(func, *args, **kwargs):
+    """Runs func, returning (result, exc_info, log buffer) instead of logging or raising."""
+    _local.buffer = []
+    _local.indent = 0
+    try:
+        try:
+            return func(*args, **kwargs), None, _local.buffer
+        except Exception:
+            return None, sys.exc_info(), _local.buffer
+    finally:
+        del _local.buffer
+
+
+def _run_after(previous, done, func, *args, **kwargs):
+    try:
+        if previous is not None:
+            # The pool hands out tasks in submission order, so previous is already running or finished.
+            previous.wait()
+        return func(*args, **kwargs)
+    finally:
+        done.set()
+
+
+def _run_and_signal(finished, func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        finished.set()
+
+
+class Task(object):
+    """Handle to a unit of work submitted to a WorkerPool."""
+
+    def __init__(self, func, args, kwargs, async_result=None, finished=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.async_result = async_result
+        self.finished = finished
+        self.done = False
+        self.value = None
+        self.exc_info = None
+
+    def result(self):
+        """Waits for the task, replays its log output and returns its value (or re-raises its exception)."""
+        if self.async_result is None:
+            # serial mode: run the work right now, in the calling thread, once.
+            if not self.done:
+                self.done = True
+                try:
+                    self.value = self.func(*self.args, **self.kwargs)
+                except Exception:
+                    self.exc_info = sys.exc_info()
+            if self.exc_info is not None:
+                raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+            return self.value
+        value, exc_info, buffer = self.async_result.get(_WAIT_FOREVER)
+        if not self.done:
+            self.done = True
+            replay_log(buffer)
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return value
+
+    def wait(self):
+        """
+        Waits for a task running on a worker thread to finish, without collecting its result. Any number of threads
+        may wait for the same task (an AsyncResult only wakes up one of the threads waiting for it on Python 2).
+        """
+        if self.finished is not None:
+            self.finished.wait(_WAIT_FOREVER)
+
+
+class Reservation(object):
+    """A place among the tasks sharing a key, for work the caller runs itself (see WorkerPool.reserve)."""
+
+    def __init__(self, previous=None, done=None):
+        self.previous = previous
+        self.done = done
+
+    def run(self, func, *args, **kwargs):
+        """Runs func in the calling thread, after the tasks submitted before this reservation."""
+        try:
+            if self.previous is not None:
+                self.previous.wait()
+            return func(*args, **kwargs)
+        finally:
+            self.release()
+
+    def release(self):
+        """Lets the tasks submitted after this reservation run. Must be called if run never is."""
+        if self.done is not None:
+            self.done.set()
+
+
+class WorkerPool(object):
+    """
+    A bounded pool of worker threads, one per CPU core if jobs is 0. With jobs == 1
+    no threads are started, and each task runs in the caller's thread when its
+    result is first requested.
+    """
+
+    def __init__(self, jobs=1):
+        if jobs == 0:
+            jobs = multiprocessing.cpu_count()
+        self.jobs = max(1, jobs or 1)
+        self.pool = None
+        self.last_by_key = {}
+        if self.jobs > 1:
+            install_thread_local_logger()
+            self.pool = ThreadPool(self.jobs)
+
+    @property
+    def is_parallel(self):
+        return self.pool is not None
+
+    def submit(self, func, *args, **kwargs):
+        if self.pool is None:
+            return Task(func, args, kwargs)
+        finished = threading.Event()
+        async_result = self.pool.apply_async(run_with_log_buffer, (_run_and_signal, finished, func) + args, kwargs)
+        return Task(func, args, kwargs, async_result, finished)
+
+    def submit_after(self, key, func, *args, **kwargs):
+        """Like submit, but tasks sharing a key (other than None) run one after another, in submission order."""
+        if self.pool is None or key is None:
+            return self.submit(func, *args, **kwargs)
+        previous = self.last_by_key.get(key)
+        done = threading.Event()
+        self.last_by_key[key] = done
+        return self.submit(_run_after, previous, done, func, *args, **kwargs)
+
+    def reserve(self, key):
+        """Returns a Reservation, ordered after the tasks submitted with key so far, and before those submitted later."""
+        if self.pool is None or key is None:
+            return Reservation()
+        previous = self.last_by_key.get(key)
+        done = threading.Event()
+        self.last_by_key[key] = done
+        return Reservation(previous, done)
+
+    def map(self, func, items):
+        """Applies func to every item, returning the results in order."""
+        return [t.result() for t in [self.submit(func, item) for item in items]]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class LocationLocks(object):
+    """One re-entrant lock per directory, so that workers and the main thread never touch the same checkout at once."""
+
+    def __init__(self):
+        self.locks = {}
+        self.mutex = threading.Lock()
+
+    def __call__(self, path):
+        key = os.path.normcase(os.path.abspath(path)).lower()
+        self.mutex.acquire()
+        try:
+            if key not in self.locks:
+                self.locks[key] = threading.RLock()
+            return self.locks[key]
+        finally:
+            self.mutex.release()
@@ -0,0 +1,121 @@
+"""
+Cloning editables without all of their history or contents, for --git-clone-mode.
+
+"full" clones everything, like pip does. "blobless" clones with --filter=blob:none:
+every commit and tree, but file contents are only downloaded when a commit is checked
+out or a file of it is read. "shallow" clones the tip of every branch and tag only.
+Comparing versions needs history, so whenever an ancestry question can't be decided
+from the commits a shallow clone has (the history of the would-be descendant reaches
+the shallow boundary), or a commit asked for by hash isn't in it, the clone is deepened,
+by twice as many commits each time, until it has become a full clone.
+
+Both modes need the server to support them; a server that doesn't gets a full clone.
+Clones from a --git-cache-dir mirror are local, and always full.
+"""
+import os
+import re
+import subprocess
+from pip.util import call_subprocess, display_path
+from pip.exceptions import InstallationError
+from pip.log import logger
+from parallel import LocationLocks
+
+FULL = 'full'
+BLOBLESS = 'blobless'
+SHALLOW = 'shallow'
+modes = [FULL, BLOBLESS, SHALLOW]
+
+FIRST_DEEPENING = 16  # commits fetched by the first deepening of a clone, doubled by each one after it
+MAX_DEEPENING = 1024  # a clone that needs more is turned into a full one
+
+_mode = FULL
+_deepenings = {}  # maps repo dir -> commits the next deepening fetches
+_locks = LocationLocks()
+_commit_hash_re = re.compile(r'^[0-9a-f]{7,40}$')
+
+
+def select_mode(name):
+    global _mode
+    _mode = name
+
+
+def clone_options():
+    """Options of git clone for the selected mode."""
+    if _mode == BLOBLESS:
+        return ['--filter=blob:none']
+    if _mode == SHALLOW:
+        return ['--depth', '1', '--no-single-branch']
+    return []
+
+
+def after_clone(repo_dir):
+    """Completes a clone made with clone_options(): a shallow clone gets the commits of all tags as well."""
+    if _mode == SHALLOW and is_shallow(repo_dir):
+        call_subprocess(['git', 'fetch', '-q', '--depth', '1', '--tags', 'origin'], cwd=repo_dir)
+
+
+def _shallow_file(repo_dir):
+    git_dir = os.path.join(repo_dir, '.git')
+    return os.path.join(git_dir if os.path.isdir(git_dir) else repo_dir, 'shallow')
+
+
+def shallow_commits(repo_dir):
+    """The commits at the shallow boundary of the repository, whose parents it doesn't have."""
+    path = _shallow_file(repo_dir)
+    if not os.path.exists(path):
+        return set()
+    return set(open(path).read().split())
+
+
+def is_shallow(repo_dir):
+    return os.path.exists(_shallow_file(repo_dir))
+
+
+def history_is_complete(repo_dir, commit):
+    """True if the repository has every ancestor of commit, so ancestry questions about it have a definite answer."""
+    boundary = shallow_commits(repo_dir)
+    if not boundary:
+        return True
+    ancestors = call_subprocess(['git', 'rev-list', commit], show_stdout=False, cwd=repo_dir)
+    return not boundary.intersection(ancestors.split())
+
+
+def deepen(repo_dir):
+    """Fetches more history into a shallow clone. Returns False if it isn't shallow: there's nothing more to fetch."""
+    key = os.path.normcase(os.path.abspath(repo_dir))
+    with _locks(repo_dir):
+        if not is_shallow(repo_dir):
+            return False
+        depth = _deepenings.get(key, FIRST_DEEPENING)
+        if depth > MAX_DEEPENING:
+            logger.notify('Fetching the whole history of shallow clone %s' % display_path(repo_dir))
+            call_subprocess(['git', 'fetch', '-q', '--unshallow', 'origin'], cwd=repo_dir)
+        else:
+            logger.notify('Fetching %d more commits of history into shallow clone %s' % (depth, display_path(repo_dir)))
+            try:
+                call_subprocess(['git', 'fetch', '-q', '--deepen=%d' % depth, 'origin'], cwd=repo_dir)
+            except InstallationError:
+                # git before 2.11 has no --deepen
+                call_subprocess(['git', 'fetch', '-q', '--unshallow', 'origin'], cwd=repo_dir)
+        _deepenings[key] = depth * 2
+    return True
+
+
+def _has_commit(repo_dir, rev):
+    process = subprocess.Popen(['git', 'rev-parse', '-q', '--verify', rev + '^{commit}'], cwd=repo_dir,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process.communicate()
+    return process.returncode == 0
+
+
+def fetch_commit(repo_dir, rev):
+    """
+    Deepens a shallow clone until it has the commit hash rev. Returns True if it has it now, False if it's not a
+    shallow clone, rev isn't a commit hash, or the whole history doesn't have it.
+    """
+    if not _commit_hash_re.match(rev) or not is_shallow(repo_dir):
+        return False
+    while not _has_commit(repo_dir, rev):
+        if not deepen(repo_dir):
+            return False
+    return True
@@ -1,15 +1,54 @@
+from pip.util import call_subprocess
+
+def git_show_ref(s, location):
+    """All refs of the repo in one git call, as (name, rev) pairs. Annotated tags are followed by '<name>^{}' pairs."""
+    ret = call_subprocess([s.cmd, 'show-ref', '--dereference'],
+        show_stdout=False, raise_on_returncode=False, cwd=location)
+    refs = []
+    for line in ret.splitlines():
+        parts = line.split(" ", 1)
+        if len(parts) == 2:
+            refs.append((parts[1].strip(), parts[0]))
+    return refs
 
 def patched_git_get_tag_revs(s, location):
-    tags = s._get_all_tag_names(location)
+    # Same answers as running `git show-ref --dereference <tag>` per tag, and taking the last line: a ref matches
+    # if <tag> is one of its trailing path components, and the last match (peeled, if annotated) wins.
+    refs = git_show_ref(s, location)
+    last_match = {}
+    for name, rev in refs:
+        parts = name.replace('^{}', '').split('/')
+        for i in range(len(parts)):
+            last_match['/'.join(parts[i:])] = rev
     tag_revs = {}
-    for line in tags.splitlines():
-        tag = line.strip()
-        rev = patched_git_get_revision_from_rev_parse(s, tag, location)
-        tag_revs[tag] = rev.strip()
+    for name, rev in refs:
+        if name.startswith('refs/tags/') and not name.endswith('^{}'):
+            tag = name[len('refs/tags/'):]
+            tag_revs[tag] = last_match[tag]
     return tag_revs
 
+def batched_git_get_tag_revs(self, location):
+    """pip's Git.get_tag_revs (tag -> rev-parse of the tag), without a git process per tag."""
+    return dict((name[len('refs/tags/'):], rev) for name, rev in git_show_ref(self, location)
+                if name.startswith('refs/tags/') and not name.endswith('^{}'))
+
+def batched_git_get_branch_revs(self, location):
+    """
+    pip's Git.get_branch_revs (local and remote branch -> rev), without a git process per branch. Like pip, it keeps
+    origin/HEAD: show-ref lists the symref under its own name, with the rev of the branch it points to.
+    """
+    refs = git_show_ref(self, location)
+    branch_revs = {}
+    # remote branches first, like `git branch -r` before `git branch -l`
+    for name, rev in refs:
+        if name.startswith('refs/remotes/'):
+            branch_revs[name[len('refs/remotes/'):]] = rev
+    for name, rev in refs:
+        if name.startswith('refs/heads/'):
+            branch_revs[name[len('refs/heads/'):]] = rev
+    return branch_revs
+
 def patched_git_get_revision_from_rev_parse(s, name, location):
-    from pip import call_subprocess
     ret = call_subprocess([s.cmd, 'show-ref', '--dereference', name],
         show_stdout=False, cwd=location)
     ret = ret.splitlines()[-1].split(" ")[0]
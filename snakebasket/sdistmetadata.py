@@ -0,0 +1,82 @@
+"""
+The version and dependencies of a source archive, read from the archive without unpacking it.
+
+sb resolve needs the dependencies of every package it downloads, but it doesn't build
+anything, so unpacking the archive and running egg_info is only worth it when there's no
+other way. An sdist carries the PKG-INFO sdist wrote, with the package's version, and its
+setup.py: when setup.py passes its dependencies to setup() as literals, they are read the
+way gitmetadata reads them from a commit of an editable, and the archive is never unpacked.
+"""
+import os
+import tarfile
+import zipfile
+from email.parser import FeedParser
+from pip.download import (_get_response_from_url, _download_url, _get_hash_from_file, _check_hash,
+                          is_file_url, url_to_path)
+import gitmetadata
+
+
+def download(link, directory):
+    """(path, content type) of the archive of link, downloaded into directory unless it's a local file."""
+    if is_file_url(link):
+        path = url_to_path(link.url.split('#', 1)[0])
+        if link.hash and link.hash_name:
+            _check_hash(_get_hash_from_file(path, link), link)
+        return path, None
+    resp = _get_response_from_url(link.url.split('#', 1)[0], link)
+    path = os.path.join(directory, link.filename)
+    download_hash = _download_url(resp, link, path)
+    if link.hash and link.hash_name:
+        _check_hash(download_hash, link)
+    return path, resp.info().get('content-type')
+
+
+def _top_level_files(names, read, wanted):
+    """The contents of the wanted files, by name, from the root of an archive whose members all share one directory."""
+    roots = set(name.lstrip('/').split('/', 1)[0] for name in names)
+    if len(roots) != 1:
+        return {}
+    found = {}
+    for name in names:
+        relative = name.lstrip('/').split('/', 1)[-1]
+        if relative in wanted:
+            found[relative] = read(name)
+    return found
+
+
+def read_files(path, wanted):
+    """The contents of the wanted files from the root of the archive at path, by name, if it's a zip or tar file."""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        try:
+            return _top_level_files(archive.namelist(), archive.read, wanted)
+        finally:
+            archive.close()
+    if tarfile.is_tarfile(path):
+        archive = tarfile.open(path)
+        try:
+            members = dict((member.name, member) for member in archive.getmembers() if member.isfile())
+            return _top_level_files(members.keys(), lambda name: archive.extractfile(members[name]).read(), wanted)
+        finally:
+            archive.close()
+    return {}
+
+
+def read_metadata(path, extras=()):
+    """
+    (version, requirement lines, dependency links) of the sdist at path, or None if setup.py has to run to tell
+    them.
+    """
+    try:
+        files = read_files(path, ('PKG-INFO', 'setup.py', 'setup.cfg'))
+    except (IOError, OSError, tarfile.TarError, zipfile.BadZipfile):
+        return None
+    if 'PKG-INFO' not in files or 'setup.py' not in files:
+        return None
+    parser = FeedParser()
+    parser.feed(files['PKG-INFO'])
+    version = parser.close().get('version')
+    dependencies = gitmetadata.declared_dependencies(files['setup.py'], files.get('setup.cfg'), extras)
+    if version is None or dependencies is None:
+        return None
+    return version, dependencies[0], dependencies[1]
@@ -0,0 +1,152 @@
+"""
+Where the time of an sb install goes, for --timing-report.
+
+While a report is active, the install records the wall time of each phase (finding a
+requirement on the index, unpacking, egg_info, checking out editables, comparing
+versions, check_if_exists, installing) per requirement, and counts the git
+subprocesses started, the network requests made and the HTTP connections opened for
+them. Phases running on worker threads are timed on their own, so with --jobs the
+per-requirement times add up to more than the total.
+
+Without an active report, phase() and count() cost next to nothing.
+"""
+import os
+import time
+import json
+import threading
+import subprocess
+import urllib2
+from contextlib import contextmanager
+from pip.log import logger
+from pip.util import display_path
+
+TOP_N = 10
+
+GIT_SUBPROCESSES = 'git_subprocesses'
+NETWORK_REQUESTS = 'network_requests'
+HTTP_CONNECTIONS = 'http_connections'
+
+_report = None
+_original_popen_init = subprocess.Popen.__init__
+_original_opener_open = urllib2.OpenerDirector.open
+
+
+class TimingReport(object):
+
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.times = {}  # maps (requirement, phase) -> [seconds, calls]
+        self.counters = {GIT_SUBPROCESSES: 0, NETWORK_REQUESTS: 0, HTTP_CONNECTIONS: 0}
+
+    def add(self, requirement, phase, seconds):
+        with self.lock:
+            entry = self.times.setdefault((requirement, phase), [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, counter, n=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def slowest(self, top=TOP_N):
+        """The top (requirement, phase, seconds) entries, slowest first."""
+        entries = [(requirement, phase, seconds) for (requirement, phase), (seconds, calls) in self.times.items()]
+        return sorted(entries, key=lambda e: (-e[2], e[0], e[1]))[:top]
+
+    def as_dict(self, top=TOP_N):
+        requirements = {}
+        phases = {}
+        for (requirement, phase), (seconds, calls) in self.times.items():
+            requirements.setdefault(requirement, {})[phase] = {'seconds': round(seconds, 6), 'calls': calls}
+            phases[phase] = phases.get(phase, 0.0) + seconds
+        return {
+            'total_seconds': round(time.time() - self.started, 6),
+            'phases': dict((phase, round(seconds, 6)) for phase, seconds in phases.items()),
+            'requirements': requirements,
+            'counters': dict(self.counters),
+            'slowest': [{'requirement': requirement, 'phase': phase, 'seconds': round(seconds, 6)}
+                        for requirement, phase, seconds in self.slowest(top)],
+        }
+
+
+def _counting_popen_init(self, args, *more_args, **kwargs):
+    report = _report
+    if report is not None and args:
+        program = args.split()[0] if isinstance(args, basestring) else args[0]
+        if os.path.basename(program) in ('git', 'git.exe'):
+            report.count(GIT_SUBPROCESSES)
+    return _original_popen_init(self, args, *more_args, **kwargs)
+
+
+def _counting_opener_open(self, *args, **kwargs):
+    report = _report
+    if report is not None:
+        report.count(NETWORK_REQUESTS)
+    return _original_opener_open(self, *args, **kwargs)
+
+
+def start():
+    """Starts recording, counting every git process and urllib2 request made by this process from now on."""
+    global _report
+    _report = TimingReport()
+    subprocess.Popen.__init__ = _counting_popen_init
+    urllib2.OpenerDirector.open = _counting_opener_open
+    return _report
+
+
+def stop():
+    global _report
+    report, _report = _report, None
+    subprocess.Popen.__init__ = _original_popen_init
+    urllib2.OpenerDirector.open = _original_opener_open
+    return report
+
+
+def requirement_name(req):
+    return req.name or req.url or str(req)
+
+
+def count(counter, n=1):
+    """Adds n to counter, if a report is active."""
+    report = _report
+    if report is not None:
+        report.count(counter, n)
+
+
+@contextmanager
+def phase(name, req):
+    """Times the block as phase name of the requirement req, if a report is active."""
+    report = _report
+    if report is None:
+        yield
+        return
+    started = time.time()
+    try:
+        yield
+    finally:
+        report.add(requirement_name(req), name, time.time() - started)
+
+
+def finish(path, top=TOP_N):
+    """Stops recording, writes the report as JSON to path and logs the slowest phases."""
+    report = stop()
+    if report is None:
+        return
+    f = open(path, 'w')
+    try:
+        json.dump(report.as_dict(top), f, indent=2, sort_keys=True)
+        f.write('\n')
+    finally:
+        f.close()
+    logger.notify('Wrote timing report to %s (%d git subprocesses, %d network requests)' % (
+        display_path(path), report.counters[GIT_SUBPROCESSES], report.counters[NETWORK_REQUESTS]))
+    slowest = report.slowest(top)
+    if slowest:
+        logger.notify('Slowest steps:')
+        logger.indent += 2
+        try:
+            for requirement, name, seconds in slowest:
+                logger.notify('%8.2fs  %-16s %s' % (seconds, name, requirement))
+        finally:
+            logger.indent -= 2
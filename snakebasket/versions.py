@@ -26,14 +26,104 @@ from pip.log import logger
 import subprocess
 import os, re, io
 from pip.exceptions import InstallationError
-from pip.vcs import subversion, git, bazaar, mercurial
-import pkg_resources
-from distutils.version import StrictVersion, LooseVersion
-import itertools
+from pip.vcs import vcs, subversion, git, bazaar, mercurial
 import sys
+import threading
+from distutils.version import LooseVersion
+from parallel import LocationLocks, WorkerPool
+from gitcache import MirroredGit
+import partialclone
+from gitbackend import git_backend
 
 __InstallationErrorMessage__ = 'Cannot be upgraded due to uncommitted git modifications'
 
+def canonical_name(name):
+    """The PEP 503 normalized form of a project name: Foo.Bar, foo_bar and FOO--bar are all the same project."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+_pep440_re = re.compile(r"""
+    ^v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?:-(?P<post_n1>[0-9]+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?)?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    $""", re.VERBOSE | re.IGNORECASE)
+_pre_release_ranks = {'a': 0, 'alpha': 0, 'b': 1, 'beta': 1, 'c': 2, 'rc': 2, 'pre': 2, 'preview': 2}
+
+# Phases of the versions sharing an epoch and release, in order. Legacy versions with a suffix (1.0-foo) come after
+# the final release, as LooseVersion put them, but before PEP 440 post-releases.
+_PRE, _FINAL, _LEGACY, _POST = range(4)
+
+VERSION_KEYS_LIMIT = 10000  # the memo of version_key is emptied when it grows past this
+_version_keys = {}  # maps version string -> its sort key
+_version_keys_lock = threading.Lock()
+
+
+def _stripped_release(numbers):
+    release = list(numbers)
+    while release and release[-1] == 0:
+        release.pop()
+    return tuple(release)
+
+
+def _local_key(parts):
+    # numbers sort after words in PEP 440 local versions, and are never compared to them
+    return tuple((1, int(part), '') if part.isdigit() else (0, 0, part.lower()) for part in parts)
+
+
+def _loose_key(components):
+    # the order of LooseVersion components in Python 2: numbers before strings
+    return tuple((0, c, '') if isinstance(c, (int, long)) else (1, 0, c) for c in components)
+
+
+def _parse_version_key(version):
+    match = _pep440_re.match(version.strip())
+    if match is None:
+        # a legacy version: its leading numbers are its release, what follows is compared like LooseVersion did
+        components = LooseVersion(version).version
+        numbers = 0
+        while numbers < len(components) and isinstance(components[numbers], (int, long)):
+            numbers += 1
+        suffix = components[numbers:]
+        phase = (_LEGACY, _loose_key(suffix)) if suffix else (_FINAL, ())
+        return (0, _stripped_release(components[:numbers]), phase)
+    release = _stripped_release(int(n) for n in match.group('release').split('.'))
+    is_post = bool(match.group('post_l') or match.group('post_n1'))
+    dev = (0, int(match.group('dev_n') or 0)) if match.group('dev_l') else (1, 0)
+    local = _local_key(re.split(r'[-_.]', match.group('local'))) if match.group('local') else ()
+    if match.group('pre_l'):
+        pre = (0, _pre_release_ranks[match.group('pre_l').lower()], int(match.group('pre_n') or 0))
+        post = (int(match.group('post_n1') or match.group('post_n2') or 0),) if is_post else (-1,)
+        phase = (_PRE, (pre, post, dev, local))
+    elif is_post:
+        phase = (_POST, (int(match.group('post_n1') or match.group('post_n2') or 0), dev, local))
+    elif match.group('dev_l'):
+        phase = (_PRE, ((-1, 0, 0), (-1,), dev, local))  # 1.0.dev1 comes before 1.0a1
+    else:
+        phase = (_FINAL, local)
+    return (int(match.group('epoch') or 0), release, phase)
+
+
+def version_key(version):
+    """
+    A sort key for the version string. Versions are ordered by epoch and release numbers first, whether they follow
+    PEP 440 or not (the leading numbers of a legacy version are its release), then as PEP 440 orders pre-, post-, dev-
+    and local releases, with legacy suffixes right after the final release, compared among each other the way
+    LooseVersion compares them. Memoized per distinct string, up to VERSION_KEYS_LIMIT strings.
+    """
+    key = _version_keys.get(version)
+    if key is None:
+        key = _parse_version_key(version)
+        with _version_keys_lock:
+            if len(_version_keys) >= VERSION_KEYS_LIMIT:
+                _version_keys.clear()
+            key = _version_keys.setdefault(version, key)
+    return key
+
+
 class SeparateBranchException(Exception):
     def __init__(self, *args, **kwargs):
         self.candidates = args
@@ -47,9 +137,15 @@ class GitVersionComparator(object):
     version_re = re.compile(r'@([^/#@]*)#')
     commit_hash_re = re.compile("[a-z0-9]{5,40}")
 
-    def __init__(self, pkg_repo_dir, prefer_pinned_revision=False):
+    # An AncestryCache shared by all comparators, if answers should persist between runs.
+    ancestry_cache = None
+
+    def __init__(self, pkg_repo_dir, prefer_pinned_revision=False, repo_url=None):
         self.checkout_dir = pkg_repo_dir
         self.prefer_pinned_revision = prefer_pinned_revision
+        self.backend = git_backend(pkg_repo_dir)
+        # Identifies the repository in the ancestry cache: the remote URL without revision, or the checkout dir.
+        self.repo_id = os.path.abspath(pkg_repo_dir) if repo_url is None else git.Git(repo_url).get_url_rev()[0]
 
     def compare_versions(self, ver1, ver2):
         # short-circuit the comparison in the trivial case
@@ -66,29 +162,36 @@ class GitVersionComparator(object):
         commithashes = [ver if self.is_valid_commit_hash(ver) else self.get_commit_hash_of_version_string(ver) for ver in versions]
         if commithashes[0] == commithashes[1]:
             response = self.EQ
-        elif self.is_parent_of(commithashes[0], commithashes[1]):
-            response = self.LT
-        elif self.is_parent_of(commithashes[1], commithashes[0]):
-            response = self.GT
+        else:
+            newest = self.get_newest_commit(commithashes)
+            if newest == commithashes[1]:
+                response = self.LT
+            elif newest == commithashes[0]:
+                response = self.GT
         if response is None:
             raise SeparateBranchException((ver1, commithashes[0]), (ver2, commithashes[1]))
         return response
 
+    def get_newest_commit(self, commits):
+        """Returns the commit which all the given commits are ancestors of, or None if they're on separate branches."""
+        commits = list(set(commits))
+        # The backend lists candidates newest first, so normally only the first one has to be checked.
+        for candidate in self.backend.newest_first(commits):
+            if all(self.is_parent_of(c, candidate) for c in commits if c != candidate):
+                return candidate
+        return None
+
     def is_valid_commit_hash(self, hash_candidate):
         if re.match(self.commit_hash_re, hash_candidate) is None:
             return False
-        try:
-            ret = call_subprocess(['git', 'log', '-n', '1', hash_candidate, '--pretty=oneline'],
-                show_stdout=False, cwd=self.checkout_dir)
-            return ret.split(" ")[0] == hash_candidate
-        except InstallationError:
-            # call_subprocess returns raises an InstallationError when the return value of a command is not 0.
-            # In this case it just means the given commit is not in the git repo.
-            return False
+        if self.backend.is_commit_hash(hash_candidate):
+            return True
+        # a shallow clone may not reach back that far yet
+        return partialclone.fetch_commit(self.checkout_dir, hash_candidate) and self.backend.is_commit_hash(hash_candidate)
 
     @staticmethod
     def do_fetch(repodir):
-        call_subprocess(['git', 'fetch', '-q'], cwd=repodir)
+        MirroredGit.fetch(repodir)
 
     @staticmethod
     def do_checkout(remote_repository, checkout_dir, revision):
@@ -98,7 +201,7 @@ class GitVersionComparator(object):
     @staticmethod
     def checkout_pkg_repo(remote_repository, checkout_dir):
         vcs_classes = {'svn': subversion.Subversion,
-                       'git': git.Git,
+                       'git': MirroredGit,
                        'bzr': bazaar.Bazaar,
                        'hg': mercurial.Mercurial}
         default_vcs = 'svn'
@@ -120,14 +223,23 @@ class GitVersionComparator(object):
         return None
 
     def get_commit_hash_of_version_string(self, version_string):
-        ret = call_subprocess(['git', 'show-ref', '--dereference', version_string],
-            show_stdout=False, cwd=self.checkout_dir)
-        return ret.splitlines()[-1].split(" ")[0]
+        return self.backend.resolve_ref(version_string)
 
     def is_parent_of(self, parent, child):
-        ret = call_subprocess(['git', 'merge-base', parent, child],
-            show_stdout=False, cwd=self.checkout_dir)
-        return ret.rstrip() == parent
+        if self.ancestry_cache is not None:
+            result = self.ancestry_cache.get(self.repo_id, parent, child)
+            if result is not None:
+                return result
+        result = self.backend.is_ancestor(parent, child)
+        # In a shallow clone, parent may be beyond the shallow boundary of child's history: fetch more of it.
+        while not result and not partialclone.history_is_complete(self.checkout_dir, child):
+            if not partialclone.deepen(self.checkout_dir):
+                break
+            self.backend.forget_history()
+            result = self.backend.is_ancestor(parent, child)
+        if self.ancestry_cache is not None:
+            self.ancestry_cache.put(self.repo_id, parent, child, result)
+        return result
 
 
 class PackageData(object):
@@ -149,6 +261,15 @@ class PackageData(object):
         # The original InstallRequirement for FrozenRequirement from which this data was extracted
         self.requirement = requirement
 
+    @property
+    def version(self):
+        return self._version
+
+    @version.setter
+    def version(self, value):
+        self._version = value
+        self.sort_key = None if value is None else version_key(value)
+
     def __repr__(self):
         str = "%s %s" % (
             "(unnamed package)" if self.name is None else self.name,
@@ -164,12 +285,7 @@ class PackageData(object):
         if self.version is None or other.version is None:
             # cannot compare None version
             raise Exception("Unable to compare None versions")
-        try:
-            sv = StrictVersion()
-            sv.parse(self.version)
-            return sv.__cmp__(other.version)
-        except Exception:
-            return LooseVersion(self.version).__cmp__(LooseVersion(other.version))
+        return cmp(self.sort_key, other.sort_key)
 
     def clone_dir(self, src_dir):
         # This method should only be run on editable InstallRequirement objects.
@@ -224,13 +340,96 @@ class PackageData(object):
         return pd
 
 
+class PreInstalledPackages(object):
+    """
+    The distributions installed before this run, as a mapping of name -> PackageData.
+
+    Listing the distributions is cheap, but turning one into a PackageData runs several git commands for
+    editables, so that only happens when a name is first looked up. values() and items() need every package:
+    they load the missing ones on a WorkerPool of `jobs` threads.
+    """
+
+    def __init__(self, jobs=1):
+        self.jobs = jobs
+        self.dists = {}  # maps canonical name -> pkg_resources Distribution
+        self.loaded = {}  # maps canonical name -> PackageData
+        self.lock = threading.Lock()
+
+    def scan(self):
+        """Lists the installed distributions, returning the git checkouts of the editable ones."""
+        from pip.util import get_installed_distributions
+        checkouts = []
+        for dist in get_installed_distributions(local_only=True, skip=[]):
+            dist_as_req = dist.as_requirement()
+            # if pip patches an earlier version of setuptools as distribute, skip it
+            if (dist_as_req.project_name == 'distribute' and dist_as_req.specs == []):
+                continue
+            self.dists[canonical_name(dist.project_name)] = dist
+            if vcs.get_backend_name(os.path.normcase(os.path.abspath(dist.location))):
+                # same location as PackageData.from_dist finds for editables
+                location = os.path.join(sys.prefix, 'src', dist.project_name, '.git')
+                if os.path.exists(location):
+                    checkouts.append(location)
+        return checkouts
+
+    def load(self, key):
+        with self.lock:
+            if key in self.loaded:
+                return self.loaded[key]
+        import pip
+        pd = PackageData.from_dist(pip.FrozenRequirement.from_dist(self.dists[key], [], find_tags=True), pre_installed=True)
+        with self.lock:
+            return self.loaded.setdefault(key, pd)
+
+    def __contains__(self, name):
+        return canonical_name(name) in self.dists
+
+    has_key = __contains__
+
+    def __getitem__(self, name):
+        key = canonical_name(name)
+        if key not in self.dists:
+            raise KeyError(name)
+        return self.load(key)
+
+    def get(self, name, default=None):
+        key = canonical_name(name)
+        if key not in self.dists:
+            return default
+        return self.load(key)
+
+    def keys(self):
+        return [dist.project_name for dist in self.dists.values()]
+
+    def items(self):
+        keys = self.dists.keys()
+        pool = WorkerPool(self.jobs)
+        try:
+            return zip([self.dists[key].project_name for key in keys], pool.map(self.load, keys))
+        finally:
+            pool.close()
+
+    def values(self):
+        return [pd for name, pd in self.items()]
+
+
 class InstallReqChecker(object):
 
     def __init__(self, src_dir, requirements, successfully_downloaded):
         self.src_dir = src_dir
         self.comparison_cache = ({}, {})  # two maps, one does a->b, the other one does b->a
-        self.pre_installed = {}  # maps name -> PackageData
+        self.pre_installed = PreInstalledPackages()  # maps name -> PackageData
+        # requirements and successfully_downloaded only ever grow, so their canonical names are indexed incrementally
+        self.requirement_names = {}  # maps canonical name -> key in requirements
+        self.indexed_requirements = 0
+        self.downloaded_names = {}  # maps canonical name -> InstallRequirement in successfully_downloaded
+        self.indexed_downloads = 0
         self.repo_up_to_date = {}  # maps local git clone path -> boolean
+        self.cloned = set()  # repo_keys of the clones made during this run, which needn't be fetched
+        self.background_pool = WorkerPool()  # runs git fetch and status checks of checkouts, see fetch_stale_repos
+        self.fetches = {}  # maps repo_key of a pre-existing checkout -> the Task fetching it, at most one per run
+        self.status_checks = {}  # maps repo_key of a checkout -> the Task checking it for uncommitted changes
+        self.location_locks = LocationLocks()  # serializes work on a checkout between worker threads
         self.requirements = requirements
         self.successfully_downloaded = successfully_downloaded
         try:
@@ -241,49 +440,141 @@ class InstallReqChecker(object):
         self.prefer_pinned_revision = False
 
     def load_installed_distributions(self):
-        import pip
-        from pip.util import get_installed_distributions
-        for dist in get_installed_distributions(local_only=True, skip=[]):
-            dist_as_req = dist.as_requirement()
-            # if pip patches an earlier version of setuptools as distribute, skip it
-            if (dist_as_req.project_name == 'distribute' and dist_as_req.specs == []):
-                continue
-            pd = PackageData.from_dist(pip.FrozenRequirement.from_dist(dist, [], find_tags=True), pre_installed=True)
-            if pd.editable and pd.location is not None:
-                self.repo_up_to_date[pd.location] = False
-            self.pre_installed[pd.name] = pd
+        # The PackageData of installed distributions is only loaded when needed, but their checkouts are known to
+        # predate this run, so they must be fetched before their versions are compared.
+        for location in self.pre_installed.scan():
+            self.repo_up_to_date[location] = False
+
+    @staticmethod
+    def repo_key(location):
+        # pre-existing checkouts are known by their .git directory, requirements by their source directory
+        if os.path.basename(location.rstrip(os.sep)) == '.git':
+            location = os.path.dirname(location.rstrip(os.sep))
+        return os.path.normcase(os.path.abspath(location)).lower()
+
+    def fetch_stale_repos(self, jobs=1):
+        """With jobs > 1, starts fetching all pre-existing checkouts in the background, on `jobs` threads."""
+        self.background_pool = WorkerPool(jobs)
+        if not self.background_pool.is_parallel:
+            return
+        for location, up_to_date in self.repo_up_to_date.items():
+            if not up_to_date:
+                self.fetches.setdefault(self.repo_key(location), self.background_pool.submit(self.fetch_repo, location))
+
+    def fetch_repo(self, location):
+        logger.notify("Performing git fetch in pre-existing directory %s" % location)
+        GitVersionComparator.do_fetch(location)
+
+    def ensure_fetched(self, location):
+        """Fetches the pre-existing checkout at location, or waits for its background fetch, unless it's done already."""
+        key = self.repo_key(location)
+        if key not in self.fetches:
+            self.fetches[key] = self.background_pool.submit(self.fetch_repo, location)
+        self.fetches[key].result()
+        self.repo_up_to_date[location] = True
+
+    def obtain_objects(self, url, location):
+        """
+        Makes sure the git repository in location has the commits of the editable url, without touching its working
+        tree: clones it without checking anything out if location doesn't exist, or fetches it (once per run) if it's a
+        clone of the same remote. Returns False if location is something else, which pip's update has to deal with.
+        """
+        key = self.repo_key(location)
+        if key in self.cloned:
+            return True
+        vcs_backend = MirroredGit(url)
+        if not os.path.exists(location):
+            vcs_backend.clone_objects(location)
+            self.cloned.add(key)
+            self.repo_up_to_date[location] = True
+            return True
+        if not os.path.isdir(os.path.join(location, '.git')):
+            return False
+        try:
+            existing_url = vcs_backend.get_url(location)
+        except InstallationError:
+            return False
+        if not vcs_backend.compare_urls(existing_url, vcs_backend.get_url_rev()[0]):
+            return False
+        self.ensure_fetched(location)
+        return True
+
+    def wait_for_background_work(self, location):
+        """Waits until background fetches or status checks of the checkout at location are no longer using it."""
+        key = self.repo_key(location)
+        for task in (self.fetches.get(key), self.status_checks.get(key)):
+            if task is not None:
+                task.wait()
+
+    def close(self):
+        self.background_pool.close()
 
     def checkout_if_necessary(self, pd):
         if pd.location is None:
-            pd.location = GitVersionComparator.checkout_pkg_repo(pd.url, pd.clone_dir(self.src_dir))
+            clone_dir = pd.clone_dir(self.src_dir)
+            if pd.url.startswith('git+') and not os.path.exists(clone_dir):
+                # comparing only needs the commits, the version that wins is checked out later
+                self.obtain_objects(pd.url, clone_dir)
+                pd.location = clone_dir
+            else:
+                pd.location = GitVersionComparator.checkout_pkg_repo(pd.url, clone_dir)
             self.repo_up_to_date[pd.location] = True
         # self.repo_up_to_date[pd.location] is False if the git repo existed before this
         # snakebasket run, and has not yet been fetched (therefore may contain old data).
         elif self.repo_up_to_date.get(pd.location, True) == False:
-            try:
-                GitVersionComparator.do_fetch(pd.location)
-                logger.notify("Not performing git fetch in pre-existing directory %s, because %s is already fetched" % (pd.location, pd.version))
-            except:
-                # Do a git fetch for repos which were not checked out recently.
-                logger.notify("Performing git fetch in pre-existing directory %s" % pd.location)
-                GitVersionComparator.do_fetch(pd.location)
-                self.repo_up_to_date[pd.location] = True
+            self.ensure_fetched(pd.location)
         return pd.location
 
-    def check_for_uncommited_git_changes(self, working_directory):
-
-        # Check for modifications
-        git_status = subprocess.Popen(['git', 'status', '-s'], cwd=working_directory, stdout=subprocess.PIPE)
-
-        listed_modifications = git_status.stdout.read().splitlines()
-
+    @staticmethod
+    def first_real_change(command, working_directory):
+        """Runs a git command listing paths, and returns the first one that isn't .egg-info, without waiting for the rest."""
         # Strip out non-source-controlled .egg-info directory
         egg_info_regex = re.compile('[.]egg-info/')
-        actual_modifications = [change for change in listed_modifications if not egg_info_regex.search(change) ]
-        number_of_changes = len(actual_modifications)
+        process = subprocess.Popen(command, cwd=working_directory, stdout=subprocess.PIPE)
+        try:
+            for line in iter(process.stdout.readline, ''):
+                if line.strip() and not egg_info_regex.search(line):
+                    return line.strip()
+            return None
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
 
-        # Return True if at least one modification has been made
-        return (number_of_changes > 0)
+    def check_for_uncommited_git_changes(self, working_directory):
+        git_dir = os.path.join(working_directory, '.git')
+        if os.path.isdir(git_dir) and not os.path.exists(os.path.join(git_dir, 'index')):
+            # cloned without a working tree (see obtain_objects): nothing was ever checked out, so nothing can be lost
+            return False
+        # Same changes as `git status -s` lists: tracked files differing from HEAD, then untracked files which aren't
+        # ignored (untracked directories as a single entry).
+        for command in (['git', 'diff', '--name-only', 'HEAD'],
+                        ['git', 'ls-files', '--others', '--exclude-standard', '--directory']):
+            if self.first_real_change(command, working_directory) is not None:
+                return True
+        return False
+
+    def uncommitted_changes_check(self, working_directory):
+        """The Task checking working_directory for uncommitted changes. Each checkout is only checked once per run."""
+        key = self.repo_key(working_directory)
+        if key not in self.status_checks:
+            self.status_checks[key] = self.background_pool.submit(self.check_for_uncommited_git_changes, working_directory)
+        return self.status_checks[key]
+
+    def check_all_for_uncommitted_changes(self):
+        """Starts checking every pre-existing checkout for uncommitted changes, in the background with --jobs."""
+        for location in self.repo_up_to_date.keys():
+            working_directory = os.path.dirname(location) if os.path.basename(location) == '.git' else location
+            self.uncommitted_changes_check(working_directory)
+
+    def check_editable_is_unmodified(self, path):
+        """Raises InstallationError if path is a checkout with uncommitted changes, which an update would lose."""
+        global __InstallationErrorMessage__
+        if os.path.isdir(path) and self.uncommitted_changes_check(path).result():
+            raise InstallationError("{message}. In path: {path}".format(
+                                    message=__InstallationErrorMessage__,
+                                    path=path))
 
 
     # Both directions are saved, but the outcome is the opposite, eg:
@@ -304,34 +595,40 @@ class InstallReqChecker(object):
             self.comparison_cache[1][b] = {}
         self.comparison_cache[1][b][a] = result * -1
 
-    def get_all_aliases(self, name):
-        return [
-            name,
-            name.lower(),
-            name.upper(),
-            name.replace("-", "_"),
-            name.replace("_", "-"),
-            name[0].upper() + name[1:]]
+    def find_requirement_name(self, name):
+        """The key under which a requirement for the project name is in requirements (spelled any way), or None."""
+        keys = self.requirements.keys()
+        if len(keys) < self.indexed_requirements:
+            # something was removed: start over
+            self.requirement_names = {}
+            self.indexed_requirements = 0
+        for key in keys[self.indexed_requirements:]:
+            self.requirement_names.setdefault(canonical_name(key), key)
+        self.indexed_requirements = len(keys)
+        key = self.requirement_names.get(canonical_name(name))
+        if key is not None and key in self.requirements:
+            return key
+        return None
 
-    def filter_for_aliases(self, name, req_list):
-        return
+    def find_downloaded(self, name):
+        for req in self.successfully_downloaded[self.indexed_downloads:]:
+            if req.name is not None:
+                self.downloaded_names.setdefault(canonical_name(req.name), req)
+        self.indexed_downloads = len(self.successfully_downloaded)
+        return self.downloaded_names.get(canonical_name(name))
 
     def find_potential_substitutes(self, name):
         """
         Returns other versions of the given package in requirement/downloaded/installed states without examining their
         version.
         """
-        aliases = self.get_all_aliases(name)
-        for package_name in aliases:
-            if package_name in self.requirements:
-                return PackageData.from_dist(self.requirements[package_name])
-        downloaded = list(itertools.chain(*[
-            [r for r in self.successfully_downloaded if r.name == pkg_resources] for package_name in aliases]))
-        if downloaded:
-            return PackageData.from_dist(downloaded[0])
-        for package_name in aliases:
-            if self.pre_installed.has_key(package_name):
-                return self.pre_installed[package_name]
+        key = self.find_requirement_name(name)
+        if key is not None:
+            return PackageData.from_dist(self.requirements[key])
+        downloaded = self.find_downloaded(name)
+        if downloaded is not None:
+            return PackageData.from_dist(downloaded)
+        return self.pre_installed.get(name)
 
     def get_available_substitute(self, install_req):
         """Find an available substitute for the given package.
@@ -353,12 +650,7 @@ class InstallReqChecker(object):
         if len(editables) == 2:
 
             local_editable_path = os.path.join(sys.prefix, 'src', existing_package_data.name)
-            if os.path.isdir(local_editable_path):
-
-                if self.check_for_uncommited_git_changes(local_editable_path):                    
-                    raise InstallationError("{message}. In path: {path}".format(
-                                            message=__InstallationErrorMessage__,
-                                            path=local_editable_path))
+            self.check_editable_is_unmodified(local_editable_path)
 
             # This is an expensive comparison, so let's cache results
             competing_version_urls = [str(r.url) for r in packages_in_conflict]
@@ -369,7 +661,7 @@ class InstallReqChecker(object):
                 # So let's check out the repo into the src directory. Later (when we have the version) update_editable
                 # will use the correct version anyway.
                 repo_dir = self.checkout_if_necessary(new_candidate_package_data)
-                cmp = GitVersionComparator(repo_dir, self.prefer_pinned_revision)
+                cmp = GitVersionComparator(repo_dir, self.prefer_pinned_revision, new_candidate_package_data.url)
                 try:
                     versions = [GitVersionComparator.get_version_string_from_url(r.url) for r in packages_in_conflict]
                     if len([v for v in versions if v == None]) == 2:
@@ -0,0 +1,74 @@
+import os
+import stat
+import shutil
+import hashlib
+import tarfile
+from nose.tools import assert_equal, assert_raises
+from pip.index import Link
+from pip.download import path_to_url
+from pip.exceptions import InstallationError
+from tests.test_pip import reset_env
+from snakebasket.artifactcache import ArtifactCache
+
+def make_sdist(directory, filename):
+    source = os.path.join(directory, 'foo-1.0')
+    os.makedirs(os.path.join(source, 'foo.egg-info'))
+    for path, contents in (('setup.py', 'from setuptools import setup\n'), ('PKG-INFO', 'Name: foo\n'),
+                           ('foo.egg-info/SOURCES.txt', 'setup.py\n')):
+        f = open(os.path.join(source, path), 'w')
+        f.write(contents)
+        f.close()
+    archive = os.path.join(directory, filename)
+    tar = tarfile.open(archive, 'w:gz')
+    tar.add(source, 'foo-1.0')
+    tar.close()
+    shutil.rmtree(source)
+    return archive
+
+def file_hash(path, name):
+    return hashlib.new(name, open(path, 'rb').read()).hexdigest()
+
+def test_same_archive_under_another_url_unpacked_from_store():
+    """ Archives are stored by contents after their hash is checked, and unpacked trees are linked, not extracted. """
+    env = reset_env()
+    archive = make_sdist(env.scratch_path, 'foo-1.0.tar.gz')
+    mirrored = os.path.join(env.scratch_path, 'mirror', 'foo-1.0.tar.gz')
+    os.makedirs(os.path.dirname(mirrored))
+    shutil.copy(archive, mirrored)
+    cache = ArtifactCache(env.scratch_path / 'cache')
+
+    bad_link = Link(path_to_url(archive) + '#md5=' + '0' * 32)
+    assert_raises(InstallationError, cache.unpack, bad_link, env.scratch_path / 'bad')
+    assert_equal(None, cache.lookup(bad_link))
+
+    cache.unpack(Link(path_to_url(archive) + '#md5=' + file_hash(archive, 'md5')), env.scratch_path / 'build1')
+    cache.unpack(Link(path_to_url(mirrored) + '#sha256=' + file_hash(mirrored, 'sha256')), env.scratch_path / 'build2')
+    assert_equal((1, 1), (cache.downloads, cache.hits))
+    tree = os.path.join(cache.trees_dir, file_hash(archive, 'sha256'), 'tree')
+    for build in ('build1', 'build2'):
+        for path in ('setup.py', 'PKG-INFO', 'foo.egg-info/SOURCES.txt'):
+            assert_equal(open(os.path.join(tree, path)).read(), open(os.path.join(env.scratch_path, build, path)).read())
+        # files which egg_info rewrites are never shared with the store
+        assert not os.path.samefile(os.path.join(tree, 'PKG-INFO'), os.path.join(env.scratch_path, build, 'PKG-INFO'))
+
+def test_build_writing_to_linked_sources_gets_copies():
+    """ Stored trees are read-only, and a build directory with hardlinked files can switch to copies for good. """
+    env = reset_env()
+    archive = make_sdist(env.scratch_path, 'foo-1.0.tar.gz')
+    link = Link(path_to_url(archive) + '#sha256=' + file_hash(archive, 'sha256'))
+    cache = ArtifactCache(env.scratch_path / 'cache')
+    cache.reflinks = False
+    cache.hardlinks = True
+    build = env.scratch_path / 'build1'
+    cache.unpack(link, build)
+    tree = os.path.join(cache.trees_dir, file_hash(archive, 'sha256'), 'tree')
+    assert os.path.samefile(os.path.join(tree, 'setup.py'), os.path.join(build, 'setup.py'))
+    assert not os.stat(os.path.join(build, 'setup.py')).st_mode & stat.S_IWUSR
+    assert os.stat(os.path.join(build, 'PKG-INFO')).st_mode & stat.S_IWUSR
+    assert cache.copy_linked(build)
+    assert not cache.copy_linked(build)
+    assert not os.path.samefile(os.path.join(tree, 'setup.py'), os.path.join(build, 'setup.py'))
+    open(os.path.join(build, 'setup.py'), 'a').write('# changed by the build\n')
+    cache.unpack(link, env.scratch_path / 'build2')
+    assert not os.path.samefile(os.path.join(tree, 'setup.py'), os.path.join(env.scratch_path, 'build2', 'setup.py'))
+    assert_equal('from setuptools import setup\n', open(os.path.join(tree, 'setup.py')).read())
@@ -0,0 +1,54 @@
+import os
+from nose.tools import assert_equal
+from pip.req import InstallRequirement
+from tests.test_pip import reset_env, run_pip
+from tests.local_repos import local_checkout
+from snakebasket.buildcache import requested_source_id, built_source_id, requirements_for_extras
+
+def test_only_exactly_pinned_requirements_have_a_source_id():
+    """ Commit hashes, archive hashes and == versions identify a build, branch names and version ranges don't. """
+    commit = '6e513083955aded92f1833ff460dc233062a7292'
+    url = 'git+http://github.com/prezi/sb-test-package.git'
+    assert_equal(commit, requested_source_id(InstallRequirement.from_line('%s@%s#egg=sb-test-package' % (url, commit))))
+    assert_equal(None, requested_source_id(InstallRequirement.from_line('%s@master#egg=sb-test-package' % url)))
+    assert_equal(None, requested_source_id(InstallRequirement.from_editable('%s@%s#egg=sb-test-package' % (url, commit))))
+    assert_equal('md5-0123abcd', requested_source_id(InstallRequirement(
+        'foo', None, url='http://example.com/foo-1.0.tar.gz#md5=0123ABCD')))
+    assert_equal(None, requested_source_id(InstallRequirement('foo', None, url='http://example.com/foo-1.0.tar.gz')))
+    assert_equal('1.0', requested_source_id(InstallRequirement.from_line('foo==1.0')))
+    assert_equal(None, requested_source_id(InstallRequirement.from_line('foo>=1.0')))
+    lines = ['bar', '[tests]', 'nose', '[docs]', 'sphinx']
+    assert_equal(['bar', 'sphinx'], list(requirements_for_extras(lines, ('docs',))))
+
+def test_build_from_unhashed_url_not_reused_for_pinned_version():
+    """ Only builds from the index are keyed by their version: an archive URL without a hash could hold anything. """
+    env = reset_env()
+    egg_info = env.scratch_path / 'foo' / 'pip-egg-info' / 'foo.egg-info'
+    os.makedirs(egg_info)
+    open(os.path.join(egg_info, 'PKG-INFO'), 'w').write('Metadata-Version: 1.0\nName: foo\nVersion: 1.0\n')
+    def built(req, from_index=False):
+        req.source_dir = env.scratch_path / 'foo'
+        return built_source_id(req, from_index)
+    pinned = InstallRequirement.from_line('foo==1.0')
+    assert_equal(None, built(InstallRequirement('foo', None, url='http://example.com/foo-1.0.tar.gz#egg=foo')))
+    assert_equal(None, built(InstallRequirement('foo', None, url='file:///tmp/foo')))
+    assert_equal('md5-0123abcd', built(InstallRequirement(
+        'foo', None, url='http://example.com/foo-1.0.tar.gz#md5=0123ABCD')))
+    assert_equal(requested_source_id(pinned), built(pinned))
+    from_index = InstallRequirement.from_line('foo==1.0')
+    from_index.url = 'http://pypi.example.com/foo-1.0.tar.gz#md5=0123abcd'
+    assert_equal(requested_source_id(pinned), built(from_index, from_index=True))
+
+def test_pinned_package_is_installed_from_build_cache():
+    """ The second install of the same commit unpacks the build stored by the first one. """
+    env = reset_env()
+    cache_dir = env.scratch_path / 'build-cache'
+    url = '%s@6e513083955aded92f1833ff460dc233062a7292#egg=sb-test-package' % local_checkout(
+        'git+http://github.com/prezi/sb-test-package.git')
+    result = run_pip('install', '--build-cache', cache_dir, url, expect_error=True)
+    assert 'from the build cache' not in result.stdout
+    run_pip('uninstall', '-y', 'sb-test-package', expect_error=True)
+    result = run_pip('install', '--build-cache', cache_dir, url, expect_error=True)
+    assert 'from the build cache' in result.stdout
+    assert 'Running setup.py install' not in result.stdout
+    assert 'Successfully installed sb-test-package' in result.stdout
@@ -5,6 +5,7 @@ from tests.test_pip import (here, reset_env, run_pip, pyversion, mkdir,
                             src_folder, write_file)
 from tests.local_repos import local_checkout
 from mock import Mock
+import os
 
 # Only planned tests in this file right now
 
@@ -19,3 +20,37 @@ def test_update_pulls_on_existing_checkout():
 def test_pre_existing_clones_used():
     """ Not implemented yet: clones present in the virtualenv prior to sb install running are used by sb install for version comparison and installation. """
     assert True
+
+def test_git_cache_dir_shared_between_environments():
+    """ With --git-cache-dir, editables are cloned from a bare mirror which later installs only fetch. """
+    local_url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    args = ['install', '--git-cache-dir', str(here / 'tests_cache' / 'git-mirrors'),
+            '-e', '%s@0.2.1#egg=sb-test-package' % local_url]
+    reset_env()
+    run_pip(*args, **{"expect_error": True})
+    env = reset_env()
+    result = run_pip(*args, **{"expect_error": True})
+    result.assert_installed('sb-test-package', with_files=['.git'])
+    assert 'Fetching %s into git mirror' % local_url.replace('git+', '', 1) in result.stdout
+    alternates = env.venv_path / 'src' / 'sb-test-package' / '.git' / 'objects' / 'info' / 'alternates'
+    assert os.path.exists(alternates)
+
+def test_pre_existing_checkout_fetched_once_in_background():
+    """ With --jobs, pre-existing checkouts are fetched in the background when sb starts, and never twice. """
+    local_url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    reset_env()
+    run_pip('install', '-e', '%s@0.2.0#egg=sb-test-package' % local_url, expect_error=True)
+    result = run_pip('install', '--jobs', '4', '-e', '%s@0.2.1#egg=sb-test-package' % local_url, expect_error=True)
+    assert_equal(1, result.stdout.count('Performing git fetch in pre-existing directory'))
+    assert 'sb-test-package 0.2.1' in result.stdout
+
+def test_shallow_clone_deepened_to_compare_versions():
+    """ With --git-clone-mode shallow, a clone only gets more history when comparing two versions needs it. """
+    local_url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    env = reset_env()
+    write_file('requirements.txt', '-e %s@0.1.1#egg=sb-test-package\n-e %s@0.1.2#egg=sb-test-package\n' % (
+        local_url, local_url))
+    result = run_pip('install', '--git-clone-mode', 'shallow', '-r', 'requirements.txt', expect_error=True)
+    result.assert_installed('sb-test-package', with_files=['.git'])
+    assert 'more commits of history into shallow clone' in result.stdout
+    assert 'sb-test-package 0.1.2' in result.stdout
@@ -0,0 +1,26 @@
+from nose.tools import assert_equal
+from pip.vcs.git import Git
+from tests.test_pip import reset_env, run_pip
+from tests.local_repos import local_checkout
+from snakebasket import patches
+
+def test_freeze_output_does_not_depend_on_jobs():
+    """ sb freeze describes editables the same way, whether their repos are queried one by one or in parallel. """
+    env = reset_env()
+    run_pip('install', '-e', '%s@0.1.1#egg=sb-test-package' %
+            local_checkout('git+http://github.com/prezi/sb-test-package.git'), expect_error=True)
+    serial = run_pip('freeze', expect_stderr=True)
+    parallel = run_pip('freeze', '--jobs', '4', expect_stderr=True)
+    assert 'egg=sb-test-package' in serial.stdout
+    assert_equal(serial.stdout, parallel.stdout)
+
+def test_batched_ref_lookup_matches_git_per_ref():
+    """ Reading all refs with a single git show-ref gives the same tag and branch revisions as a git call per ref. """
+    env = reset_env()
+    checkout_dir = env.scratch_path / 'sb-test-package'
+    git = Git()
+    Git(local_checkout('git+http://github.com/prezi/sb-test-package.git')).obtain(checkout_dir)
+    assert_equal(git.get_tag_revs(checkout_dir), patches.batched_git_get_tag_revs(git, checkout_dir))
+    branch_revs = patches.batched_git_get_branch_revs(git, checkout_dir)
+    assert_equal(git.get_branch_revs(checkout_dir), branch_revs)
+    assert_equal(branch_revs['origin/master'], branch_revs['origin/HEAD'])
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tarfile
+from nose.tools import assert_equal
+from pip.req import Requirements
+from tests.test_pip import reset_env
+from tests.local_repos import local_checkout
+from snakebasket import gitbackend, versions
+from snakebasket.gitmetadata import (literal_setup_arguments, literal_setup_version, requirement_lines, find_commit,
+                                     is_self_contained)
+from snakebasket.sdistmetadata import read_metadata
+
+def test_setup_arguments_only_used_when_literal():
+    """ Dependencies are taken from setup.py without running it only if setup() gets them as literals. """
+    arguments = literal_setup_arguments(
+        "from setuptools import setup\n"
+        "setup(name='foo', version=open('VERSION').read(), install_requires=['bar>=1.0', 'baz'],\n"
+        "      extras_require={'tests': ['nose']}, dependency_links=['http://example.com/bar'])\n")
+    assert_equal(['bar>=1.0', 'baz'], requirement_lines(arguments))
+    assert_equal(['bar>=1.0', 'baz', 'nose'], requirement_lines(arguments, ('tests',)))
+    assert_equal(['http://example.com/bar'], arguments['dependency_links'])
+    assert_equal(None, literal_setup_arguments("from setuptools import setup\nsetup(install_requires=open('r').readlines())\n"))
+    assert_equal(None, literal_setup_arguments("from setuptools import setup\nsetup(**config)\n"))
+    assert_equal(None, requirement_lines({'install_requires': ['bar; python_version < "3"']}))
+    assert is_self_contained('-e git+http://example.com/foo.git#egg=foo\nbar==1.0\n')
+    assert not is_self_contained('-r base.txt\nbar==1.0\n')
+    assert_equal('1.2', literal_setup_version("from setuptools import setup\nsetup(name='foo', version='1.2')\n"))
+    assert_equal(None, literal_setup_version("from setuptools import setup\nsetup(version=open('VERSION').read())\n"))
+
+def test_sdist_metadata_read_without_unpacking():
+    """ The version of an sdist comes from its PKG-INFO, and its dependencies from setup.py when they are literals. """
+    env = reset_env()
+    def make_sdist(filename, setup_py):
+        source = env.scratch_path / 'foo-1.0'
+        os.makedirs(source)
+        pkg_info = 'Metadata-Version: 1.0\nName: foo\nVersion: 1.0\n'
+        for name, contents in (('setup.py', setup_py), ('PKG-INFO', pkg_info)):
+            f = open(os.path.join(source, name), 'w')
+            f.write(contents)
+            f.close()
+        archive = env.scratch_path / filename
+        tar = tarfile.open(archive, 'w:gz')
+        tar.add(source, 'foo-1.0')
+        tar.close()
+        shutil.rmtree(source)
+        return archive
+    literal = make_sdist('literal.tar.gz',
+                         "from setuptools import setup\nsetup(name='foo', install_requires=['bar'])\n")
+    assert_equal(('1.0', ['bar'], []), read_metadata(literal))
+    computed = make_sdist('computed.tar.gz',
+                          "from setuptools import setup\nsetup(install_requires=open('r').readlines())\n")
+    assert_equal(None, read_metadata(computed))
+
+def test_files_read_from_clone_without_working_tree():
+    """ An editable is cloned without checking anything out, and its files are read from the git objects. """
+    env = reset_env()
+    url = local_checkout('git+http://github.com/prezi/sb-test-package.git') + '@0.1.1#egg=sb-test-package'
+    clone_dir = env.scratch_path / 'sb-test-package'
+    checker = versions.InstallReqChecker('src', Requirements(), [])
+    assert checker.obtain_objects(url, clone_dir)
+    assert_equal(['.git'], os.listdir(clone_dir))
+    assert not checker.check_for_uncommited_git_changes(clone_dir)
+    batch = gitbackend.BatchGitBackend(clone_dir)
+    subprocess = gitbackend.SubprocessGitBackend(clone_dir)
+    commit = find_commit(subprocess, '0.1.1')
+    assert_equal(subprocess.resolve_ref('0.1.1'), commit)
+    assert_equal(commit, find_commit(batch, '0.1.1'))
+    assert_equal(subprocess.read_file(commit, 'setup.py'), batch.read_file(commit, 'setup.py'))
+    assert 'setup(' in batch.read_file(commit, 'setup.py')
+    assert_equal(None, batch.read_file(commit, 'no-such-file.txt'))
+    assert_equal(None, subprocess.read_file(commit, 'no-such-file.txt'))
+    assert_equal(None, find_commit(batch, 'no-such-branch'))
+    batch.close()
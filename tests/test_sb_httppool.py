@@ -0,0 +1,51 @@
+import threading
+import BaseHTTPServer
+import SocketServer
+from nose.tools import assert_equal
+from pip.download import URLOpener
+from snakebasket import httppool
+
+class CountingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.server.connections += 1
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        body = self.path * 1000
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve():
+    server = CountingServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    return server, 'http://127.0.0.1:%d' % server.server_address[1]
+
+def test_connection_reused_once_response_is_read():
+    """ Requests to the same host share one connection, unless a response is closed before it's read to the end. """
+    server, url = serve()
+    opener = URLOpener()
+    opener.get_opener = lambda *args, **kwargs: httppool.pooled_get_opener(opener, *args, **kwargs)
+    try:
+        for path in ('/a', '/b', '/c'):
+            assert_equal(path * 1000, opener(url + path).read())
+        assert_equal(1, server.connections)
+        response = opener(url + '/d')
+        assert_equal('/d/d', response.read(4))
+        response.close()
+        assert_equal('/e' * 1000, opener(url + '/e').read())
+        assert_equal(2, server.connections)
+    finally:
+        server.shutdown()
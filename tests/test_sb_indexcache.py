@@ -0,0 +1,75 @@
+import threading
+import urllib2
+import BaseHTTPServer
+import SocketServer
+from nose.tools import assert_equal
+from pip.index import HTMLPage
+from tests.test_pip import reset_env
+from snakebasket.indexcache import IndexCache, IndexCacheHandler
+
+PAGE = '<html><body><a href="../../packages/foo-1.0.tar.gz#md5=0123">foo-1.0.tar.gz</a></body></html>'
+
+class ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    not_modified = 0
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.server.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+def test_unchanged_page_served_from_cache():
+    """ A page with an ETag is revalidated on the next request, and a 304 is answered with the stored copy. """
+    env = reset_env()
+    server = ThreadingServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    url = 'http://127.0.0.1:%d/simple/foo/' % server.server_address[1]
+    cache = IndexCache(env.scratch_path / 'index-cache')
+    try:
+        for i in range(2):
+            response = urllib2.build_opener(IndexCacheHandler(cache)).open(url)
+            assert_equal(200, response.code)
+            assert_equal(PAGE, response.read())
+    finally:
+        server.shutdown()
+    assert_equal(1, server.not_modified)
+    assert_equal((1, 1), (cache.revalidated, cache.downloaded))
+    page = HTMLPage(PAGE, url)
+    links = (['http://127.0.0.1:%d/packages/foo-1.0.tar.gz#md5=0123' % server.server_address[1]], [])
+    assert_equal(links, cache.parsed_links(page))
+    assert_equal(links, IndexCache(env.scratch_path / 'index-cache').parsed_links(page))
+    assert_equal((0, 1), (cache.link_hits, cache.link_misses))
+
+def test_page_fetched_again_if_gone_before_304():
+    """ When the stored page disappears between sending the conditional request and the 304, it's fetched in full. """
+    env = reset_env()
+    server = ThreadingServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    url = 'http://127.0.0.1:%d/simple/foo/' % server.server_address[1]
+    cache = IndexCache(env.scratch_path / 'index-cache')
+    try:
+        urllib2.build_opener(IndexCacheHandler(cache)).open(url).read()
+        cache.cached_response = lambda url: None
+        response = urllib2.build_opener(IndexCacheHandler(cache)).open(url)
+        assert_equal(200, response.code)
+        assert_equal(PAGE, response.read())
+    finally:
+        server.shutdown()
+    assert_equal(1, server.not_modified)
+    assert_equal(2, cache.downloaded)
@@ -0,0 +1,30 @@
+from nose.tools import assert_equal
+from pip.req import InstallRequirement
+from tests.test_pip import reset_env, run_pip
+from tests.local_repos import local_checkout
+from snakebasket.installstate import requested_identity
+
+def test_identity_of_url_requirement_resolved_without_cloning():
+    """ Branches and tags of git URLs are resolved to commits with ls-remote, editables and ranges have no identity. """
+    reset_env()
+    url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    identity = requested_identity(InstallRequirement.from_line(url + '@0.1.1#egg=sb-test-package'))
+    repo_url, commit = identity.rsplit('@', 1)
+    assert_equal(url[len('git+'):], repo_url)
+    assert_equal(identity, requested_identity(InstallRequirement.from_line('%s@%s#egg=sb-test-package' % (url, commit))))
+    assert_equal(None, requested_identity(InstallRequirement.from_line(url + '@no-such-branch#egg=sb-test-package')))
+    assert_equal(None, requested_identity(InstallRequirement.from_editable(url + '@0.1.1#egg=sb-test-package')))
+    assert_equal('==1.0', requested_identity(InstallRequirement.from_line('foo==1.0')))
+    assert_equal(None, requested_identity(InstallRequirement.from_line('foo>=1.0')))
+
+def test_unchanged_url_requirement_is_not_installed_again():
+    """ A rerun skips a git URL requirement whose tag still points to the commit installed by the last run. """
+    reset_env()
+    url = local_checkout('git+http://github.com/prezi/sb-test-package.git') + '@0.1.1#egg=sb-test-package'
+    result = run_pip('install', url, expect_error=True)
+    assert 'Successfully installed sb-test-package' in result.stdout
+    result = run_pip('install', url, expect_error=True)
+    assert 'Requirement unchanged since it was installed' in result.stdout
+    assert 'Running setup.py install' not in result.stdout
+    result = run_pip('install', '--no-install-state', url, expect_error=True)
+    assert 'Requirement unchanged since it was installed' not in result.stdout
@@ -0,0 +1,58 @@
+from nose.tools import assert_equal
+from pip.index import PackageFinder
+from pip.req import InstallRequirement
+from snakebasket.parallel import WorkerPool
+from snakebasket.indexprefetch import page_locations
+
+def test_tasks_and_reservations_sharing_a_key_run_in_order():
+    """ Work on the same key runs in submission order, whether it's a task or a reservation run by the caller. """
+    pool = WorkerPool(4)
+    order = []
+    first = pool.submit_after('key', order.append, 'first task')
+    reservation = pool.reserve('key')
+    second = pool.submit_after('key', order.append, 'second task')
+    unrelated = pool.submit_after('other key', lambda: 'unrelated')
+    assert_equal('unrelated', unrelated.result())
+    reservation.run(order.append, 'reservation')
+    second.result()
+    first.result()
+    pool.close()
+    assert_equal(['first task', 'reservation', 'second task'], order)
+
+def test_zero_jobs_means_one_per_core():
+    """ WorkerPool(0) starts a worker thread per CPU core. """
+    import multiprocessing
+    pool = WorkerPool(0)
+    assert_equal(multiprocessing.cpu_count(), pool.jobs)
+    assert_equal([1, 4, 9], pool.map(lambda x: x * x, [1, 2, 3]))
+    pool.close()
+
+def test_many_threads_can_wait_for_one_task():
+    """ Every task waiting for another one is woken up when it finishes. """
+    import threading
+    pool = WorkerPool(4)
+    started = threading.Event()
+    first = pool.submit(started.wait, 10)
+    waiting = [pool.submit(first.wait) for i in range(3)]
+    started.set()
+    for task in waiting:
+        task.result()
+    first.result()
+    pool.close()
+
+def test_dependencies_are_installed_first():
+    """ The install order puts every package after the packages it depends on, a dependency cycle doesn't hang it. """
+    from pip.req import InstallRequirement
+    from snakebasket.commands.install import RecursiveRequirementSet
+    requirement_set = RecursiveRequirementSet(build_dir='build', src_dir='src', download_dir=None)
+    requirement_set.dependencies = {'app': set(['lib-a', 'lib-b']), 'lib-b': set(['lib-a']), 'lib-a': set(['app'])}
+    reqs = [InstallRequirement.from_line(name) for name in ['app', 'Lib_B', 'lib.a', 'other']]
+    assert_equal(['lib.a', 'Lib-B', 'app', 'other'], [r.name for r in requirement_set.install_order(reqs)])
+
+def test_index_pages_of_a_requirement_are_known_before_its_lookup():
+    """ The pages prefetched for a requirement are the ones find_requirement fetches: index, versions and links. """
+    finder = PackageFinder([], ['http://pypi.example.com/simple/'])
+    finder.add_dependency_links(['http://example.com/downloads/'])
+    urls = [link.url for link in page_locations(finder, InstallRequirement.from_line('Foo==1.0'))]
+    assert_equal(['http://pypi.example.com/simple/Foo/1.0', 'http://pypi.example.com/simple/Foo/',
+                  'http://example.com/downloads/'], urls)
@@ -3,6 +3,7 @@ import os
 import filecmp
 import textwrap
 import sys
+import json
 from os.path import abspath, join, curdir, pardir
 
 from nose.tools import assert_raises
@@ -86,6 +87,42 @@ def test_git_with_editable_with_no_requirements_for_env():
     # requirements.txt references 0.1.2 of pip-test-package
     assert 'Adding pip-test-package 0.1.2' in result.stdout
 
+def test_install_with_jobs_resolves_like_serial_install():
+    """
+    Test --jobs obtains requirements in parallel without changing which versions are chosen.
+    """
+    local_url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    args = ['install', '--env', 'local', '-e', '%s#egg=sb-test-package' % local_url]
+    reset_env()
+    serial = run_pip(*args, **{"expect_error": True})
+    reset_env()
+    parallel = run_pip(*(args + ['--jobs', '4']), **{"expect_error": True})
+    parallel.assert_installed('sb-test-package', with_files=['.git'])
+    parallel.assert_installed('pip-test-package', with_files=['.git'])
+    assert 'Adding pip-test-package 0.1.1' in serial.stdout
+    assert 'Adding pip-test-package 0.1.1' in parallel.stdout
+
+def test_install_from_lock_skips_resolution():
+    """
+    Test --lock records the resolved requirements, and --from-lock installs them without reading requirements.txt.
+    """
+    local_url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    env = reset_env()
+    run_pip('install', '--env', 'local', '-e', '%s#egg=sb-test-package' % local_url,
+            '--lock', env.scratch_path / 'sb.lock', expect_error=True)
+    lock_contents = open(env.scratch_path / 'sb.lock').read()
+    packages = dict((p['name'], p) for p in json.loads(lock_contents)['packages'])
+    assert packages['sb-test-package']['editable']
+    assert packages['sb-test-package']['requirements_file'] == 'requirements-local.txt'
+    assert len(packages['pip-test-package']['commit']) == 40
+    env = reset_env()
+    write_file('sb.lock', lock_contents)
+    result = run_pip('install', '--env', 'local', '--from-lock', 'sb.lock', expect_error=True)
+    result.assert_installed('sb-test-package', with_files=['.git'])
+    result.assert_installed('pip-test-package', with_files=['.git'])
+    assert 'installing extra dependencies' not in result.stdout
+    assert packages['pip-test-package']['commit'] in run_pip('freeze', expect_stderr=True).stdout
+
 def test_reinstall_interrupted_install_with_missing_deps():
     """
     When the installation phase of an sb run is interrupted, some of the dependencies won't be installed
@@ -0,0 +1,21 @@
+from tests.test_pip import reset_env, run_pip
+from tests.local_repos import local_checkout
+
+def test_resolve_prints_requirements_without_installing():
+    """ sb resolve prints the resolved requirements with exact commits, and installs nothing. """
+    env = reset_env()
+    url = local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    result = run_pip('resolve', '-e', '%s@0.2.1#egg=sb-test-package' % url, expect_error=True)
+    assert '-e %s@' % url in result.stdout
+    assert '#egg=sb-test-package' in result.stdout
+    assert env.site_packages / 'sb-test-package.egg-link' not in result.files_created
+    assert 'Running setup.py develop' not in result.stdout
+
+def test_resolve_reuses_up_to_date_egg_info():
+    """ A second sb resolve of the same revision doesn't run egg_info again. """
+    reset_env()
+    url = '%s@0.2.1#egg=sb-test-package' % local_checkout('git+http://github.com/prezi/sb-test-package.git')
+    result = run_pip('resolve', '-e', url, expect_error=True)
+    assert 'Running setup.py egg_info for package sb-test-package' in result.stdout
+    result = run_pip('resolve', '-e', url, expect_error=True)
+    assert 'Running setup.py egg_info for package sb-test-package' not in result.stdout
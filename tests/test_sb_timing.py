@@ -0,0 +1,37 @@
+import json
+import subprocess
+from nose.tools import assert_equal
+from tests.test_pip import reset_env, run_pip
+from tests.local_repos import local_checkout
+from snakebasket import timing
+
+def test_phases_and_git_subprocesses_are_recorded():
+    """ Phases are timed per requirement while a report is active, and git processes are counted. """
+    req = type('Req', (object,), {'name': 'foo', 'url': None})()
+    with timing.phase('egg_info', req):
+        pass
+    report = timing.start()
+    try:
+        with timing.phase('egg_info', req):
+            subprocess.call(['git', '--version'], stdout=subprocess.PIPE)
+        with timing.phase('egg_info', req):
+            pass
+        subprocess.call(['true'])
+    finally:
+        assert_equal(report, timing.stop())
+    with timing.phase('egg_info', req):
+        subprocess.call(['git', '--version'], stdout=subprocess.PIPE)
+    result = report.as_dict()
+    assert_equal(2, result['requirements']['foo']['egg_info']['calls'])
+    assert_equal(1, result['counters']['git_subprocesses'])
+    assert_equal([('foo', 'egg_info')], [(e['requirement'], e['phase']) for e in result['slowest']])
+
+def test_timing_report_written_after_install():
+    """ sb install --timing-report FILE writes the JSON report, even with several jobs. """
+    env = reset_env()
+    run_pip('install', '-j', '2', '--timing-report', 'timing.json', '-e', '%s#egg=sb-test-package' %
+            local_checkout('git+http://github.com/prezi/sb-test-package.git'), expect_error=True)
+    report = json.load(open(env.scratch_path / 'timing.json'))
+    assert 'egg_info' in report['requirements']['sb-test-package']
+    assert report['counters']['git_subprocesses'] > 0
+    assert report['slowest']
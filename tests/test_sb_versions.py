@@ -1,3 +1,4 @@
+import threading
 from snakebasket import versions
 from nose.tools import assert_equal, assert_raises
 from pip.exceptions import InstallationError
@@ -6,6 +7,8 @@ from tests.test_pip import (here, reset_env, run_pip, pyversion, mkdir,
                             src_folder, write_file)
 from tests.local_repos import local_checkout
 from mock import Mock
+from snakebasket import gitbackend
+from snakebasket.ancestrycache import AncestryCache
 
 def test_comparison():
     """ Comparison of version strings works for editable git repos """
@@ -116,6 +119,127 @@ def test_comparison():
 
     assert checker.get_available_substitute(unpinned_req_2)
 
+def test_batch_git_backend_agrees_with_subprocess_backend():
+    """ The git cat-file based backend answers version questions exactly like git subprocesses do. """
+    env = reset_env()
+    checkout_dir = versions.GitVersionComparator.checkout_pkg_repo(
+        local_checkout('git+http://github.com/prezi/sb-test-package.git'), env.scratch_path / 'sb-test-package')
+    batch = gitbackend.BatchGitBackend(checkout_dir)
+    subprocess = gitbackend.SubprocessGitBackend(checkout_dir)
+    refs = ['0.1', '0.1.1', '0.1.2', 'master', 'HEAD', 'test_branch_a', 'test_branch_b']
+    hashes = [subprocess.resolve_ref(ref) for ref in refs]
+    assert_equal(hashes, [batch.resolve_ref(ref) for ref in refs])
+    assert_raises(InstallationError, batch.resolve_ref, 'no-such-ref')
+    for commit in hashes + ['6e513083955aded92f1833ff460dc233062a7292', 'deadbeef']:
+        assert_equal(subprocess.is_commit_hash(commit), batch.is_commit_hash(commit))
+    for parent in hashes:
+        for child in hashes:
+            assert_equal(subprocess.is_ancestor(parent, child), batch.is_ancestor(parent, child))
+    batch.close()
+
+def test_shared_backend_not_pinned_to_fallback_before_clone():
+    """ Threads share one backend per repository; a repository not cloned yet doesn't keep the subprocess fallback. """
+    env = reset_env()
+    checkout_dir = env.scratch_path / 'sb-test-package'
+    assert isinstance(gitbackend.git_backend(checkout_dir), gitbackend.SubprocessGitBackend)
+    versions.GitVersionComparator.checkout_pkg_repo(
+        local_checkout('git+http://github.com/prezi/sb-test-package.git'), checkout_dir)
+    backends = []
+    threads = [threading.Thread(target=lambda: backends.append(gitbackend.git_backend(checkout_dir))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert isinstance(backends[0], gitbackend.BatchGitBackend)
+    assert_equal(1, len(set(id(backend) for backend in backends)))
+    gitbackend.close_backends()
+
+def test_newest_commit_of_several_versions():
+    """ Out of any number of versions on one line of history, the newest one is found; across branches, none is. """
+    env = reset_env()
+    checkout_dir = versions.GitVersionComparator.checkout_pkg_repo(
+        local_checkout('git+http://github.com/prezi/sb-test-package.git'), env.scratch_path / 'sb-test-package')
+    for backend in gitbackend.backend_names:
+        gitbackend.select_backend(backend)
+        comparator = versions.GitVersionComparator(checkout_dir)
+        hashes = [comparator.get_commit_hash_of_version_string(v) for v in ['0.1.1', '0.1.2', '0.1', '0.1.1']]
+        assert_equal(hashes[1], comparator.get_newest_commit(hashes))
+        branches = [comparator.get_commit_hash_of_version_string(v) for v in ['test_branch_a', 'test_branch_b']]
+        assert_equal(None, comparator.get_newest_commit(hashes + branches))
+    gitbackend.select_backend(gitbackend.BATCH)
+
+def test_ancestry_cache_persists_between_runs():
+    """ Ancestry answers for full commit hashes are stored on disk, along with hit and miss counts. """
+    env = reset_env()
+    path = env.scratch_path / 'ancestry.db'
+    older_commit = '6e513083955aded92f1833ff460dc233062a7292'
+    newer_commit = '2204077f795580d2f8d6df82caee34126aaf87eb'
+    cache = AncestryCache(path)
+    assert_equal(None, cache.get('repo', older_commit, newer_commit))
+    cache.put('repo', older_commit, newer_commit, True)
+    # tags and branches can move, so they are never cached
+    cache.put('repo', '0.1', newer_commit, True)
+    cache.close()
+    cache = AncestryCache(path)
+    assert_equal(True, cache.get('repo', older_commit, newer_commit))
+    assert_equal(None, cache.get('other-repo', older_commit, newer_commit))
+    assert_equal(None, cache.get('repo', '0.1', newer_commit))
+    assert_equal((1, 1), (cache.hits, cache.misses))
+    assert_equal({'hits': 0, 'misses': 1}, cache.counters())
+    cache.close()
+
+def test_pre_installed_packages_load_lazily():
+    """ Installed distributions are only turned into PackageData when looked up, or all at once in parallel. """
+    pre_installed = versions.PreInstalledPackages(jobs=4)
+    pre_installed.scan()
+    assert 'pip' in pre_installed
+    assert_equal({}, pre_installed.loaded)
+    assert_equal('pip', pre_installed['pip'].name)
+    assert_equal(['pip'], pre_installed.loaded.keys())
+    assert_equal(None, pre_installed.get('no-such-package'))
+    assert_equal(sorted(pre_installed.keys()), sorted(pd.name for pd in pre_installed.values()))
+
+def test_substitutes_found_by_normalized_name():
+    """ Requested, downloaded and installed packages are found however their name is spelled. """
+    reset_env()
+    requirements = Requirements()
+    requirements['Foo.Bar'] = InstallRequirement.from_line('Foo.Bar==1.0')
+    downloaded = []
+    checker = versions.InstallReqChecker('src', requirements, downloaded)
+    assert_equal('Foo.Bar', checker.find_requirement_name('foo_bar'))
+    assert_equal('Foo.Bar', checker.find_requirement_name('FOO--bar'))
+    assert_equal(None, checker.find_requirement_name('foo'))
+    requirements['baz'] = InstallRequirement.from_line('baz')
+    assert_equal('1.0', checker.find_potential_substitutes('foo-BAR').version)
+    assert_equal('baz', checker.find_requirement_name('BAZ'))
+    downloaded.append(InstallRequirement.from_line('Qux_Q==2.0'))
+    assert_equal('2.0', checker.find_potential_substitutes('qux.q').version)
+    assert_equal('pip', checker.find_potential_substitutes('PIP').name)
+
+def test_package_data_ordered_by_release_then_pep440():
+    """ Release numbers come first, legacy or not; then PEP 440 order, with legacy suffixes after the final release. """
+    ordered = ['master', '0.9', '0.9-foo', '0.10', '1.0.dev1', '1.0a1', '1.0rc1', '1.0', '1.0-foo', '1.0.post1',
+               '2.0-foo', '2.0.dev-r123', '1!0.1']
+    packages = [versions.PackageData('foo', version=v) for v in reversed(ordered)]
+    assert_equal(ordered, [p.version for p in sorted(packages)])
+    assert_equal(versions.PackageData('foo', version='1.0'), versions.PackageData('foo', version='1.0.0'))
+    assert versions.PackageData('foo', version='1.0').sort_key is versions.PackageData('bar', version='1.0').sort_key
+
+def test_uncommitted_changes_checked_once_per_checkout():
+    """ Checking a checkout for uncommitted changes ignores .egg-info, and happens only once per run. """
+    env = reset_env()
+    checkout_dir = versions.GitVersionComparator.checkout_pkg_repo(
+        local_checkout('git+http://github.com/prezi/sb-test-package.git'), env.scratch_path / 'sb-test-package')
+    checker = versions.InstallReqChecker('src', Requirements(), [])
+    mkdir(checkout_dir / 'sb_test_package.egg-info')
+    write_file('PKG-INFO', 'built', checkout_dir / 'sb_test_package.egg-info')
+    assert not checker.check_for_uncommited_git_changes(checkout_dir)
+    checker.check_editable_is_unmodified(checkout_dir)
+    write_file('new_file.txt', 'local change', checkout_dir)
+    assert checker.check_for_uncommited_git_changes(checkout_dir)
+    # the result is kept for the rest of the run
+    checker.check_editable_is_unmodified(checkout_dir / '.')
+
 def test_requirement_set_will_include_correct_version():
     """ Out of two versions of the same package, the requirement set will contain the newer one. """
     reset_env()